@@ -0,0 +1,198 @@
+"""Compact edit history of medication assignments.
+
+Each update of an assignment is stored as one ``assignment_revisions`` row
+holding a JSON diff of the changed fields (``{field: [old, new]}``, with
+values kept in their JSON types). The creation of an assignment, and every
+``ASSIGNMENT_SNAPSHOT_INTERVAL`` diffs after it, store the full state as
+well, so the state at any point in time is rebuilt from the nearest earlier
+snapshot plus at most that many diffs.
+"""
+import json
+import os
+from datetime import timezone
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+ASSIGNMENT_SNAPSHOT_INTERVAL = int(os.getenv("ASSIGNMENT_SNAPSHOT_INTERVAL", "20"))
+
+# Assignment fields whose history is kept
+HISTORY_FIELDS = (
+    "family_member_id",
+    "medication_id",
+    "current_dose",
+    "frequency_hours",
+    "frequency_min_hours",
+    "frequency_max_hours",
+    "active",
+    "schedule_type",
+    "schedule_time",
+    "schedule_days",
+)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def assignment_state(assignment):
+    """Current values of the history fields of an assignment."""
+    return {field: getattr(assignment, field) for field in HISTORY_FIELDS}
+
+
+def apply_update(assignment, update_data):
+    """Set the given fields and return the ones that changed as ``{field: [old, new]}``."""
+    changes = {}
+    for field, new_value in update_data.items():
+        old_value = getattr(assignment, field, None)
+        if old_value != new_value:
+            changes[field] = [old_value, new_value]
+        setattr(assignment, field, new_value)
+    return changes
+
+
+def record_creation(db: Session, assignment):
+    """Start the history of a new assignment with a snapshot of its state.
+
+    The assignment must have been flushed so its id is known.
+    """
+    db.add(models.AssignmentRevision(
+        assignment_id=assignment.id,
+        snapshot=_dumps(assignment_state(assignment)),
+        diffs_since_snapshot=0
+    ))
+
+
+def record_creations(db: Session, assignments):
+    """Start the histories of assignments inserted in bulk, with one insert.
+
+    ``assignments`` holds each new assignment's ``id`` and history fields.
+    """
+    if assignments:
+        db.execute(insert(models.AssignmentRevision.__table__), [
+            {
+                "assignment_id": assignment["id"],
+                "snapshot": _dumps({field: assignment.get(field) for field in HISTORY_FIELDS}),
+                "diffs_since_snapshot": 0
+            }
+            for assignment in assignments
+        ])
+
+
+def record_update(db: Session, assignment, changes):
+    """Append a revision for changes already applied to the assignment."""
+    if not changes:
+        return None
+    revision = models.AssignmentRevision
+    # Earlier revisions added in this session must be visible to the query
+    db.flush()
+    previous = db.query(revision.diffs_since_snapshot).filter(
+        revision.assignment_id == assignment.id
+    ).order_by(revision.id.desc()).limit(1).scalar()
+
+    # Without earlier history there is nothing to replay from, so anchor it
+    depth = ASSIGNMENT_SNAPSHOT_INTERVAL if previous is None else previous + 1
+    snapshot = None
+    if depth >= ASSIGNMENT_SNAPSHOT_INTERVAL:
+        snapshot = _dumps(assignment_state(assignment))
+        depth = 0
+
+    db_revision = revision(
+        assignment_id=assignment.id,
+        changes=_dumps(changes),
+        snapshot=snapshot,
+        diffs_since_snapshot=depth
+    )
+    db.add(db_revision)
+    return db_revision
+
+
+def record_updates(db: Session, updates):
+    """Append one revision per assignment for a bulk update, with one insert.
+
+    ``updates`` holds ``(assignment_id, state, changes)``, where ``state`` is
+    the assignment's history fields after the update. The latest revision of
+    every assignment is read with a single query.
+    """
+    updates = [update for update in updates if update[2]]
+    if not updates:
+        return
+    revision = models.AssignmentRevision
+    latest = select(func.max(revision.id)).where(
+        revision.assignment_id.in_([assignment_id for assignment_id, _, _ in updates])
+    ).group_by(revision.assignment_id)
+    previous = dict(db.query(revision.assignment_id, revision.diffs_since_snapshot).filter(
+        revision.id.in_(latest)
+    ).all())
+
+    rows = []
+    for assignment_id, state, changes in updates:
+        depth = ASSIGNMENT_SNAPSHOT_INTERVAL if assignment_id not in previous else previous[assignment_id] + 1
+        snapshot = None
+        if depth >= ASSIGNMENT_SNAPSHOT_INTERVAL:
+            snapshot = _dumps(state)
+            depth = 0
+        rows.append({
+            "assignment_id": assignment_id,
+            "changes": _dumps(changes),
+            "snapshot": snapshot,
+            "diffs_since_snapshot": depth
+        })
+    # Core insert, so rows with and without a snapshot go to one executemany
+    db.execute(insert(revision.__table__), rows)
+
+
+def _utc_naive(ts):
+    """Stored timestamps are naive UTC; convert aware values before comparing."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def state_as_of(db: Session, assignment_id, ts):
+    """Rebuild an assignment's state at ``ts``, or None if it had no state then.
+
+    Reads the latest snapshot at or before ``ts`` and replays the diffs
+    recorded after it, which are fewer than ``ASSIGNMENT_SNAPSHOT_INTERVAL``.
+    """
+    revision = models.AssignmentRevision
+    ts = _utc_naive(ts)
+    base = db.query(revision.id, revision.snapshot, revision.changed_at).filter(
+        revision.assignment_id == assignment_id,
+        revision.snapshot.isnot(None),
+        revision.changed_at <= ts
+    ).order_by(revision.changed_at.desc(), revision.id.desc()).first()
+    if base is None:
+        return None
+
+    state = json.loads(base.snapshot)
+    diffs = db.query(revision.id, revision.changes, revision.changed_at).filter(
+        revision.assignment_id == assignment_id,
+        revision.id > base.id,
+        revision.changed_at <= ts
+    ).order_by(revision.id).all()
+    last = base
+    for diff in diffs:
+        for field, (_, new_value) in json.loads(diff.changes).items():
+            if field in state:
+                state[field] = new_value
+        last = diff
+
+    return {
+        "id": assignment_id,
+        "as_of": ts.replace(tzinfo=timezone.utc),
+        "revision_id": last.id,
+        "revision_changed_at": last.changed_at,
+        "replayed_diffs": len(diffs),
+        **state
+    }
+
+
+def revision_changes(db_revision):
+    """Field changes of a revision as a list, for the edit history."""
+    return [
+        {"field_name": field, "old_value": old_value, "new_value": new_value}
+        for field, (old_value, new_value) in json.loads(db_revision.changes).items()
+    ]
@@ -0,0 +1,332 @@
+"""Asynchronous, batched audit log of data changes.
+
+Creates, updates and deletes of the tracked models are captured from every
+session flush, so every mutating endpoint is covered without touching the
+routers. Events are queued when the transaction commits (rolled back changes
+are discarded) and written to ``audit_events`` by a background thread in
+batched inserts, keeping the inserts off the request path.
+
+The queue is bounded. When it is full, or the database can't be written,
+events are appended to a spool file next to the database instead, and the
+spool is replayed into the table on the next start. Stopping the pipeline
+drains the queue first, so no committed change goes unrecorded.
+
+Inventory quantity changes are made with SQL-side updates and are recorded
+in the inventory ledger instead (see inventory_ledger.py).
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+from datetime import date, datetime, timezone
+
+from sqlalchemy import event, insert, inspect
+
+from . import models
+from .database import DATABASE_PATH, SessionLocal, engine
+
+# Set to "false" to turn the audit log off
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Events held in memory before spilling to the spool file
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+# Events written per insert and seconds between flushes
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+# Durable fallback for events that could not be queued or written
+AUDIT_SPOOL_PATH = os.getenv("AUDIT_SPOOL_PATH", DATABASE_PATH + "-audit.ndjson")
+
+# Models whose changes are audited, keyed by their table name
+AUDITED_MODELS = {
+    model.__tablename__: model
+    for model in (
+        models.FamilyMember,
+        models.Caregiver,
+        models.Medication,
+        models.MedicationAssignment,
+        models.Administration,
+        models.MedicationInventory,
+    )
+}
+AUDITED_CLASSES = tuple(AUDITED_MODELS.values())
+
+_PENDING_KEY = "audit_events"
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _row_values(obj):
+    """Loaded column values of a row, keyed by attribute name.
+
+    Server-generated values not loaded yet (e.g. ``created_at``) are left
+    out rather than fetched, which would cost a query per row.
+    """
+    state = inspect(obj)
+    return {
+        attr.key: _json_value(state.dict[attr.key])
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+def _row_changes(obj):
+    """Changed columns of a dirty row as ``{field: [old, new]}``."""
+    state = inspect(obj)
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        if old != new:
+            changes[attr.key] = [_json_value(old), _json_value(new)]
+    return changes
+
+
+class AuditPipeline:
+    """Bounded queue of audit events flushed by a background thread."""
+
+    def __init__(self, spool_path=None, queue_size=None, batch_size=None, interval=None):
+        self.spool_path = spool_path or AUDIT_SPOOL_PATH
+        self.batch_size = batch_size or AUDIT_BATCH_SIZE
+        self.interval = AUDIT_FLUSH_INTERVAL if interval is None else interval
+        self._queue = queue.Queue(maxsize=queue_size or AUDIT_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._thread = None
+        self._spool_lock = threading.Lock()
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "spooled": 0, "replayed": 0, "errors": 0}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Replay any spooled events and start the flush thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self.replay_spool()
+        self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything still queued and stop the thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Anything left (e.g. enqueued while stopping) is written inline
+        self._flush_queued()
+
+    def enqueue(self, events):
+        """Queue events without blocking; spool them if the queue is full."""
+        overflow = []
+        for audit_event in events:
+            try:
+                self._queue.put_nowait(audit_event)
+                self.stats["queued"] += 1
+            except queue.Full:
+                overflow.append(audit_event)
+        if overflow:
+            self._spool(overflow)
+
+    def flush(self):
+        """Write every event queued so far before returning."""
+        self._flush_queued()
+        # Wait for a batch the flush thread may be writing
+        self._queue.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush_queued()
+
+    def _flush_queued(self):
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        """Insert a batch in one transaction, spooling it if that fails."""
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(models.AuditEvent), [dict(e) for e in batch])
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Audit note: {e}")
+            self._spool(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _spool(self, events):
+        """Append events to the spool file and sync it to disk."""
+        with self._spool_lock:
+            with open(self.spool_path, "a", encoding="utf-8") as spool:
+                for audit_event in events:
+                    record = dict(audit_event, occurred_at=audit_event["occurred_at"].isoformat())
+                    spool.write(json.dumps(record, separators=(",", ":")) + "\n")
+                spool.flush()
+                os.fsync(spool.fileno())
+        self.stats["spooled"] += len(events)
+
+    def replay_spool(self):
+        """Insert spooled events into the table and remove the spool file."""
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return 0
+            replaying = self.spool_path + ".replay"
+            try:
+                os.replace(self.spool_path, replaying)
+            except FileNotFoundError:
+                # Another worker process took it
+                return 0
+
+        events = []
+        with open(replaying, encoding="utf-8") as spool:
+            for line in spool:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    record["occurred_at"] = datetime.fromisoformat(record["occurred_at"])
+                except (ValueError, KeyError):
+                    # A torn last line from a crash mid-write
+                    continue
+                events.append(record)
+
+        try:
+            with engine.begin() as connection:
+                for start in range(0, len(events), self.batch_size):
+                    connection.execute(insert(models.AuditEvent), events[start:start + self.batch_size])
+        except Exception as e:
+            # Keep the events for the next attempt
+            print(f"Audit note: {e}")
+            with self._spool_lock, open(replaying, "rb") as source, open(self.spool_path, "ab") as spool:
+                spool.write(source.read())
+            os.remove(replaying)
+            return 0
+
+        os.remove(replaying)
+        self.stats["replayed"] += len(events)
+        return len(events)
+
+
+_pipeline = AuditPipeline()
+
+
+def get_pipeline():
+    return _pipeline
+
+
+def start_audit():
+    """Start the flush thread, replaying any spooled events."""
+    if AUDIT_ENABLED:
+        _pipeline.start()
+
+
+def stop_audit():
+    """Write all queued events and stop the flush thread."""
+    _pipeline.stop()
+
+
+# Also drain on interpreter exit when the app's shutdown handler never ran
+atexit.register(stop_audit)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_changes(session, flush_context):
+    """Collect audit events for the rows written by this flush."""
+    if not AUDIT_ENABLED:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for action, objects in (("create", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            if not isinstance(obj, AUDITED_CLASSES):
+                continue
+            if action == "update":
+                changes = _row_changes(obj)
+                if not changes:
+                    continue
+            else:
+                changes = _row_values(obj)
+            pending.append({
+                "table_name": obj.__tablename__,
+                "record_id": obj.id,
+                "action": action,
+                "changes": json.dumps(changes, separators=(",", ":"), default=str),
+            })
+
+
+def record_inserts(session, model, rows):
+    """Audit rows inserted with a Core statement, which flushes don't see.
+
+    ``rows`` holds each row's column values, including its ``id``.
+    """
+    if not AUDIT_ENABLED:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for values in rows:
+        pending.append({
+            "table_name": model.__tablename__,
+            "record_id": values["id"],
+            "action": "create",
+            "changes": json.dumps(
+                {key: _json_value(value) for key, value in values.items()}, separators=(",", ":"), default=str
+            ),
+        })
+
+
+def record_updates(session, model, changes):
+    """Audit rows updated with a Core statement; ``changes`` maps ids to ``{field: [old, new]}``."""
+    if not AUDIT_ENABLED:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for record_id, row_changes in changes.items():
+        if not row_changes:
+            continue
+        pending.append({
+            "table_name": model.__tablename__,
+            "record_id": record_id,
+            "action": "update",
+            "changes": json.dumps(
+                {key: [_json_value(old), _json_value(new)] for key, (old, new) in row_changes.items()},
+                separators=(",", ":"), default=str
+            ),
+        })
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _queue_committed(session):
+    """Hand the committed transaction's events to the pipeline."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    occurred_at = datetime.now(timezone.utc)
+    for audit_event in pending:
+        audit_event["occurred_at"] = occurred_at
+    if not _pipeline.running and AUDIT_ENABLED:
+        _pipeline.start()
+    _pipeline.enqueue(pending)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
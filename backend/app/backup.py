@@ -0,0 +1,198 @@
+"""Online snapshot backups through SQLite's backup API.
+
+Snapshots are consistent copies of the live database taken page by page.
+The source lock is released between steps so writers are never blocked for
+longer than one step. Run as a module for the command line interface:
+
+    python -m app.backup snapshot [--compress]
+    python -m app.backup list
+    python -m app.backup restore <snapshot file>
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from .database import DATABASE_PATH
+
+# Directory snapshots are written to, next to the database by default
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(os.path.dirname(DATABASE_PATH), "backups"))
+# Number of snapshots kept by rotation (0 keeps everything)
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", "14"))
+# Pages copied per backup step and pause between steps (seconds)
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "1024"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.005"))
+
+SNAPSHOT_PREFIX = os.path.splitext(os.path.basename(DATABASE_PATH))[0] + "-"
+SNAPSHOT_SUFFIXES = (".db", ".db.gz")
+
+
+def _snapshot_info(path):
+    """Describe a snapshot file."""
+    stat = os.stat(path)
+    return {
+        "file": os.path.basename(path),
+        "path": path,
+        "size_bytes": stat.st_size,
+        "compressed": path.endswith(".gz"),
+        "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat()
+    }
+
+
+def _copy_database(source, target, pages=None, sleep=None):
+    """Copy one SQLite database into another in steps."""
+    pages = BACKUP_PAGES_PER_STEP if pages is None else pages
+    sleep = BACKUP_STEP_SLEEP if sleep is None else sleep
+    source.backup(target, pages=pages, sleep=sleep)
+
+
+def list_snapshots(backup_dir=None):
+    """List snapshot files, newest first."""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+
+    files = [
+        os.path.join(backup_dir, name)
+        for name in os.listdir(backup_dir)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIXES)
+    ]
+    # Timestamped names sort chronologically
+    files.sort(reverse=True)
+    return [_snapshot_info(path) for path in files]
+
+
+def rotate_snapshots(retention=None, backup_dir=None):
+    """Delete the oldest snapshots beyond the retention count."""
+    retention = BACKUP_RETENTION if retention is None else retention
+    if retention <= 0:
+        return []
+
+    removed = []
+    for snapshot in list_snapshots(backup_dir)[retention:]:
+        os.remove(snapshot["path"])
+        removed.append(snapshot["file"])
+    return removed
+
+
+def create_snapshot(compress=False, backup_dir=None, retention=None):
+    """Write a consistent, timestamped snapshot of the live database."""
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    path = os.path.join(backup_dir, f"{SNAPSHOT_PREFIX}{timestamp}.db")
+
+    # Copy into a temporary file first so a partial snapshot is never listed
+    fd, tmp_path = tempfile.mkstemp(dir=backup_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        source = sqlite3.connect(DATABASE_PATH)
+        target = sqlite3.connect(tmp_path)
+        try:
+            _copy_database(source, target)
+        finally:
+            target.close()
+            source.close()
+
+        if compress:
+            path += ".gz"
+            with open(tmp_path, "rb") as raw, gzip.open(path + ".tmp", "wb", compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            os.replace(path + ".tmp", path)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except Exception:
+        for leftover in (tmp_path, path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    info = _snapshot_info(path)
+    info["duration_seconds"] = round(time.perf_counter() - started, 3)
+    info["rotated"] = rotate_snapshots(retention, backup_dir)
+    return info
+
+
+def restore_snapshot(path):
+    """Restore a snapshot into the live database.
+
+    The copy goes through the backup API as well, so connections held by a
+    running application see the restored data once it completes.
+    """
+    if not os.path.exists(path):
+        # Allow bare file names from the snapshot listing
+        path = os.path.join(BACKUP_DIR, path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Snapshot not found: {path}")
+
+    tmp_path = None
+    if path.endswith(".gz"):
+        fd, tmp_path = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(fd, "wb") as raw, gzip.open(path, "rb") as packed:
+            shutil.copyfileobj(packed, raw, 1024 * 1024)
+        source_path = tmp_path
+    else:
+        source_path = path
+
+    try:
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(DATABASE_PATH)
+        try:
+            result = source.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise ValueError(f"Snapshot failed integrity check: {result}")
+            # Copy in one step so readers never see a half-restored database
+            _copy_database(source, target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+    return {"restored_from": path, "database": DATABASE_PATH}
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Snapshot backups of the medication database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = commands.add_parser("snapshot", help="Write a new snapshot")
+    snapshot_parser.add_argument("--compress", action="store_true", help="gzip the snapshot")
+    snapshot_parser.add_argument("--retention", type=int, default=None,
+                                 help=f"Snapshots to keep (default: {BACKUP_RETENTION})")
+    commands.add_parser("list", help="List snapshots, newest first")
+    restore_parser = commands.add_parser("restore", help="Restore a snapshot into the database")
+    restore_parser.add_argument("snapshot", help="Snapshot path or file name")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        info = create_snapshot(compress=args.compress, retention=args.retention)
+        print(f"✓ Wrote {info['path']} ({info['size_bytes']} bytes in {info['duration_seconds']}s)")
+        for name in info["rotated"]:
+            print(f"  Rotated out {name}")
+    elif args.command == "list":
+        for snapshot in list_snapshots():
+            print(f"{snapshot['file']}\t{snapshot['size_bytes']}\t{snapshot['created_at']}")
+    elif args.command == "restore":
+        try:
+            info = restore_snapshot(args.snapshot)
+        except (FileNotFoundError, ValueError, sqlite3.Error) as e:
+            print(f"✗ Restore failed: {e}")
+            return 1
+        print(f"✓ Restored {info['database']} from {info['restored_from']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
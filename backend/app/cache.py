@@ -0,0 +1,124 @@
+"""In-process caches kept consistent across worker processes.
+
+Each worker has its own caches, so a write handled by one worker has to
+invalidate the others' entries. The invalidation bus is the
+``table_versions`` table: SQLite triggers bump a table's counter in the
+same transaction as every insert, update or delete of its rows, whichever
+worker, endpoint or import made it. A cache entry records the versions of
+the tables it was read from, and is reused only while they are unchanged.
+
+The versions are read in one small query before each lookup, before the
+data itself, so an entry can never be newer than its versions (at worst it
+is reloaded once more than needed). With ``CACHE_VERSION_POLL_SECONDS`` set,
+the versions are reused for that long instead, and other workers' writes
+show up after at most that delay; a worker's own commits still expire them
+at once.
+"""
+import collections
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+
+from . import metrics
+from .database import SessionLocal
+
+# Set to "false" to turn the caches off
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds the table versions are reused; 0 reads them for every lookup
+CACHE_VERSION_POLL_SECONDS = float(os.getenv("CACHE_VERSION_POLL_SECONDS", "0"))
+# Entries kept per cache, least recently used dropped first
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "1024"))
+
+LOOKUPS = metrics.registry.register(metrics.Counter(
+    "cache_lookups_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result")))
+
+
+class VersionBus:
+    """The latest table versions, as last read from ``table_versions``."""
+
+    def __init__(self, poll_seconds=None):
+        self.poll_seconds = CACHE_VERSION_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self._versions = None
+        self._read_at = 0.0
+        self._expirations = 0
+        self._lock = threading.Lock()
+
+    def versions(self, db):
+        """Table versions, read through the session ``db`` unless recent enough."""
+        with self._lock:
+            if self._versions is not None and time.monotonic() - self._read_at < self.poll_seconds:
+                return self._versions
+            expirations = self._expirations
+        read_at = time.monotonic()
+        versions = dict(db.execute(text("SELECT table_name, version FROM table_versions")).all())
+        with self._lock:
+            # Versions read before a concurrent expire() may predate its commit
+            if expirations == self._expirations:
+                self._versions, self._read_at = versions, read_at
+        return versions
+
+    def expire(self):
+        """Read the versions again on the next lookup."""
+        with self._lock:
+            self._versions = None
+            self._expirations += 1
+
+
+bus = VersionBus()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _expire_versions(session):
+    # The commit may have bumped versions; this worker's next reads must see it
+    bus.expire()
+
+
+class VersionedCache:
+    """LRU cache of values read from ``tables``, dropped when any of them changes."""
+
+    def __init__(self, name, tables, size=None):
+        self.name = name
+        self.tables = tuple(tables)
+        self.size = size or CACHE_SIZE
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, key, load):
+        """The cached value for ``key``, or ``load()``'s result, cached."""
+        if not CACHE_ENABLED:
+            return load()
+        versions = bus.versions(db)
+        stamp = tuple(versions.get(table) for table in self.tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                hit = True
+            else:
+                hit = False
+        with metrics.registry.lock:
+            LOOKUPS.inc((self.name, "hit" if hit else "miss"))
+        if hit:
+            return entry[1]
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Active family members, caregivers and all medications, as response schemas
+reference_data = VersionedCache("reference_data", ("family_members", "caregivers", "medications"))
+# Frequency settings and last dose of each assignment, for its status
+assignment_status = VersionedCache(
+    "assignment_status", ("medication_assignments", "medications", "administrations")
+)
@@ -1,9 +1,18 @@
 """Database configuration and session management."""
+import json
 import os
-from sqlalchemy import create_engine, text
+import random
+import sqlite3
+import time
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+try:
+    import fcntl
+except ImportError:  # Not on Windows, where only a single worker is supported
+    fcntl = None
+
 # Get database path from environment or use default
 DATABASE_PATH = os.getenv("DATABASE_PATH", "/app/data/medications.db")
 
@@ -13,10 +22,91 @@ os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
 # Create SQLite engine
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# Journal mode for the database; WAL lets readers run alongside the writer
+DATABASE_JOURNAL_MODE = os.getenv("DATABASE_JOURNAL_MODE", "WAL")
+
+# When WAL shipping is enabled (see replication.py) the replicator performs
+# checkpoints itself, so connections must not auto-checkpoint unshipped frames
+REPLICA_DIR = os.getenv("REPLICA_DIR")
+
+# Version of the schema created by init_db; bump it with every new migration
+# so databases stamped with an older version are migrated on the next start
+SCHEMA_VERSION = 9
+
+# Schema setup at startup: "auto" creates tables and runs migrations when the
+# database's schema version is behind, "skip" leaves it to a release step
+# running `python -m app.migrate`
+DATABASE_MIGRATIONS = os.getenv("DATABASE_MIGRATIONS", "auto")
+
+# Configure the ORM and open a connection in the background once the API is up
+DATABASE_WARMUP = os.getenv("DATABASE_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Seconds a statement waits for another connection's (or worker's) write
+# lock before failing with "database is locked"
+DATABASE_BUSY_TIMEOUT = float(os.getenv("DATABASE_BUSY_TIMEOUT", "5"))
+# Times a statement starting a write transaction is retried when the database
+# stays locked, with a jittered backoff between attempts
+DATABASE_LOCK_RETRIES = int(os.getenv("DATABASE_LOCK_RETRIES", "3"))
+LOCK_RETRY_BACKOFF = 0.05
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": DATABASE_BUSY_TIMEOUT}
 )
 
+
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Apply per-connection SQLite settings."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={DATABASE_JOURNAL_MODE}")
+    if REPLICA_DIR:
+        cursor.execute("PRAGMA wal_autocheckpoint=0")
+    cursor.close()
+
+
+def _retrying_when_locked(cursor, execute):
+    """Run ``execute()``, retrying it while the database is locked.
+
+    Only a statement that starts the connection's transaction is retried:
+    the transaction it opened is rolled back first, so the retry starts
+    afresh. A later statement can't be retried on its own, since SQLite may
+    need the whole transaction rolled back (e.g. after another worker's
+    commit made its snapshot stale).
+    """
+    connection = cursor.connection
+    starts_transaction = not connection.in_transaction
+    for attempt in range(DATABASE_LOCK_RETRIES + 1):
+        try:
+            return execute()
+        except sqlite3.OperationalError as e:
+            from .metrics import is_busy_error, record_busy_retry
+
+            if not starts_transaction or attempt == DATABASE_LOCK_RETRIES or not is_busy_error(e):
+                raise
+            if connection.in_transaction:
+                connection.rollback()
+            record_busy_retry()
+            time.sleep(LOCK_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+@event.listens_for(engine, "do_execute")
+def _do_execute(cursor, statement, parameters, context):
+    _retrying_when_locked(cursor, lambda: cursor.execute(statement, parameters))
+    return True
+
+
+@event.listens_for(engine, "do_execute_no_params")
+def _do_execute_no_params(cursor, statement, context):
+    _retrying_when_locked(cursor, lambda: cursor.execute(statement))
+    return True
+
+
+@event.listens_for(engine, "do_executemany")
+def _do_executemany(cursor, statement, parameters, context):
+    _retrying_when_locked(cursor, lambda: cursor.executemany(statement, parameters))
+    return True
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -24,6 +114,10 @@ Base = declarative_base()
 
 def get_db():
     """Dependency for getting database session."""
+    from .workloads import thread_started
+
+    # Opening the session is the first thing a request runs on the threadpool
+    thread_started()
     db = SessionLocal()
     try:
         yield db
@@ -31,11 +125,92 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database by creating all tables and running migrations."""
+def acquire_file_lock(path, blocking=True):
+    """Take an exclusive lock on ``path`` shared by all worker processes.
+
+    Returns the open lock file, which holds the lock until closed, or None
+    when ``blocking`` is false and another process holds it.
+    """
+    lock_file = open(path, "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def schema_version():
+    """Schema version stamped into the database by the last completed ``init_db``."""
+    with engine.connect() as connection:
+        return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def init_db(force=False):
+    """Initialize database by creating all tables and running migrations.
+
+    A database already stamped with the current ``SCHEMA_VERSION`` is left
+    alone unless ``force`` is set, so a restart costs a single PRAGMA read
+    rather than a probe per table and migration. Returns whether the
+    migrations ran.
+    """
+    if not force and schema_version() >= SCHEMA_VERSION:
+        return False
+    # Workers starting together migrate one at a time; the rest find the schema current
+    lock_file = acquire_file_lock(DATABASE_PATH + "-init.lock")
+    try:
+        if not force and schema_version() >= SCHEMA_VERSION:
+            return False
+        _migrate()
+    finally:
+        lock_file.close()
+    return True
+
+
+def _migrate():
+    _migration_errors.clear()
     Base.metadata.create_all(bind=engine)
     # Run migration for edit history if needed
     _migrate_edit_history()
+    # Convert per-field audit logs into compact assignment revisions if needed
+    _migrate_assignment_revisions()
+    # Run migration for incremental change export if needed
+    _migrate_change_tracking()
+    # Run migration for the inventory ledger if needed
+    _migrate_inventory_ledger()
+    # Add the triggers counting changes for cache invalidation if needed
+    _migrate_table_versions()
+    # Index administrations by assignment and time if needed
+    _migrate_administration_index()
+    # Fill the daily rollups from existing administrations if needed
+    _migrate_daily_rollups()
+    # Track whether idempotent requests committed if needed
+    _migrate_idempotency_applied()
+    # Stamp changed rows with their commit order for incremental exports if needed
+    _migrate_change_sequence()
+    # Stamp the version only when every migration succeeded, so failed ones run again
+    if not _migration_errors:
+        with engine.begin() as connection:
+            connection.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+_migration_errors = []
+
+
+def _migration_failed(error):
+    _migration_errors.append(error)
+    print(f"Migration note: {error}")
+
+
+def warm_up():
+    """Configure the ORM mappers and open a pooled connection ahead of the first request."""
+    from sqlalchemy.orm import configure_mappers
+
+    configure_mappers()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
 
 
 def _migrate_edit_history():
@@ -59,35 +234,324 @@ def _migrate_edit_history():
                     WHERE updated_at IS NULL
                 """))
                 connection.commit()
-            
-            # Check if assignment_audit_logs table exists
-            result = connection.execute(text("""
-                SELECT name FROM sqlite_master 
+    except Exception as e:
+        # If migration fails, log but don't crash - tables will be created by create_all
+        _migration_failed(e)
+
+
+def _legacy_audit_value(field, value):
+    """Convert a str()-ed value from the per-field audit log back to its type."""
+    if value is None:
+        return None
+    if field in ("frequency_hours", "frequency_min_hours", "frequency_max_hours"):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    if field in ("family_member_id", "medication_id"):
+        return int(value)
+    if field == "active":
+        return value == "True"
+    return value
+
+
+def _migrate_assignment_revisions():
+    """Give every assignment a revision history with a creation snapshot.
+
+    Rows of the former per-field ``assignment_audit_logs`` table are grouped
+    into one revision per update, with periodic snapshots, and the table is
+    dropped. The state at creation is found by undoing the logged changes
+    from the current state. Assignments imported before imports recorded
+    their creation get a snapshot of their current state.
+    """
+    from .assignment_history import ASSIGNMENT_SNAPSHOT_INTERVAL, HISTORY_FIELDS
+
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":"))
+
+    try:
+        with engine.begin() as connection:
+            assignments = connection.execute(text(f"""
+                SELECT id, created_at, {', '.join(HISTORY_FIELDS)} FROM medication_assignments
+                WHERE id NOT IN (SELECT assignment_id FROM assignment_revisions)
+            """)).mappings().all()
+            if not assignments:
+                return
+
+            # Legacy entries of one update share the assignment and timestamp
+            updates = {}
+            legacy = connection.execute(text("""
+                SELECT name FROM sqlite_master
                 WHERE type='table' AND name='assignment_audit_logs'
+            """)).first()
+            if legacy:
+                for row in connection.execute(text("""
+                    SELECT assignment_id, field_name, old_value, new_value, changed_at
+                    FROM assignment_audit_logs
+                    ORDER BY assignment_id, changed_at, id
+                """)):
+                    history = updates.setdefault(row.assignment_id, [])
+                    if not history or history[-1][0] != row.changed_at:
+                        history.append((row.changed_at, {}))
+                    history[-1][1][row.field_name] = [
+                        _legacy_audit_value(row.field_name, row.old_value),
+                        _legacy_audit_value(row.field_name, row.new_value)
+                    ]
+
+            revisions = []
+            for assignment in assignments:
+                state = {field: assignment[field] for field in HISTORY_FIELDS}
+                state["active"] = bool(state["active"]) if state["active"] is not None else None
+                history = updates.get(assignment["id"], [])
+                for _, changes in reversed(history):
+                    for field, (old_value, _) in changes.items():
+                        if field in state:
+                            state[field] = old_value
+
+                revisions.append({
+                    "assignment_id": assignment["id"], "changes": None, "snapshot": dumps(state),
+                    "diffs_since_snapshot": 0, "changed_at": assignment["created_at"]
+                })
+                depth = 0
+                for changed_at, changes in history:
+                    for field, (_, new_value) in changes.items():
+                        if field in state:
+                            state[field] = new_value
+                    depth += 1
+                    snapshot = None
+                    if depth >= ASSIGNMENT_SNAPSHOT_INTERVAL:
+                        snapshot, depth = dumps(state), 0
+                    revisions.append({
+                        "assignment_id": assignment["id"], "changes": dumps(changes), "snapshot": snapshot,
+                        "diffs_since_snapshot": depth, "changed_at": changed_at
+                    })
+
+            connection.execute(text("""
+                INSERT INTO assignment_revisions
+                    (assignment_id, changes, snapshot, diffs_since_snapshot, changed_at)
+                VALUES (:assignment_id, :changes, :snapshot, :diffs_since_snapshot, :changed_at)
+            """), revisions)
+            if legacy:
+                connection.execute(text("DROP TABLE assignment_audit_logs"))
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
+
+
+# Tables whose rows carry an updated_at watermark for incremental exports,
+# mapped to the column the watermark is initialised from on migration.
+CHANGE_TRACKED_TABLES = {
+    "family_members": "created_at",
+    "caregivers": "created_at",
+    "medications": "created_at",
+    "medication_assignments": "created_at",
+    "administrations": "created_at",
+}
+
+
+def _migrate_change_tracking():
+    """Migrate database to add updated_at watermarks and their indexes."""
+    try:
+        with engine.connect() as connection:
+            for table, source_column in CHANGE_TRACKED_TABLES.items():
+                result = connection.execute(text(f"PRAGMA table_info({table})"))
+                columns = [row[1] for row in result.fetchall()]
+                
+                if 'updated_at' not in columns:
+                    # SQLite doesn't support DEFAULT CURRENT_TIMESTAMP in ALTER TABLE
+                    connection.execute(text(f"""
+                        ALTER TABLE {table} 
+                        ADD COLUMN updated_at DATETIME
+                    """))
+                    connection.execute(text(f"""
+                        UPDATE {table} 
+                        SET updated_at = {source_column} 
+                        WHERE updated_at IS NULL
+                    """))
+                
+                connection.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_{table}_updated_at 
+                    ON {table}(updated_at)
+                """))
+            
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medication_inventory_last_updated 
+                ON medication_inventory(last_updated)
             """))
+            connection.commit()
+    except Exception as e:
+        # If migration fails, log but don't crash - tables will be created by create_all
+        _migration_failed(e)
+
+
+def _migrate_inventory_ledger():
+    """Migrate database to track inventory through the transaction ledger."""
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text("PRAGMA table_info(medication_inventory)"))
+            columns = [row[1] for row in result.fetchall()]
             
-            if result.fetchone() is None:
-                connection.execute(text("""
-                    CREATE TABLE assignment_audit_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        assignment_id INTEGER NOT NULL,
-                        field_name VARCHAR NOT NULL,
-                        old_value TEXT,
-                        new_value TEXT,
-                        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (assignment_id) REFERENCES medication_assignments(id)
-                    )
-                """))
+            if 'ledger_entries_since_snapshot' not in columns:
                 connection.execute(text("""
-                    CREATE INDEX ix_assignment_audit_logs_assignment_id 
-                    ON assignment_audit_logs(assignment_id)
+                    ALTER TABLE medication_inventory 
+                    ADD COLUMN ledger_entries_since_snapshot INTEGER NOT NULL DEFAULT 0
                 """))
-                connection.execute(text("""
-                    CREATE INDEX ix_assignment_audit_logs_changed_at 
-                    ON assignment_audit_logs(changed_at)
-                """))
-                connection.commit()
+            
+            # Consumption forecast columns
+            forecast_columns = {
+                "consumption_ewma": "FLOAT NOT NULL DEFAULT 0",
+                "consumption_tracked_since": "DATETIME",
+                "consumption_updated_at": "DATETIME",
+                "projected_run_out_at": "DATETIME",
+            }
+            for column, definition in forecast_columns.items():
+                if column not in columns:
+                    connection.execute(text(f"""
+                        ALTER TABLE medication_inventory 
+                        ADD COLUMN {column} {definition}
+                    """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medication_inventory_projected_run_out_at 
+                ON medication_inventory(projected_run_out_at)
+            """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medication_inventory_stock_margin 
+                ON medication_inventory(quantity - low_stock_threshold)
+            """))
+            
+            # Start the ledger of existing inventory with a snapshot of its quantity,
+            # including inventory imported before imports started ledgers
+            unstarted = """
+                medication_id NOT IN (
+                    SELECT medication_id FROM inventory_transactions WHERE kind = 'snapshot'
+                )
+            """
+            connection.execute(text(f"""
+                UPDATE medication_inventory SET ledger_entries_since_snapshot = 0
+                WHERE {unstarted}
+            """))
+            connection.execute(text(f"""
+                INSERT INTO inventory_transactions (medication_id, kind, quantity_change, balance, created_at)
+                SELECT medication_id, 'snapshot', 0, quantity, CURRENT_TIMESTAMP
+                FROM medication_inventory
+                WHERE {unstarted}
+            """))
+            connection.commit()
     except Exception as e:
         # If migration fails, log but don't crash - tables will be created by create_all
-        print(f"Migration note: {e}")
+        _migration_failed(e)
+
+
+# Tables whose writes are counted in table_versions, for caches across workers
+VERSIONED_TABLES = ("family_members", "caregivers", "medications", "medication_assignments", "administrations")
 
+
+def _migrate_table_versions():
+    """Count every write to the versioned tables with triggers."""
+    try:
+        with engine.begin() as connection:
+            for table in VERSIONED_TABLES:
+                connection.execute(
+                    text("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (:table, 0)"),
+                    {"table": table}
+                )
+                for operation in ("INSERT", "UPDATE", "DELETE"):
+                    connection.execute(text(f"""
+                        CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()}
+                        AFTER {operation} ON {table}
+                        BEGIN
+                            UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                        END
+                    """))
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
+
+
+def _migrate_administration_index():
+    """Index administrations by assignment and time, for last-dose lookups."""
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_administrations_assignment_administered_at 
+                ON administrations(medication_assignment_id, administered_at)
+            """))
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
+
+
+def _migrate_daily_rollups():
+    """Build the daily rollups of administrations recorded before they existed."""
+    from .rollups import rebuild
+
+    try:
+        with engine.connect() as connection:
+            empty = connection.execute(text("SELECT 1 FROM administration_daily_rollups LIMIT 1")).first() is None
+            if not empty or connection.execute(text("SELECT 1 FROM administrations LIMIT 1")).first() is None:
+                return
+        db = SessionLocal()
+        try:
+            rebuild(db)
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
+
+
+def _migrate_idempotency_applied():
+    """Add the column marking idempotency keys whose request committed."""
+    try:
+        with engine.begin() as connection:
+            result = connection.execute(text("PRAGMA table_info(idempotency_keys)"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'applied_at' not in columns:
+                connection.execute(text("ALTER TABLE idempotency_keys ADD COLUMN applied_at DATETIME"))
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
+
+
+# Tables whose rows are stamped with a change_seq for incremental exports
+CHANGE_SEQUENCED_TABLES = tuple(CHANGE_TRACKED_TABLES) + ("medication_inventory", "deleted_records")
+
+
+def _migrate_change_sequence():
+    """Stamp every write to the exported tables with the next change sequence number.
+
+    SQLite runs one write transaction at a time, and the counter is bumped
+    inside it, so numbers grow in commit order: a change committed after a
+    reader saw the counter always gets a higher number. Rows written before
+    the migration keep 0.
+    """
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)"))
+            for table in CHANGE_SEQUENCED_TABLES:
+                result = connection.execute(text(f"PRAGMA table_info({table})"))
+                columns = [row[1] for row in result.fetchall()]
+                if 'change_seq' not in columns:
+                    connection.execute(text(f"""
+                        ALTER TABLE {table} 
+                        ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0
+                    """))
+                connection.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_{table}_change_seq 
+                    ON {table}(change_seq)
+                """))
+                # The update trigger skips the stamping update itself
+                for operation, condition in (("INSERT", ""), ("UPDATE", "WHEN NEW.change_seq IS OLD.change_seq")):
+                    connection.execute(text(f"""
+                        CREATE TRIGGER IF NOT EXISTS {table}_change_seq_{operation.lower()}
+                        AFTER {operation} ON {table} {condition}
+                        BEGIN
+                            UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+                            UPDATE {table} SET change_seq = (SELECT value FROM change_sequence WHERE id = 1)
+                            WHERE id = NEW.id;
+                        END
+                    """))
+    except Exception as e:
+        # If migration fails, log but don't crash
+        _migration_failed(e)
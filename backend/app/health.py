@@ -0,0 +1,145 @@
+"""Readiness check for load balancers and container orchestrators.
+
+``/api/health`` only shows the process is up. The readiness check runs a
+timed trivial query on a pooled connection (in the threadpool, like the
+API's endpoints, so a saturated pool or threadpool delays it too) and
+reports the database's WAL size, page count and free pages, free disk
+space, connection pool usage, the threadpool's queued requests and the
+event loop's scheduling lag. The instance is reported not ready (HTTP 503)
+when the query fails or exceeds its timeout, or when a limit below is
+exceeded.
+
+Results are cached for ``HEALTH_CACHE_SECONDS`` and concurrent probes share
+one check, so frequent probes stay cheap.
+"""
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import anyio.to_thread
+from sqlalchemy import text
+
+from .database import DATABASE_PATH, engine
+
+# Seconds a readiness result is reused for
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "1.0"))
+# Seconds the probe query may take, including waiting for a worker thread
+HEALTH_QUERY_TIMEOUT = float(os.getenv("HEALTH_QUERY_TIMEOUT", "2.0"))
+# Requests waiting for a worker thread beyond which the instance is saturated
+HEALTH_MAX_QUEUED = int(os.getenv("HEALTH_MAX_QUEUED", "20"))
+# Event loop scheduling lag beyond which the instance is saturated
+HEALTH_MAX_LOOP_LAG_MS = float(os.getenv("HEALTH_MAX_LOOP_LAG_MS", "250"))
+# Free disk space below which writes are at risk
+HEALTH_MIN_FREE_MB = float(os.getenv("HEALTH_MIN_FREE_MB", "50"))
+
+
+def _database_check():
+    """Time a trivial query and read the database's size counters."""
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1")).scalar()
+        latency_ms = (time.perf_counter() - started) * 1000
+        page_size = connection.execute(text("PRAGMA page_size")).scalar()
+        page_count = connection.execute(text("PRAGMA page_count")).scalar()
+        freelist_count = connection.execute(text("PRAGMA freelist_count")).scalar()
+    return {
+        "latency_ms": round(latency_ms, 3),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+    }
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _pool_status():
+    pool = engine.pool
+    status = {"checked_out": pool.checkedout()}
+    # QueuePool also has a fixed size and overflow connections
+    if hasattr(pool, "overflow"):
+        status.update(size=pool.size(), overflow=max(pool.overflow(), 0))
+    return status
+
+
+def _threadpool_status():
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    return {
+        "busy": statistics.borrowed_tokens,
+        "limit": statistics.total_tokens,
+        "queued": statistics.tasks_waiting,
+    }
+
+
+async def _loop_lag_ms():
+    """Delay before the event loop runs a callback scheduled now."""
+    loop = asyncio.get_running_loop()
+    scheduled = time.perf_counter()
+    ran = loop.create_future()
+    loop.call_soon(lambda: ran.set_result(time.perf_counter()))
+    return round((await ran - scheduled) * 1000, 3)
+
+
+async def check_readiness():
+    """Run the readiness checks; returns ``(ready, details)``."""
+    problems = []
+    details = {}
+
+    details["loop_lag_ms"] = await _loop_lag_ms()
+    if details["loop_lag_ms"] > HEALTH_MAX_LOOP_LAG_MS:
+        problems.append("event loop lagging")
+
+    details["threadpool"] = _threadpool_status()
+    if details["threadpool"]["queued"] > HEALTH_MAX_QUEUED:
+        problems.append("threadpool saturated")
+
+    try:
+        details["database"] = await asyncio.wait_for(
+            anyio.to_thread.run_sync(_database_check), HEALTH_QUERY_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        details["database"] = {"error": f"query took longer than {HEALTH_QUERY_TIMEOUT}s"}
+        problems.append("database query timed out")
+    except Exception as e:
+        details["database"] = {"error": str(e)}
+        problems.append("database query failed")
+    details["database"]["wal_bytes"] = _file_size(f"{DATABASE_PATH}-wal")
+    details["database"]["file_bytes"] = _file_size(DATABASE_PATH)
+
+    details["pool"] = _pool_status()
+
+    disk = shutil.disk_usage(os.path.dirname(DATABASE_PATH))
+    details["disk_free_mb"] = round(disk.free / 2**20, 1)
+    if details["disk_free_mb"] < HEALTH_MIN_FREE_MB:
+        problems.append("disk almost full")
+
+    return not problems, {"problems": problems, **details}
+
+
+_cached = None
+_cached_at = 0.0
+_check_lock = asyncio.Lock()
+
+
+async def readiness():
+    """Cached readiness result as a dict with ``status``, ``ready`` and the details."""
+    global _cached, _cached_at
+    async with _check_lock:
+        now = time.monotonic()
+        if _cached is None or now - _cached_at >= HEALTH_CACHE_SECONDS:
+            ready, details = await check_readiness()
+            _cached = {
+                "status": "ready" if ready else "unavailable",
+                "ready": ready,
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+                **details,
+            }
+            _cached_at = time.monotonic()
+        return _cached
@@ -0,0 +1,348 @@
+"""Idempotency-Key support for create endpoints.
+
+The frontend retries failed requests, so a create whose response was lost
+after it committed would otherwise run twice (e.g. two doses logged for
+one). A client that sends an ``Idempotency-Key`` header gets the first
+response to that key back for every retry, without the endpoint running
+again; endpoints opt in with ``@idempotent``.
+
+The first request with a key claims it in the ``idempotency_keys`` table,
+which all worker processes share, and stores its response there once
+handled. A retry arriving while the first is still being handled waits for
+it. Reusing a key for a different request (another path or body) is a 422.
+
+The claim is marked applied in the same transaction as the endpoint's own
+commit. A claim abandoned before its response was stored (the worker died,
+or the request failed after committing) is run again only if it was never
+applied; otherwise retries get a final 409 rather than repeating the
+create.
+Keys expire after ``IDEMPOTENCY_TTL_HOURS``; completed responses are also
+kept in a bounded in-memory cache per worker, so a replay usually runs no
+query at all. Responses with a 5xx status are not stored, so the request
+can be retried for real.
+"""
+import asyncio
+import collections
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.dialects.sqlite import insert
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+from . import metrics, models
+from .database import SessionLocal, engine
+
+# Hours a key's response is replayed for
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Completed responses kept in memory per worker, least recently used dropped first
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1000"))
+# Seconds a retry waits for the first request with its key before a 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# A claim this old whose response was never stored was abandoned (e.g. the worker died)
+STALE_CLAIM = timedelta(minutes=5)
+POLL_INTERVAL = 0.05
+# Expired keys are deleted after every this many stored responses
+PURGE_EVERY = 100
+
+REPLAYS = metrics.registry.register(metrics.Counter(
+    "idempotent_replays_total", "Responses replayed for a reused Idempotency-Key, by source.", ("source",)))
+
+_table = models.IdempotencyKey.__table__
+# Key held by the request being handled
+_current_key = contextvars.ContextVar("idempotency_key", default=None)
+# Answer to retries of a request that committed but whose response was lost
+_APPLIED_DETAIL = "The request with this Idempotency-Key was applied but its response was lost; reload to see it"
+
+
+def idempotent(endpoint):
+    """Let requests to a route carry an Idempotency-Key."""
+    endpoint.idempotent = True
+    return endpoint
+
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status_code", "content_type", "body", "expires_at")
+
+    def __init__(self, fingerprint, status_code, content_type, body, expires_at):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.content_type = content_type
+        self.body = body
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Bounded LRU of completed responses by key."""
+
+    def __init__(self, size=None):
+        self.size = size or IDEMPOTENCY_CACHE_SIZE
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return stored
+
+    def put(self, key, stored):
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+responses = ResponseCache()
+_stores = 0
+_stores_lock = threading.Lock()
+
+
+def fingerprint(scope, body):
+    """Hash of what makes two requests the same: method, path, query and body."""
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _utc(value):
+    # SQLite returns stored datetimes without their time zone
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def claim(key, request_fingerprint):
+    """Claim ``key`` for a new request.
+
+    Returns None when claimed, "pending" while another request holds it, or
+    the StoredResponse of the request that completed it.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    with engine.begin() as connection:
+        inserted = connection.execute(
+            insert(_table).values(
+                key=key, fingerprint=request_fingerprint, created_at=now, expires_at=expires_at
+            ).on_conflict_do_nothing()
+        ).rowcount
+        if inserted:
+            return None
+        row = connection.execute(select(_table).where(_table.c.key == key)).first()
+        if row is None:
+            # Deleted since the insert failed; the caller tries again
+            return "pending"
+        abandoned = row.status_code is None and _utc(row.created_at) <= now - STALE_CLAIM
+        if abandoned and row.applied_at is not None:
+            # Running it again would repeat its changes
+            status_code, content_type, body = _json_response(409, _APPLIED_DETAIL)
+            connection.execute(
+                update(_table).where(_table.c.key == key)
+                .values(status_code=status_code, content_type=content_type, body=body)
+            )
+            return StoredResponse(row.fingerprint, status_code, content_type, body, _utc(row.expires_at))
+        if _utc(row.expires_at) <= now or abandoned:
+            taken = connection.execute(
+                update(_table)
+                .where(_table.c.key == key, _table.c.created_at == row.created_at)
+                .values(fingerprint=request_fingerprint, status_code=None, content_type=None, body=None,
+                        applied_at=None, created_at=now, expires_at=expires_at)
+            ).rowcount
+            return None if taken else "pending"
+        if row.status_code is None:
+            return "pending"
+        return StoredResponse(row.fingerprint, row.status_code, row.content_type, row.body, _utc(row.expires_at))
+
+
+def complete(key, status_code, content_type, body):
+    """Store the response of the request holding ``key``."""
+    global _stores
+    with engine.begin() as connection:
+        connection.execute(
+            update(_table).where(_table.c.key == key)
+            .values(status_code=status_code, content_type=content_type, body=body)
+        )
+    with _stores_lock:
+        _stores += 1
+        purge = _stores % PURGE_EVERY == 0
+    if purge:
+        purge_expired()
+
+
+def release(key):
+    """Give up the claim on ``key`` so a retry runs the request again, unless it was applied."""
+    status_code, content_type, body = _json_response(409, _APPLIED_DETAIL)
+    with engine.begin() as connection:
+        connection.execute(delete(_table).where(
+            _table.c.key == key, _table.c.status_code.is_(None), _table.c.applied_at.is_(None)
+        ))
+        connection.execute(
+            update(_table).where(_table.c.key == key, _table.c.status_code.is_(None))
+            .values(status_code=status_code, content_type=content_type, body=body)
+        )
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _mark_applied(session):
+    """Mark the current request's claim applied in the transaction committing its changes."""
+    key = _current_key.get()
+    if key is not None:
+        session.execute(
+            update(_table).where(_table.c.key == key, _table.c.status_code.is_(None))
+            .values(applied_at=datetime.now(timezone.utc))
+        )
+
+
+def purge_expired():
+    """Delete expired keys; returns how many."""
+    with engine.begin() as connection:
+        return connection.execute(
+            delete(_table).where(_table.c.expires_at <= datetime.now(timezone.utc))
+        ).rowcount
+
+
+def _json_response(status_code, detail):
+    return status_code, "application/json", json.dumps({"detail": detail}).encode()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying responses for reused Idempotency-Keys."""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    def _is_idempotent(self, scope):
+        for route in self.router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(child_scope.get("endpoint"), "idempotent", False)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        key = next((value.decode("latin-1") for name, value in scope["headers"] if name == HEADER.encode()), None)
+        if key is None or not self._is_idempotent(scope):
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            await self._send(send, *_json_response(
+                400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"))
+            return
+
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request" or not message.get("more_body", False):
+                break
+        request_fingerprint = fingerprint(scope, b"".join(m.get("body", b"") for m in messages))
+
+        stored = responses.get(key, datetime.now(timezone.utc))
+        source = "memory"
+        if stored is None:
+            source = "database"
+            waited = 0.0
+            while True:
+                stored = await run_in_threadpool(claim, key, request_fingerprint)
+                if stored != "pending":
+                    break
+                if waited >= IDEMPOTENCY_WAIT_SECONDS:
+                    await self._send(send, *_json_response(
+                        409, "A request with this Idempotency-Key is still in progress"), retry_after=True)
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                waited += POLL_INTERVAL
+            if stored is not None:
+                responses.put(key, stored)
+
+        if stored is not None:
+            if stored.fingerprint != request_fingerprint:
+                await self._send(send, *_json_response(
+                    422, "Idempotency-Key was already used for a different request"))
+                return
+            with metrics.registry.lock:
+                REPLAYS.inc((source,))
+            await self._send(send, stored.status_code, stored.content_type, stored.body, replayed=True)
+            return
+
+        await self._handle(scope, messages, receive, send, key, request_fingerprint)
+
+    async def _handle(self, scope, messages, receive, send, key, request_fingerprint):
+        """Run the request holding ``key`` and store its response before sending it."""
+        pending = collections.deque(messages)
+
+        async def replay_receive():
+            if pending:
+                return pending.popleft()
+            return await receive()
+
+        start, body = None, []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        token = _current_key.set(key)
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await run_in_threadpool(release, key)
+            raise
+        finally:
+            _current_key.reset(token)
+
+        content = b"".join(body)
+        if start["status"] < 500:
+            content_type = next(
+                (value.decode("latin-1") for name, value in start["headers"] if name == b"content-type"), None
+            )
+            await run_in_threadpool(complete, key, start["status"], content_type, content)
+            responses.put(key, StoredResponse(
+                request_fingerprint, start["status"], content_type, content,
+                datetime.now(timezone.utc) + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+            ))
+        else:
+            await run_in_threadpool(release, key)
+        await send(start)
+        await send({"type": "http.response.body", "body": content})
+
+    @staticmethod
+    async def _send(send, status_code, content_type, body, replayed=False, retry_after=False):
+        headers = [(b"content-length", str(len(body or b"")).encode())]
+        if content_type:
+            headers.append((b"content-type", content_type.encode("latin-1")))
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        if retry_after:
+            headers.append((b"retry-after", b"1"))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body or b""})
+
+
+def install(app):
+    """Add the middleware; endpoints opt in with ``@idempotent``."""
+    app.add_middleware(IdempotencyMiddleware, router=app.router)
@@ -0,0 +1,409 @@
+"""Inventory transaction ledger.
+
+Every change to a medication's stock is appended to ``inventory_transactions``
+and applied to ``medication_inventory.quantity`` with a single SQL-side
+``quantity = quantity + :change`` update, so concurrent writers never lose
+each other's changes. Callers commit the session; the ledger entry and the
+change that caused it share one transaction.
+
+Every ``LEDGER_SNAPSHOT_INTERVAL`` entries a snapshot entry recording the
+balance is appended, so reconciling a balance against the ledger never sums
+more than that many entries.
+
+Each change also maintains a consumption rate per medication, kept as an
+exponentially weighted sum of consumed amounts that decays with time
+constant ``CONSUMPTION_RATE_WINDOW_DAYS``. It is updated in O(1) per dose
+and gives the projected run-out date used by the low-stock check.
+"""
+import math
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "100"))
+CONSUMPTION_RATE_WINDOW_DAYS = float(os.getenv("CONSUMPTION_RATE_WINDOW_DAYS", "7"))
+# Stock projected to run out within this many days counts as low
+LOW_STOCK_FORECAST_DAYS = float(os.getenv("LOW_STOCK_FORECAST_DAYS", "7"))
+# Projections further out than this are not meaningful (and overflow datetime)
+MAX_PROJECTION_DAYS = 36500
+
+# Leading amount and unit of a dose, e.g. "2.5mL", "1 tablet", "1/2 tablet",
+# "1 1/2 tablets". Ranges ("1-2 tablets") and per-unit doses ("5mg/kg") don't
+# match, as the amount actually given isn't known.
+_DOSE_PATTERN = re.compile(
+    r"^\s*(?:(\d+)\s+(?=\d+\s*/))?(\d+(?:[.,]\d+)?)(?:\s*/\s*(\d+))?"
+    r"\s*([a-zA-Z]+)(?![a-zA-Z])(?!\s*[/-])"
+)
+
+
+def _unit_key(unit):
+    """Normalize a unit for comparison ("Tablets" matches "tablet")."""
+    unit = (unit or "").strip().lower()
+    return unit[:-1] if unit.endswith("s") and len(unit) > 1 else unit
+
+
+def dose_amount(dose_given, inventory_unit):
+    """Amount of stock a dose consumes, or None if it can't be determined.
+
+    The dose must start with a number or fraction followed by a unit that
+    matches the inventory unit, since doses are not converted between units
+    and a dose without one can't be told apart from a dose in another unit.
+    """
+    match = _DOSE_PATTERN.match(dose_given or "")
+    if not match:
+        return None
+    whole, amount, denominator, dose_unit = match.groups()
+    if _unit_key(dose_unit) != _unit_key(inventory_unit):
+        return None
+    amount = float(amount.replace(",", "."))
+    if denominator is not None:
+        if not int(denominator):
+            return None
+        amount /= int(denominator)
+    if whole is not None:
+        amount += int(whole)
+    return amount
+
+
+def _append_snapshot(db: Session, medication_id, quantity):
+    """Append a snapshot entry and restart the entry count."""
+    db.execute(insert(models.InventoryTransaction).values(
+        medication_id=medication_id,
+        kind="snapshot",
+        quantity_change=0,
+        balance=quantity
+    ))
+    db.execute(
+        update(models.MedicationInventory)
+        .where(models.MedicationInventory.medication_id == medication_id)
+        .values(ledger_entries_since_snapshot=0)
+    )
+
+
+def _utc(value):
+    """Treat naive datetimes read back from SQLite as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _days(delta):
+    return delta.total_seconds() / 86400
+
+
+def consumption_rate(ewma, updated_at, tracked_since, now=None):
+    """Consumption per day from the exponentially weighted sum.
+
+    The sum is decayed to ``now``. Dividing by the weight accumulated since
+    tracking started makes short histories a plain average instead of
+    underestimating the rate.
+    """
+    if not ewma or updated_at is None or tracked_since is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    window = CONSUMPTION_RATE_WINDOW_DAYS
+    decayed = ewma * math.exp(-max(_days(now - _utc(updated_at)), 0) / window)
+    observed = max(_days(now - _utc(tracked_since)), 1.0)
+    return decayed / (window * (1 - math.exp(-observed / window)))
+
+
+def projected_run_out(quantity, rate, now=None):
+    """Date the stock runs out at the given rate, or None if not consuming.
+
+    A rate decayed to almost nothing (no doses for months) projects beyond
+    ``MAX_PROJECTION_DAYS``, which also counts as not consuming.
+    """
+    if rate <= 0:
+        return None
+    days = max(quantity, 0) / rate
+    if days > MAX_PROJECTION_DAYS:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return now + timedelta(days=days)
+
+
+def _update_forecast(db: Session, medication_id, row, consumed=0):
+    """Fold a consumed amount into the rate and re-project the run-out date.
+
+    ``row`` carries the values returned by the quantity update. That update
+    holds SQLite's write lock for the rest of the transaction, so no other
+    writer can change the averages between reading and rewriting them.
+    """
+    now = datetime.now(timezone.utc)
+    ewma = row.consumption_ewma or 0.0
+    updated_at = _utc(row.consumption_updated_at)
+    tracked_since = _utc(row.consumption_tracked_since)
+    if consumed:
+        if updated_at is not None:
+            ewma *= math.exp(-max(_days(now - updated_at), 0) / CONSUMPTION_RATE_WINDOW_DAYS)
+        ewma = max(ewma + consumed, 0.0)
+        updated_at = now
+        tracked_since = tracked_since or now
+
+    rate = consumption_rate(ewma, updated_at, tracked_since, now)
+    db.execute(
+        update(models.MedicationInventory)
+        .where(models.MedicationInventory.medication_id == medication_id)
+        .values(
+            consumption_ewma=ewma,
+            consumption_updated_at=updated_at,
+            consumption_tracked_since=tracked_since,
+            projected_run_out_at=projected_run_out(row.quantity, rate, now)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+_RETURNED_STATE = (
+    models.MedicationInventory.quantity,
+    models.MedicationInventory.ledger_entries_since_snapshot,
+    models.MedicationInventory.consumption_ewma,
+    models.MedicationInventory.consumption_updated_at,
+    models.MedicationInventory.consumption_tracked_since,
+)
+
+
+def apply_change(db: Session, medication_id, quantity_change, kind, administration_id=None):
+    """Atomically apply a quantity change and record it in the ledger.
+
+    Returns the new quantity, or None if the medication has no inventory.
+    """
+    inventory = models.MedicationInventory
+    row = db.execute(
+        update(inventory)
+        .where(inventory.medication_id == medication_id)
+        .values(
+            quantity=inventory.quantity + quantity_change,
+            ledger_entries_since_snapshot=inventory.ledger_entries_since_snapshot + 1
+        )
+        .returning(*_RETURNED_STATE)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+
+    db.execute(insert(models.InventoryTransaction).values(
+        medication_id=medication_id,
+        administration_id=administration_id,
+        kind=kind,
+        quantity_change=quantity_change
+    ))
+    if row.ledger_entries_since_snapshot >= LEDGER_SNAPSHOT_INTERVAL:
+        _append_snapshot(db, medication_id, row.quantity)
+    # Consumption and its reversals move the rate; every change moves the run-out date
+    consumed = -quantity_change if kind in ("consumption", "reversal") else 0
+    _update_forecast(db, medication_id, row, consumed)
+    return row.quantity
+
+
+def set_quantity(db: Session, medication_id, quantity):
+    """Set an absolute quantity (e.g. after a stock count) as a ledger adjustment.
+
+    The adjustment is computed from the stored quantity inside the insert
+    itself, which takes the write lock, so no concurrent change is lost from
+    the ledger between reading and writing the quantity.
+    """
+    inventory = models.MedicationInventory
+    db.execute(
+        insert(models.InventoryTransaction).from_select(
+            ["medication_id", "kind", "quantity_change"],
+            select(
+                inventory.medication_id,
+                literal("adjustment"),
+                literal(quantity) - inventory.quantity
+            ).where(inventory.medication_id == medication_id)
+        )
+    )
+    row = db.execute(
+        update(inventory)
+        .where(inventory.medication_id == medication_id)
+        .values(
+            quantity=quantity,
+            ledger_entries_since_snapshot=inventory.ledger_entries_since_snapshot + 1
+        )
+        .returning(*_RETURNED_STATE)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+    if row.ledger_entries_since_snapshot >= LEDGER_SNAPSHOT_INTERVAL:
+        _append_snapshot(db, medication_id, quantity)
+    _update_forecast(db, medication_id, row)
+    return quantity
+
+
+def low_stock_condition(forecast_days=None, now=None):
+    """SQL condition for low stock.
+
+    Stock is low when it is at or below its threshold, or when it is
+    projected to run out within ``forecast_days`` and was consumed within
+    the rate window (an old projection says nothing about current use).
+    Both terms are served by indexes on the inventory table.
+    """
+    inventory = models.MedicationInventory
+    forecast_days = LOW_STOCK_FORECAST_DAYS if forecast_days is None else forecast_days
+    now = now or datetime.now(timezone.utc)
+    return or_(
+        and_(
+            inventory.low_stock_threshold > 0,
+            inventory.quantity - inventory.low_stock_threshold <= 0
+        ),
+        and_(
+            inventory.projected_run_out_at <= now + timedelta(days=forecast_days),
+            inventory.consumption_updated_at >= now - timedelta(days=CONSUMPTION_RATE_WINDOW_DAYS)
+        )
+    )
+
+
+def forecast(item, forecast_days=None, now=None):
+    """Consumption forecast for one inventory record, from its stored state."""
+    forecast_days = LOW_STOCK_FORECAST_DAYS if forecast_days is None else forecast_days
+    now = now or datetime.now(timezone.utc)
+    rate = consumption_rate(
+        item.consumption_ewma, item.consumption_updated_at, item.consumption_tracked_since, now
+    )
+    run_out = projected_run_out(item.quantity, rate, now)
+    days_remaining = max(item.quantity, 0) / rate if run_out is not None else None
+    below_threshold = bool(item.low_stock_threshold) and item.quantity <= item.low_stock_threshold
+    return {
+        "inventory_id": item.id,
+        "medication_id": item.medication_id,
+        "quantity": item.quantity,
+        "unit": item.unit,
+        "low_stock_threshold": item.low_stock_threshold,
+        "consumption_per_day": round(rate, 4),
+        "days_remaining": round(days_remaining, 2) if days_remaining is not None else None,
+        "projected_run_out_at": run_out,
+        "low_stock": below_threshold or (days_remaining is not None and days_remaining <= forecast_days)
+    }
+
+
+def start_ledger(db: Session, medication_id, quantity):
+    """Start the ledger of a new inventory record with its initial quantity."""
+    _append_snapshot(db, medication_id, quantity)
+
+
+def start_ledgers(db: Session, inventories):
+    """Start the ledgers of inventory records inserted in bulk, with one statement.
+
+    ``inventories`` holds each record's ``medication_id`` and ``quantity``;
+    their entry counts must still be at their default of zero.
+    """
+    if inventories:
+        db.execute(insert(models.InventoryTransaction.__table__), [
+            {"medication_id": inventory["medication_id"], "kind": "snapshot",
+             "quantity_change": 0, "balance": inventory["quantity"]}
+            for inventory in inventories
+        ])
+
+
+def record_consumption(db: Session, medication_id, administration_id, dose_given):
+    """Consume stock for an administration, if the dose amount is known."""
+    unit = db.query(models.MedicationInventory.unit).filter(
+        models.MedicationInventory.medication_id == medication_id
+    ).scalar()
+    if unit is None:
+        return None
+    amount = dose_amount(dose_given, unit)
+    if not amount:
+        return None
+    return apply_change(db, medication_id, -amount, "consumption", administration_id)
+
+
+def record_consumptions(db: Session, consumptions):
+    """Consume stock for several administrations at once.
+
+    ``consumptions`` holds ``(medication_id, administration_id, dose_given)``.
+    Inventory units are looked up with one query, each medication's quantity
+    and forecast are updated once for its total, and the ledger entries are
+    inserted together.
+    """
+    medication_ids = {medication_id for medication_id, _, _ in consumptions}
+    units = dict(db.query(
+        models.MedicationInventory.medication_id, models.MedicationInventory.unit
+    ).filter(models.MedicationInventory.medication_id.in_(medication_ids)).all())
+    entries = []
+    totals = {}
+    for medication_id, administration_id, dose_given in consumptions:
+        if medication_id not in units:
+            continue
+        amount = dose_amount(dose_given, units[medication_id])
+        if not amount:
+            continue
+        entries.append({
+            "medication_id": medication_id,
+            "administration_id": administration_id,
+            "kind": "consumption",
+            "quantity_change": -amount
+        })
+        count, total = totals.get(medication_id, (0, 0.0))
+        totals[medication_id] = (count + 1, total + amount)
+    if not entries:
+        return
+
+    inventory = models.MedicationInventory
+    db.execute(insert(models.InventoryTransaction), entries)
+    for medication_id, (count, total) in totals.items():
+        row = db.execute(
+            update(inventory)
+            .where(inventory.medication_id == medication_id)
+            .values(
+                quantity=inventory.quantity - total,
+                ledger_entries_since_snapshot=inventory.ledger_entries_since_snapshot + count
+            )
+            .returning(*_RETURNED_STATE)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            continue
+        if row.ledger_entries_since_snapshot >= LEDGER_SNAPSHOT_INTERVAL:
+            _append_snapshot(db, medication_id, row.quantity)
+        _update_forecast(db, medication_id, row, total)
+
+
+def reverse_consumption(db: Session, medication_id, administration_id):
+    """Return the stock an administration consumed, e.g. when it is deleted."""
+    consumed = db.query(func.sum(models.InventoryTransaction.quantity_change)).filter(
+        models.InventoryTransaction.administration_id == administration_id,
+        models.InventoryTransaction.medication_id == medication_id
+    ).scalar()
+    if not consumed:
+        return None
+    return apply_change(db, medication_id, -consumed, "reversal", administration_id)
+
+
+def ledger_balance(db: Session, medication_id):
+    """Reconcile the stored quantity against the ledger since its last snapshot."""
+    quantity = db.query(models.MedicationInventory.quantity).filter(
+        models.MedicationInventory.medication_id == medication_id
+    ).scalar()
+    if quantity is None:
+        return None
+
+    snapshot = db.query(models.InventoryTransaction).filter(
+        models.InventoryTransaction.medication_id == medication_id,
+        models.InventoryTransaction.kind == "snapshot"
+    ).order_by(models.InventoryTransaction.id.desc()).first()
+    since_id = snapshot.id if snapshot else 0
+    changes, entries = db.query(
+        func.coalesce(func.sum(models.InventoryTransaction.quantity_change), 0),
+        func.count(models.InventoryTransaction.id)
+    ).filter(
+        models.InventoryTransaction.medication_id == medication_id,
+        models.InventoryTransaction.id > since_id
+    ).one()
+
+    balance = (snapshot.balance if snapshot else 0) + changes
+    return {
+        "medication_id": medication_id,
+        "quantity": quantity,
+        "ledger_balance": balance,
+        "snapshot_id": snapshot.id if snapshot else None,
+        "entries_since_snapshot": entries,
+        "consistent": abs(balance - quantity) < 1e-9
+    }
@@ -1,11 +1,16 @@
 """FastAPI application entry point."""
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
+import threading
 
-from .database import init_db
+from .database import DATABASE_MIGRATIONS, DATABASE_WARMUP, init_db, warm_up
+from .audit import start_audit, stop_audit
+from . import health, idempotency, metrics, profiling, query_inspection, slow_queries, workloads
+from .replication import start_replicator, stop_replicator
+from .static_files import STATIC_DIR, FrontendFiles
 from .routers import (
     family_members,
     caregivers,
@@ -13,14 +18,49 @@ from .routers import (
     assignments,
     administrations,
     inventory,
-    export
+    export,
+    backup,
+    audit,
+    admin,
+    reports
 )
 
-# Initialize database
-init_db()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Prepare the database and start background services; stop them on shutdown.
+
+    Schema setup is a single version check on an up-to-date database, and is
+    skipped entirely with ``DATABASE_MIGRATIONS=skip``. Warming up the ORM
+    runs in the background so it does not delay the first health check.
+    """
+    # Exports and imports run on their own executor; the threadpool serves the rest
+    workloads.configure_threadpool()
+    if DATABASE_MIGRATIONS != "skip":
+        init_db()
+    # Start the audit log writer, and WAL shipping when a replica directory is configured
+    start_audit()
+    start_replicator()
+    if DATABASE_WARMUP:
+        threading.Thread(target=warm_up, name="database-warmup", daemon=True).start()
+    yield
+    # Write queued audit events and ship outstanding WAL frames before the process exits
+    stop_audit()
+    stop_replicator()
+
 
 # Create FastAPI app
-app = FastAPI(title="Home Medication Tracker API", version="1.0.0")
+app = FastAPI(title="Home Medication Tracker API", version="1.0.0", lifespan=lifespan)
+
+
+# Replay the stored response to create requests retried with an Idempotency-Key
+idempotency.install(app)
+# Record request latency and SQL query counts per route
+app.add_middleware(metrics.MetricsMiddleware)
+# Per-request query budgets and N+1 detection, when QUERY_INSPECTION is set
+query_inspection.install(app)
+# Profile requests sent with the admin X-Profile header or matching PROFILE_SAMPLE
+profiling.install(app)
 
 # Configure CORS
 app.add_middleware(
@@ -39,22 +79,26 @@ app.include_router(assignments.router)
 app.include_router(administrations.router)
 app.include_router(inventory.router)
 app.include_router(export.router)
+app.include_router(backup.router)
+app.include_router(audit.router)
+app.include_router(admin.router)
+app.include_router(reports.router)
 
 # Serve static files (frontend)
-# In Docker, frontend is mounted at /app/static
-static_dir = "/app/static"
-if os.path.exists(static_dir):
-    # Mount static files with proper configuration
-    # html=False prevents serving index.html for missing files
-    app.mount("/static", StaticFiles(directory=static_dir, html=False), name="static")
-    
+# In Docker, the built frontend is at /app/static (see static_build.py)
+frontend = None
+if os.path.exists(STATIC_DIR):
+    # Hashed assets are cached for good, index.html is revalidated on every load
+    frontend = FrontendFiles(STATIC_DIR)
+    app.mount("/static", frontend, name="static")
+
+
 @app.get("/")
-def read_root():
+def read_root(request: Request):
     """Serve the main frontend page."""
-    static_dir = "/app/static"
-    index_path = os.path.join(static_dir, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
+    response = frontend.index_response(request.scope) if frontend is not None else None
+    if response is not None:
+        return response
     return {"message": "Frontend not found"}
 
 
@@ -63,3 +107,18 @@ def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness check: database latency, WAL size, pool and threadpool saturation.
+
+    Returns 503 when the instance should not receive traffic.
+    """
+    result = await health.readiness()
+    return JSONResponse(content=result, status_code=200 if result["ready"] else 503)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request and database metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
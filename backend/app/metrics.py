@@ -0,0 +1,279 @@
+"""Request timing and SQL query metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request and labels it with the matched
+route template (e.g. ``/api/assignments/{assignment_id}``) and the response
+status. Engine hooks count the SQL statements a request runs and the time
+spent in them, and count ``SQLITE_BUSY``/``SQLITE_LOCKED`` errors and lock
+retries. Per-request counts are kept in a context variable, so the hooks
+only touch the current request's counters and the shared metrics are
+updated once per request.
+
+Statements run outside a request (background threads, startup) are
+attributed to the route ``background``.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+from .database import engine
+
+# Set to "false" to turn request and query metrics off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250, 1000)
+
+BACKGROUND_ROUTE = "background"
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+
+class Histogram:
+    """Cumulative histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, label_values, value):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {count}"
+
+
+class Registry:
+    """Set of metrics rendered together; updates go through ``lock``."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status")))
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the response is fully sent.",
+    ("method", "route", "status")))
+IN_PROGRESS = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled."))
+QUERIES = registry.register(Counter(
+    "db_queries_total", "SQL statements executed.", ("route",)))
+QUERY_SECONDS = registry.register(Counter(
+    "db_query_duration_seconds_total", "Time spent executing SQL statements.", ("route",)))
+QUERIES_PER_REQUEST = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("route",),
+    buckets=QUERY_COUNT_BUCKETS))
+BUSY_ERRORS = registry.register(Counter(
+    "db_busy_errors_total", "Statements that failed with SQLITE_BUSY or SQLITE_LOCKED.", ("route",)))
+BUSY_RETRIES = registry.register(Counter(
+    "db_busy_retries_total", "Statements retried after the database was locked.", ("route",)))
+
+
+class RequestStats:
+    """Counters of the request being handled."""
+
+    __slots__ = ("scope", "started", "queries", "query_seconds", "busy_errors", "busy_retries", "queue_recorded")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.busy_errors = 0
+        self.busy_retries = 0
+        # Whether the request's wait for a worker thread was recorded (see workloads.py)
+        self.queue_recorded = False
+
+    @property
+    def route(self):
+        """Route template of the request, once routing has matched it."""
+        return _route_template(self.scope)
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    """Counters of the current request, or None outside a request."""
+    return _current.get()
+
+
+def record_busy_retry():
+    """Count a statement retried because the database was locked."""
+    stats = _current.get()
+    if stats is not None:
+        stats.busy_retries += 1
+    else:
+        with registry.lock:
+            BUSY_RETRIES.inc((BACKGROUND_ROUTE,))
+
+
+def is_busy_error(error):
+    """Whether an exception is SQLite reporting a locked database."""
+    name = getattr(error, "sqlite_errorname", None)
+    if name:
+        return name.startswith(("SQLITE_BUSY", "SQLITE_LOCKED"))
+    return "database is locked" in str(error) or "database table is locked" in str(error)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if METRICS_ENABLED:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    else:
+        with registry.lock:
+            QUERIES.inc((BACKGROUND_ROUTE,))
+            QUERY_SECONDS.inc((BACKGROUND_ROUTE,), elapsed)
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    if not METRICS_ENABLED or not is_busy_error(context.original_exception):
+        return
+    stats = _current.get()
+    if stats is not None:
+        stats.busy_errors += 1
+    else:
+        with registry.lock:
+            BUSY_ERRORS.inc((BACKGROUND_ROUTE,))
+
+
+def _route_template(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and query counts per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        started = stats.started
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with registry.lock:
+            IN_PROGRESS.inc((), 1)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = stats.route
+            labels = (scope["method"], route, str(status))
+            with registry.lock:
+                IN_PROGRESS.inc((), -1)
+                REQUESTS.inc(labels)
+                REQUEST_DURATION.observe(labels, elapsed)
+                QUERIES.inc((route,), stats.queries)
+                QUERY_SECONDS.inc((route,), stats.query_seconds)
+                QUERIES_PER_REQUEST.observe((route,), stats.queries)
+                if stats.busy_errors:
+                    BUSY_ERRORS.inc((route,), stats.busy_errors)
+                if stats.busy_retries:
+                    BUSY_RETRIES.inc((route,), stats.busy_retries)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return registry.render()
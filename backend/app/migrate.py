@@ -0,0 +1,30 @@
+"""Create tables and run schema migrations outside the API process.
+
+With ``DATABASE_MIGRATIONS=skip`` the API starts without touching the
+schema; run this as a release step instead:
+
+    python -m app.migrate [--force]
+"""
+import argparse
+import sys
+
+from . import database, models  # noqa: F401 - models registers the tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tables and run schema migrations")
+    parser.add_argument("--force", action="store_true", help="Run the migrations even if the schema is current")
+    args = parser.parse_args()
+
+    if not database.init_db(force=args.force):
+        print(f"✓ Database already at schema version {database.schema_version()}")
+        return 0
+    if database.schema_version() < database.SCHEMA_VERSION:
+        print("✗ Some migrations failed, see the notes above; they will run again on the next start")
+        return 1
+    print(f"✓ Database migrated to schema version {database.SCHEMA_VERSION}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 """SQLAlchemy database models."""
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -12,6 +12,8 @@ class FamilyMember(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
     active = Column(Boolean, default=True)
 
     assignments = relationship("MedicationAssignment", back_populates="family_member")
@@ -24,6 +26,8 @@ class Caregiver(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
     active = Column(Boolean, default=True)
 
     administrations = relationship("Administration", back_populates="caregiver")
@@ -41,6 +45,8 @@ class Medication(Base):
     default_frequency_max_hours = Column(Float, nullable=True)  # e.g., 6.0 for range frequency
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
     
     # Note: Frequency validation is handled in Pydantic schemas
     # Database constraint: Either fixed OR range must be set (enforced by application logic)
@@ -65,12 +71,13 @@ class MedicationAssignment(Base):
     schedule_time = Column(String, nullable=True)  # e.g., "08:00"
     schedule_days = Column(String, nullable=True)  # e.g., "monday,wednesday,friday"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
 
     family_member = relationship("FamilyMember", back_populates="assignments")
     medication = relationship("Medication", back_populates="assignments")
     administrations = relationship("Administration", back_populates="assignment", order_by="desc(Administration.administered_at)")
-    edit_history = relationship("AssignmentAuditLog", back_populates="assignment", order_by="desc(AssignmentAuditLog.changed_at)")
+    revisions = relationship("AssignmentRevision", back_populates="assignment", order_by="desc(AssignmentRevision.id)")
 
 
 class Administration(Base):
@@ -84,10 +91,38 @@ class Administration(Base):
     dose_given = Column(String, nullable=False)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
 
     assignment = relationship("MedicationAssignment", back_populates="administrations")
     caregiver = relationship("Caregiver", back_populates="administrations")
 
+    __table_args__ = (
+        # Last dose per assignment, for status checks and overviews
+        Index("ix_administrations_assignment_administered_at", "medication_assignment_id", "administered_at"),
+    )
+
+
+class AdministrationDailyRollup(Base):
+    """Administrations per day, assignment and caregiver, maintained with every write (see rollups.py)."""
+    __tablename__ = "administration_daily_rollups"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)  # Calendar day in ROLLUP_TIMEZONE
+    medication_assignment_id = Column(Integer, ForeignKey("medication_assignments.id"), nullable=False)
+    caregiver_id = Column(Integer, ForeignKey("caregivers.id"), nullable=True)
+    administration_count = Column(Integer, nullable=False)
+    first_administered_at = Column(DateTime(timezone=True), nullable=False)
+    last_administered_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Covers the reports, which then read the rollups of a date range from the index alone
+        Index(
+            "ix_administration_daily_rollups_key", "day", "medication_assignment_id", "caregiver_id",
+            "administration_count", "first_administered_at", "last_administered_at"
+        ),
+    )
+
 
 class MedicationInventory(Base):
     """Medication inventory tracking."""
@@ -98,21 +133,111 @@ class MedicationInventory(Base):
     quantity = Column(Float, nullable=False)
     unit = Column(String, nullable=False)  # e.g., "mL", "tablets", "capsules"
     low_stock_threshold = Column(Float, nullable=True)
-    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
+    ledger_entries_since_snapshot = Column(Integer, nullable=False, default=0, server_default="0")
+    # Exponentially weighted consumption, maintained on each dose (see inventory_ledger.py)
+    consumption_ewma = Column(Float, nullable=False, default=0, server_default="0")
+    consumption_tracked_since = Column(DateTime(timezone=True), nullable=True)
+    consumption_updated_at = Column(DateTime(timezone=True), nullable=True)
+    projected_run_out_at = Column(DateTime(timezone=True), nullable=True, index=True)
 
     medication = relationship("Medication", back_populates="inventory")
 
+    __table_args__ = (
+        # Lets the low-stock check find quantity <= threshold through an index
+        Index("ix_medication_inventory_stock_margin", quantity - low_stock_threshold),
+    )
 
-class AssignmentAuditLog(Base):
-    """Audit log for medication assignment changes."""
-    __tablename__ = "assignment_audit_logs"
+
+class InventoryTransaction(Base):
+    """Append-only ledger of inventory quantity changes."""
+    __tablename__ = "inventory_transactions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False, index=True)
+    administration_id = Column(Integer, ForeignKey("administrations.id"), nullable=True, index=True)
+    kind = Column(String, nullable=False)  # "consumption", "reversal", "adjustment", "snapshot"
+    quantity_change = Column(Float, nullable=False, default=0)
+    balance = Column(Float, nullable=True)  # Quantity at this point, set on snapshot entries
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AssignmentRevision(Base):
+    """Edit history of a medication assignment, one row per update."""
+    __tablename__ = "assignment_revisions"
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("medication_assignments.id"), nullable=False, index=True)
-    field_name = Column(String, nullable=False)  # e.g., "current_dose", "frequency_hours"
-    old_value = Column(Text, nullable=True)  # Store as text for flexibility
-    new_value = Column(Text, nullable=True)
+    changes = Column(Text, nullable=True)  # JSON {field: [old, new]}; null for the creation snapshot
+    snapshot = Column(Text, nullable=True)  # JSON of all fields after this revision, set periodically
+    diffs_since_snapshot = Column(Integer, nullable=False, default=0)
     changed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
-    assignment = relationship("MedicationAssignment", back_populates="edit_history")
+    assignment = relationship("MedicationAssignment", back_populates="revisions")
+
+    __table_args__ = (
+        Index(
+            "ix_assignment_revisions_snapshots", "assignment_id", "changed_at",
+            sqlite_where=snapshot.isnot(None)
+        ),
+    )
+
+
+class AuditEvent(Base):
+    """Audit trail entry for a created, updated or deleted row of any table."""
+    __tablename__ = "audit_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False)  # e.g., "administrations"
+    record_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # "create", "update", "delete"
+    changes = Column(Text, nullable=False)  # JSON: row values, or {field: [old, new]} for updates
+    occurred_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (Index("ix_audit_events_record", "table_name", "record_id"),)
+
+
+class DeletedRecord(Base):
+    """Tombstone for a hard-deleted row, used by incremental change exports."""
+    __tablename__ = "deleted_records"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False)  # e.g., "administrations"
+    record_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)  # Stamped by triggers on each write
+
+
+class TableVersion(Base):
+    """Change counter of a table, bumped by triggers on every write (see cache.py)."""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ChangeSequence(Base):
+    """Counter of committed changes to the tables in incremental change exports (see database.py)."""
+    __tablename__ = "change_sequence"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Response of a create request sent with an Idempotency-Key (see idempotency.py)."""
+    __tablename__ = "idempotency_keys"
 
+    key = Column(String, primary_key=True)
+    # Hash of the method, path and body the key was first used with
+    fingerprint = Column(String, nullable=False)
+    # Null while the first request with the key is still being handled
+    status_code = Column(Integer, nullable=True)
+    # Set in the transaction committing the request's changes, so an abandoned
+    # claim tells whether running the request again would repeat them
+    applied_at = Column(DateTime(timezone=True), nullable=True)
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
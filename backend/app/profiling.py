@@ -0,0 +1,342 @@
+"""On-demand profiling of individual requests.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or
+matches a ``PROFILE_SAMPLE`` rule, e.g.
+``GET /api/administrations=0.1,POST /api/export/import/json=1`` (method,
+path prefix and the fraction of matching requests to profile). While it
+runs, a sampler thread records the Python stacks of the threads working on
+it every ``PROFILE_INTERVAL_MS``, and tracemalloc tracks allocations.
+
+The event loop thread is sampled from the start; a worker thread joins the
+profile when it runs the request's first SQL statement, which for this
+API's sync endpoints is near their start, and leaves it when it runs
+another request's statement or the request ends. Samples of threads idling
+in a selector or lock wait are left out. Stopping a profile (the final
+tracemalloc snapshot and its statistics) runs on a worker thread, not on
+the event loop. tracemalloc is process-wide, so
+allocations of concurrent requests are included.
+
+Finished profiles are kept in memory (the last ``PROFILE_STORE_SIZE``)
+under the id returned in the ``X-Profile-Id`` response header, and can be
+downloaded as collapsed stacks (for flamegraph.pl) or speedscope JSON.
+Without a token or sampling rule nothing is installed, so there is no cost.
+"""
+import collections
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+import anyio
+import anyio.to_thread
+from sqlalchemy import event
+
+from .database import engine
+
+# Secret that enables profiling through the X-Profile header; unset disables it
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Comma-separated "METHOD /path/prefix=fraction" rules for sampled profiling
+PROFILE_SAMPLE = os.getenv("PROFILE_SAMPLE", "")
+# Milliseconds between stack samples
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+# Finished profiles kept in memory, oldest dropped first
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+
+PROFILE_HEADER = b"x-profile"
+# Allocation sites reported per profile
+TOP_ALLOCATIONS = 25
+
+# Leaf frames of threads waiting for work rather than running it
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+def parse_sample_rules(value):
+    """Parse ``PROFILE_SAMPLE`` into ``(method, path_prefix, fraction)`` tuples."""
+    rules = []
+    for rule in filter(None, (part.strip() for part in value.split(","))):
+        target, _, fraction = rule.rpartition("=")
+        method, _, prefix = target.strip().partition(" ")
+        if not prefix or not fraction:
+            raise ValueError(f"Invalid PROFILE_SAMPLE rule: {rule!r}")
+        rules.append((method.upper(), prefix.strip(), float(fraction)))
+    return rules
+
+
+SAMPLE_RULES = parse_sample_rules(PROFILE_SAMPLE)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return code.co_name, code.co_filename, frame.f_lineno
+
+
+class Profile:
+    """Stack samples and allocations of one request."""
+
+    def __init__(self, method, path, trigger):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_ms = None
+        self.threads = {}
+        self.workers = set()
+        self.samples = collections.Counter()
+        self.sample_count = 0
+        self.allocations = []
+        self.peak_memory = None
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._started = None
+
+    def attach_thread(self, worker=False):
+        """Include the calling thread in the samples from now on."""
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads[ident] = threading.current_thread().name
+            if worker:
+                self.workers.add(ident)
+
+    def detach_workers(self):
+        """Stop sampling the worker threads, which go on to run other requests."""
+        for ident in self.workers:
+            self.threads.pop(ident, None)
+            if _worker_profiles.get(ident) is self:
+                _worker_profiles.pop(ident, None)
+        self.workers.clear()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for ident, name in list(self.threads.items()):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            if ident in self.workers and _worker_profiles.get(ident) is not self:
+                # The worker has moved on to another request
+                continue
+            leaf = frame.f_code
+            if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[(name, tuple(stack))] += 1
+            self.sample_count += 1
+
+    def _run_sampler(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self._stopped.wait(interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        _start_tracemalloc()
+        self._sampler = threading.Thread(target=self._run_sampler, name=f"profile-{self.id}", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        snapshot = tracemalloc.take_snapshot()
+        _, self.peak_memory = tracemalloc.get_traced_memory()
+        _stop_tracemalloc()
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        self.allocations = [
+            {
+                "file": stat.traceback[0].filename,
+                "line": stat.traceback[0].lineno,
+                "size": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ]
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "samples": self.sample_count,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "peak_memory": self.peak_memory,
+        }
+
+    def collapsed(self):
+        """Samples in the collapsed stack format, one ``frame;frame;... count`` per line."""
+        lines = []
+        for (thread, stack), count in sorted(self.samples.items(), key=lambda item: -item[1]):
+            frames = [thread] + [f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self):
+        """Samples as a speedscope file with one sampled profile per thread."""
+        frames = []
+        frame_index = {}
+        by_thread = collections.defaultdict(lambda: ([], []))
+        for (thread, stack), count in self.samples.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(frame_index[frame])
+            samples, weights = by_thread[thread]
+            samples.append(indexes)
+            weights.append(count * PROFILE_INTERVAL_MS)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path} ({self.id})",
+            "exporter": "home-medication-tracker",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread, (samples, weights) in by_thread.items()
+            ],
+        }
+
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+_current = contextvars.ContextVar("request_profile", default=None)
+_profiles = collections.OrderedDict()
+_profiles_lock = threading.Lock()
+# Profile of the request each worker thread last ran a statement for
+_worker_profiles = {}
+
+
+def _attach_worker_thread(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    ident = threading.get_ident()
+    if profile is None:
+        _worker_profiles.pop(ident, None)
+        return
+    _worker_profiles[ident] = profile
+    profile.attach_thread(worker=True)
+
+
+def _trigger(scope):
+    """Why the request should be profiled, or None."""
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return "header" if value.decode("latin-1") == PROFILE_TOKEN else None
+    for method, prefix, fraction in SAMPLE_RULES:
+        if scope["method"] == method and scope["path"].startswith(prefix):
+            return "sample" if random.random() < fraction else None
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests chosen by header or sampling rule."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        trigger = _trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], trigger)
+        profile.attach_thread()
+        token = _current.set(profile)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.detach_workers()
+            # Snapshotting allocations takes a while; don't hold up the event loop
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(profile.stop)
+            _current.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            with _profiles_lock:
+                _profiles[profile.id] = profile
+                while len(_profiles) > PROFILE_STORE_SIZE:
+                    _profiles.popitem(last=False)
+
+
+def is_enabled():
+    return bool(PROFILE_TOKEN or SAMPLE_RULES)
+
+
+def install(app):
+    """Add the middleware and worker thread hook when profiling is configured."""
+    if not is_enabled():
+        return False
+    event.listen(engine, "before_cursor_execute", _attach_worker_thread)
+    app.add_middleware(ProfilingMiddleware)
+    return True
+
+
+def profiles():
+    """Finished profiles, newest first."""
+    with _profiles_lock:
+        return list(reversed(_profiles.values()))
+
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        return _profiles.get(profile_id)
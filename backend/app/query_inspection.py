@@ -0,0 +1,147 @@
+"""Per-request SQL inspection: query budgets and N+1 detection.
+
+Meant for CI and local checks rather than production. With
+``QUERY_INSPECTION=true`` every statement a request runs is recorded, and
+when the request finishes it is compared with the route's budget, declared
+on the endpoint with ``@query_budget(n)``. Statements of the same shape
+(the SQL text with ``IN`` lists collapsed) repeated ``N_PLUS_ONE_THRESHOLD``
+or more times in one request are flagged as a likely N+1 pattern, such as a
+lazy relationship loaded once per row.
+
+Reports of finished requests are kept in memory for ``reports()``, and each
+response carries an ``X-Query-Count`` header. When inspection is off
+nothing is installed, so there is no cost.
+
+``benchmarks/query_budgets.py`` exercises the routes against a seeded
+dataset and fails when a budget is exceeded or an N+1 pattern appears.
+"""
+import collections
+import contextvars
+import os
+import re
+import threading
+
+from sqlalchemy import event
+
+from .database import engine
+
+QUERY_INSPECTION = os.getenv("QUERY_INSPECTION", "false").lower() in ("1", "true", "yes")
+# Repetitions of one statement shape in a request that count as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+# Finished request reports kept in memory
+QUERY_INSPECTION_REPORTS = int(os.getenv("QUERY_INSPECTION_REPORTS", "1000"))
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_budget(max_queries):
+    """Declare the most SQL statements a route may run per request."""
+    def decorate(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+
+def statement_shape(statement):
+    """Normalize a statement so repeats with different parameters compare equal."""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestInspection:
+    """Statements run by one request, checked against its route's budget."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.budget = None
+        self.statements = []
+
+    @property
+    def query_count(self):
+        return len(self.statements)
+
+    def repeated_shapes(self, threshold=None):
+        """Statement shapes run at least ``threshold`` times, with their counts."""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        counts = collections.Counter(self.statements)
+        return {shape: count for shape, count in counts.most_common() if count >= threshold}
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.query_count > self.budget
+
+    def to_dict(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "queries": self.query_count,
+            "budget": self.budget,
+            "over_budget": self.over_budget,
+            "repeated": self.repeated_shapes(),
+        }
+
+
+_current = contextvars.ContextVar("request_inspection", default=None)
+_reports = collections.deque(maxlen=QUERY_INSPECTION_REPORTS)
+_reports_lock = threading.Lock()
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    inspection = _current.get()
+    if inspection is not None:
+        inspection.statements.append(statement_shape(statement))
+
+
+class QueryInspectionMiddleware:
+    """ASGI middleware collecting the statements of each request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inspection = RequestInspection(scope["method"], scope["path"])
+        token = _current.set(inspection)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(inspection.query_count).encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            inspection.route = getattr(route, "path", None)
+            inspection.budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+            with _reports_lock:
+                _reports.append(inspection)
+
+
+def install(app):
+    """Add the middleware and statement hook when inspection is enabled."""
+    if not QUERY_INSPECTION:
+        return False
+    event.listen(engine, "before_cursor_execute", _record_statement)
+    app.add_middleware(QueryInspectionMiddleware)
+    return True
+
+
+def reports():
+    """Inspections of finished requests, oldest first."""
+    with _reports_lock:
+        return list(_reports)
+
+
+def clear_reports():
+    with _reports_lock:
+        _reports.clear()
@@ -0,0 +1,481 @@
+"""Continuous WAL shipping to a local replica directory.
+
+When ``REPLICA_DIR`` is set, a background thread copies committed WAL frames
+of the live database into the replica directory shortly after they are
+written, and performs checkpoints itself so no frame is checkpointed away
+before it has been shipped.
+
+The replica is organised in generations. Each generation starts with a
+consistent base snapshot followed by numbered, timestamped segments of WAL
+frames, so the database can be rebuilt as of any shipped point in time:
+
+    <REPLICA_DIR>/generations/<generation>/base.db
+    <REPLICA_DIR>/generations/<generation>/meta.json
+    <REPLICA_DIR>/generations/<generation>/segments/<seq>-<timestamp>.frames
+
+Run as a module for the command line interface:
+
+    python -m app.replication list
+    python -m app.replication restore [--to <ISO timestamp>] [--output <path>]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone, timedelta
+
+from .database import DATABASE_PATH, REPLICA_DIR, acquire_file_lock
+
+# Seconds between shipping cycles
+REPLICA_INTERVAL = float(os.getenv("REPLICA_INTERVAL", "1.0"))
+# Shipped frames after which the replicator checkpoints the WAL
+REPLICA_CHECKPOINT_FRAMES = int(os.getenv("REPLICA_CHECKPOINT_FRAMES", "1000"))
+# Age after which a new generation (fresh base snapshot) is started
+REPLICA_GENERATION_HOURS = float(os.getenv("REPLICA_GENERATION_HOURS", "24"))
+# Number of generations kept in the replica directory
+REPLICA_RETAIN_GENERATIONS = int(os.getenv("REPLICA_RETAIN_GENERATIONS", "7"))
+
+WAL_PATH = DATABASE_PATH + "-wal"
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+WAL_MAGIC_LE = 0x377F0682
+WAL_MAGIC_BE = 0x377F0683
+
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _wal_checksum(data, s0, s1, big_endian):
+    """SQLite's cumulative WAL checksum over ``data``."""
+    words = struct.unpack((">" if big_endian else "<") + f"{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def _read_wal_header(wal):
+    """Parse the WAL header, or return None if there is no valid WAL."""
+    wal.seek(0)
+    header = wal.read(WAL_HEADER_SIZE)
+    if len(header) < WAL_HEADER_SIZE:
+        return None
+    magic, _, page_size, _, salt1, salt2, cksum1, cksum2 = struct.unpack(">8I", header)
+    if magic not in (WAL_MAGIC_LE, WAL_MAGIC_BE):
+        return None
+    big_endian = magic == WAL_MAGIC_BE
+    if _wal_checksum(header[:24], 0, 0, big_endian) != (cksum1, cksum2):
+        return None
+    return {
+        "page_size": page_size,
+        "salts": (salt1, salt2),
+        "checksum": (cksum1, cksum2),
+        "big_endian": big_endian
+    }
+
+
+def _read_committed_frames(wal, header, offset, checksum):
+    """Read valid frames from ``offset`` up to the last commit frame.
+
+    Returns the raw frame bytes, the offset after the last commit frame, the
+    running checksum at that point and the number of frames read.
+    """
+    frame_size = WAL_FRAME_HEADER_SIZE + header["page_size"]
+    wal.seek(offset)
+    pending = []
+    committed = []
+    committed_offset = offset
+    committed_checksum = checksum
+    position = offset
+
+    while True:
+        frame = wal.read(frame_size)
+        if len(frame) < frame_size:
+            break
+        _, commit_size, salt1, salt2, cksum1, cksum2 = struct.unpack(">6I", frame[:WAL_FRAME_HEADER_SIZE])
+        if (salt1, salt2) != header["salts"]:
+            break
+        checksum = _wal_checksum(frame[:8], *checksum, header["big_endian"])
+        checksum = _wal_checksum(frame[WAL_FRAME_HEADER_SIZE:], *checksum, header["big_endian"])
+        if checksum != (cksum1, cksum2):
+            break
+        pending.append(frame)
+        position += frame_size
+        if commit_size:
+            committed.extend(pending)
+            pending = []
+            committed_offset = position
+            committed_checksum = checksum
+
+    return b"".join(committed), committed_offset, committed_checksum, len(committed)
+
+
+def _apply_frames(db_file, frames, page_size):
+    """Write WAL frames into a database file the way a checkpoint would."""
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    for start in range(0, len(frames), frame_size):
+        pgno, commit_size = struct.unpack(">2I", frames[start:start + 8])
+        db_file.seek((pgno - 1) * page_size)
+        db_file.write(frames[start + WAL_FRAME_HEADER_SIZE:start + frame_size])
+        if commit_size:
+            db_file.truncate(commit_size * page_size)
+
+
+class WalReplicator:
+    """Background thread shipping committed WAL frames to a replica directory."""
+
+    def __init__(self, replica_dir, interval=None):
+        self.replica_dir = replica_dir
+        self.interval = REPLICA_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._generation_dir = None
+        self._generation_started = None
+        self._segment_seq = 0
+        self._salts = None
+        self._offset = WAL_HEADER_SIZE
+        self._checksum = None
+        self._frames_since_checkpoint = 0
+        self._checkpointed = False
+        self.stats = {"cycles": 0, "frames_shipped": 0, "checkpoints": 0, "generations": 0, "errors": 0}
+
+    def start(self):
+        """Open the coordination connection and start shipping."""
+        self._conn = sqlite3.connect(DATABASE_PATH, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        mode = self._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode.lower() != "wal":
+            self._conn.close()
+            raise RuntimeError(f"WAL shipping requires journal_mode=WAL, database is in {mode} mode")
+        # Take the base snapshot up front so the first writes are shipped
+        try:
+            self.sync()
+        except BaseException:
+            self._conn.close()
+            self._conn = None
+            raise
+        self._thread = threading.Thread(target=self._run, name="wal-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ship anything outstanding and stop the thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._conn:
+            try:
+                self.sync()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                # Start over from a fresh base snapshot rather than risk a gap
+                self.stats["errors"] += 1
+                self._generation_dir = None
+                print(f"Replication note: {e}")
+
+    def sync(self):
+        """Run one shipping cycle.
+
+        The WAL is read and checkpointed under BEGIN IMMEDIATE, which keeps
+        other writers from appending frames meanwhile; readers are not
+        affected. The shipped segment is written after the lock is released
+        so writers only wait for the in-memory copy.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            generation_age = (
+                _now() - self._generation_started if self._generation_started else None
+            )
+            if (self._generation_dir is None or
+                    generation_age > timedelta(hours=REPLICA_GENERATION_HOURS)):
+                self._start_generation()
+                frames = b""
+            else:
+                frames = self._collect_frames()
+            if self._frames_since_checkpoint >= REPLICA_CHECKPOINT_FRAMES:
+                self._checkpoint()
+        finally:
+            self._conn.execute("ROLLBACK")
+
+        if frames:
+            self._write_segment(frames)
+        self.stats["cycles"] += 1
+
+    def _start_generation(self):
+        """Write a base snapshot and ship from the current end of the WAL."""
+        self._generation_started = _now()
+        generation = self._generation_started.strftime(TIMESTAMP_FORMAT)
+        generation_dir = os.path.join(self.replica_dir, "generations", generation)
+        os.makedirs(os.path.join(generation_dir, "segments"), exist_ok=True)
+
+        # Nothing can commit while the write lock is held, so the snapshot and
+        # the WAL position below describe the same state
+        source = sqlite3.connect(DATABASE_PATH)
+        target = sqlite3.connect(os.path.join(generation_dir, "base.db"))
+        try:
+            source.backup(target)
+            page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        self._salts = None
+        self._offset = WAL_HEADER_SIZE
+        self._checksum = None
+        if os.path.exists(WAL_PATH):
+            with open(WAL_PATH, "rb") as wal:
+                header = _read_wal_header(wal)
+                if header:
+                    _, self._offset, self._checksum, _ = _read_committed_frames(
+                        wal, header, WAL_HEADER_SIZE, header["checksum"]
+                    )
+                    self._salts = header["salts"]
+
+        with open(os.path.join(generation_dir, "meta.json"), "w") as meta:
+            json.dump({"started_at": self._generation_started.isoformat(), "page_size": page_size}, meta)
+
+        self._generation_dir = generation_dir
+        self._segment_seq = 0
+        self._frames_since_checkpoint = 0
+        self._checkpointed = False
+        self.stats["generations"] += 1
+        self._rotate_generations()
+
+    def _collect_frames(self):
+        """Read frames committed since the last cycle and advance past them."""
+        if not os.path.exists(WAL_PATH):
+            return b""
+        with open(WAL_PATH, "rb") as wal:
+            header = _read_wal_header(wal)
+            if header is None:
+                return b""
+            if header["salts"] != self._salts:
+                if self._salts is not None and not self._checkpointed:
+                    # The WAL was reset by a checkpoint we did not coordinate
+                    self._start_generation()
+                    return b""
+                # WAL restarted after our checkpoint: every old frame was shipped
+                self._salts = header["salts"]
+                self._offset = WAL_HEADER_SIZE
+                self._checksum = header["checksum"]
+                self._checkpointed = False
+
+            frames, self._offset, self._checksum, count = _read_committed_frames(
+                wal, header, self._offset, self._checksum
+            )
+
+        self._frames_since_checkpoint += count
+        self.stats["frames_shipped"] += count
+        return frames
+
+    def _write_segment(self, frames):
+        """Durably append a segment of frames to the current generation."""
+        self._segment_seq += 1
+        name = f"{self._segment_seq:08d}-{_now().strftime(TIMESTAMP_FORMAT)}.frames"
+        segment_path = os.path.join(self._generation_dir, "segments", name)
+        with open(segment_path + ".tmp", "wb") as segment:
+            segment.write(frames)
+            segment.flush()
+            os.fsync(segment.fileno())
+        os.replace(segment_path + ".tmp", segment_path)
+
+    def _checkpoint(self):
+        """Checkpoint shipped frames so the next writer can restart the WAL."""
+        checkpointer = sqlite3.connect(DATABASE_PATH)
+        try:
+            _, log_frames, checkpointed = checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        finally:
+            checkpointer.close()
+        if log_frames >= 0 and log_frames == checkpointed:
+            self._checkpointed = True
+            self._frames_since_checkpoint = 0
+        self.stats["checkpoints"] += 1
+
+    def _rotate_generations(self):
+        """Delete the oldest generations beyond the retention count."""
+        for generation in list_generations(self.replica_dir)[REPLICA_RETAIN_GENERATIONS:]:
+            shutil.rmtree(generation["path"], ignore_errors=True)
+
+
+_replicator = None
+_replicator_lock = None
+
+
+def start_replicator():
+    """Start WAL shipping if REPLICA_DIR is configured.
+
+    With several worker processes only the one holding the replicator lock
+    ships; the lock is released when it stops or exits, letting the next
+    worker to start take over.
+    """
+    global _replicator, _replicator_lock
+    if not REPLICA_DIR or _replicator is not None:
+        return None
+    lock_file = acquire_file_lock(DATABASE_PATH + "-replicator.lock", blocking=False)
+    if lock_file is None:
+        return None
+    replicator = WalReplicator(REPLICA_DIR)
+    try:
+        replicator.start()
+    except (RuntimeError, sqlite3.Error, OSError) as e:
+        # The app runs without shipping rather than failing to start
+        lock_file.close()
+        print(f"Replication note: {e}")
+        return None
+    _replicator, _replicator_lock = replicator, lock_file
+    return _replicator
+
+
+def stop_replicator():
+    """Stop WAL shipping, shipping any outstanding frames first."""
+    global _replicator, _replicator_lock
+    if _replicator is not None:
+        _replicator.stop()
+        _replicator = None
+        _replicator_lock.close()
+        _replicator_lock = None
+
+
+def list_generations(replica_dir=None):
+    """List replica generations, newest first."""
+    root = os.path.join(replica_dir or REPLICA_DIR or "", "generations")
+    if not os.path.isdir(root):
+        return []
+
+    generations = []
+    for name in sorted(os.listdir(root), reverse=True):
+        path = os.path.join(root, name)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        segments = sorted(os.listdir(os.path.join(path, "segments")))
+        segments = [segment for segment in segments if segment.endswith(".frames")]
+        last_shipped = meta["started_at"]
+        if segments:
+            last_shipped = _segment_time(segments[-1]).isoformat()
+        generations.append({
+            "generation": name,
+            "path": path,
+            "started_at": meta["started_at"],
+            "last_shipped_at": last_shipped,
+            "segments": len(segments),
+            "page_size": meta["page_size"]
+        })
+    return generations
+
+
+def _segment_time(name):
+    return datetime.strptime(name.split("-", 1)[1].split(".")[0], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def restore_point_in_time(target_time=None, output_path=None, replica_dir=None):
+    """Rebuild the database as of ``target_time`` from the replica.
+
+    Without ``output_path`` the rebuilt database is restored into the live
+    database through the backup API.
+    """
+    target_time = target_time or _now()
+    if target_time.tzinfo is None:
+        target_time = target_time.replace(tzinfo=timezone.utc)
+
+    candidates = [
+        generation for generation in list_generations(replica_dir)
+        if datetime.fromisoformat(generation["started_at"]) <= target_time
+    ]
+    if not candidates:
+        raise ValueError(f"No replica generation covers {target_time.isoformat()}")
+    generation = candidates[0]
+
+    fd, rebuilt_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        shutil.copyfile(os.path.join(generation["path"], "base.db"), rebuilt_path)
+        segments_dir = os.path.join(generation["path"], "segments")
+        applied = 0
+        with open(rebuilt_path, "r+b") as db_file:
+            for name in sorted(os.listdir(segments_dir)):
+                if not name.endswith(".frames") or _segment_time(name) > target_time:
+                    continue
+                with open(os.path.join(segments_dir, name), "rb") as segment:
+                    _apply_frames(db_file, segment.read(), generation["page_size"])
+                applied += 1
+
+        check = sqlite3.connect(rebuilt_path)
+        try:
+            result = check.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            check.close()
+        if result != "ok":
+            raise ValueError(f"Rebuilt database failed integrity check: {result}")
+
+        if output_path:
+            shutil.move(rebuilt_path, output_path)
+            destination = output_path
+        else:
+            from .backup import restore_snapshot
+            restore_snapshot(rebuilt_path)
+            destination = DATABASE_PATH
+    finally:
+        if os.path.exists(rebuilt_path):
+            os.remove(rebuilt_path)
+
+    return {
+        "generation": generation["generation"],
+        "segments_applied": applied,
+        "as_of": target_time.isoformat(),
+        "database": destination
+    }
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="WAL replica of the medication database")
+    parser.add_argument("--replica-dir", default=REPLICA_DIR, help="Replica directory (default: $REPLICA_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List replica generations, newest first")
+    restore_parser = commands.add_parser("restore", help="Rebuild the database as of a point in time")
+    restore_parser.add_argument("--to", dest="target", default=None,
+                                help="ISO timestamp to restore to (default: latest)")
+    restore_parser.add_argument("--output", default=None,
+                                help="Write the rebuilt database here instead of restoring it in place")
+
+    args = parser.parse_args(argv)
+    if not args.replica_dir:
+        print("✗ No replica directory: set REPLICA_DIR or pass --replica-dir")
+        return 1
+
+    if args.command == "list":
+        for generation in list_generations(args.replica_dir):
+            print(f"{generation['generation']}\t{generation['started_at']} - "
+                  f"{generation['last_shipped_at']}\t{generation['segments']} segments")
+    elif args.command == "restore":
+        target = datetime.fromisoformat(args.target.replace('Z', '+00:00')) if args.target else None
+        try:
+            info = restore_point_in_time(target, args.output, args.replica_dir)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            print(f"✗ Restore failed: {e}")
+            return 1
+        print(f"✓ Restored {info['database']} as of {info['as_of']} "
+              f"({info['segments_applied']} segments from generation {info['generation']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
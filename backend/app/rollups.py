@@ -0,0 +1,212 @@
+"""Daily rollups of administrations for reporting.
+
+``administration_daily_rollups`` holds one row per day, assignment and
+caregiver with the number of doses given and the first and last dose
+times, so reports read a row per group instead of scanning every
+administration. Days are calendar days in ``ROLLUP_TIMEZONE``.
+
+The rollups are kept current in the transaction that writes the
+administrations. ``refresh()`` recomputes the groups a write touched (for
+an edited dose both its old and its new group) from that day's
+administrations of the assignment, read through the
+``(medication_assignment_id, administered_at)`` index, so keeping them
+current costs the same however long the history grows. Imports rebuild
+the rollups of the assignments they touched.
+
+Rebuild or check every rollup, e.g. after changing ``ROLLUP_TIMEZONE``:
+
+    python -m app.rollups rebuild
+    python -m app.rollups verify
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, time, timedelta, timezone
+
+from sqlalchemy import and_, delete, insert, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+# Time zone whose calendar days the rollups count doses in
+ROLLUP_TIMEZONE = os.getenv("ROLLUP_TIMEZONE", "UTC")
+# Rollup rows inserted per statement by a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+if ROLLUP_TIMEZONE.upper() == "UTC":
+    _zone = timezone.utc
+else:
+    from zoneinfo import ZoneInfo
+    _zone = ZoneInfo(ROLLUP_TIMEZONE)
+
+_table = models.AdministrationDailyRollup.__table__
+
+
+def _utc(value):
+    """Treat naive datetimes read back from SQLite as UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def day_of(administered_at):
+    """Calendar day of a dose in ``ROLLUP_TIMEZONE``."""
+    return _utc(administered_at).astimezone(_zone).date()
+
+
+def day_bounds(day):
+    """Start and end of a calendar day as naive UTC, as administration times are stored."""
+    start = datetime.combine(day, time(), tzinfo=_zone)
+    end = datetime.combine(day + timedelta(days=1), time(), tzinfo=_zone)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
+
+
+def rollup_key(assignment_id, caregiver_id, administered_at):
+    """Group of a dose: ``(day, assignment_id, caregiver_id)``."""
+    return day_of(administered_at), assignment_id, caregiver_id
+
+
+def _aggregate(rows, groups=None):
+    """Fold ``(assignment_id, caregiver_id, administered_at)`` rows into ``{key: [count, first, last]}``."""
+    groups = {} if groups is None else groups
+    for assignment_id, caregiver_id, administered_at in rows:
+        administered_at = _utc(administered_at)
+        key = rollup_key(assignment_id, caregiver_id, administered_at)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [1, administered_at, administered_at]
+        else:
+            group[0] += 1
+            group[1] = min(group[1], administered_at)
+            group[2] = max(group[2], administered_at)
+    return groups
+
+
+def _rows(groups):
+    return [
+        {
+            "day": day,
+            "medication_assignment_id": assignment_id,
+            "caregiver_id": caregiver_id,
+            "administration_count": count,
+            "first_administered_at": first,
+            "last_administered_at": last,
+        }
+        for (day, assignment_id, caregiver_id), (count, first, last) in groups.items()
+    ]
+
+
+def _key_filter(key):
+    day, assignment_id, caregiver_id = key
+    return and_(
+        _table.c.day == day,
+        _table.c.medication_assignment_id == assignment_id,
+        _table.c.caregiver_id.is_(None) if caregiver_id is None else _table.c.caregiver_id == caregiver_id,
+    )
+
+
+def refresh(db: Session, keys):
+    """Recompute the rollups of the given groups from the administrations.
+
+    Pending ORM changes must have been flushed. Runs one query per distinct
+    day among the keys, then one delete and one insert.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    administration = models.Administration
+    assignments_by_day = {}
+    for day, assignment_id, _ in keys:
+        assignments_by_day.setdefault(day, set()).add(assignment_id)
+
+    groups = {}
+    for day, assignment_ids in assignments_by_day.items():
+        start, end = day_bounds(day)
+        _aggregate(db.query(
+            administration.medication_assignment_id, administration.caregiver_id, administration.administered_at
+        ).filter(
+            administration.medication_assignment_id.in_(assignment_ids),
+            administration.administered_at >= start,
+            administration.administered_at < end
+        ), groups)
+
+    db.execute(delete(_table).where(or_(*(_key_filter(key) for key in keys))))
+    rows = _rows({key: group for key, group in groups.items() if key in keys})
+    if rows:
+        db.execute(insert(_table), rows)
+
+
+def rebuild(db: Session, assignment_ids=None):
+    """Rebuild the rollups of the given assignments (all when None); returns the rows written."""
+    administration = models.Administration
+    query = db.query(
+        administration.medication_assignment_id, administration.caregiver_id, administration.administered_at
+    )
+    statement = delete(_table)
+    if assignment_ids is not None:
+        assignment_ids = list(assignment_ids)
+        if not assignment_ids:
+            return 0
+        query = query.filter(administration.medication_assignment_id.in_(assignment_ids))
+        statement = statement.where(_table.c.medication_assignment_id.in_(assignment_ids))
+
+    groups = _aggregate(query.yield_per(REBUILD_BATCH_SIZE))
+    db.execute(statement)
+    rows = _rows(groups)
+    for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+        db.execute(insert(_table), rows[start:start + REBUILD_BATCH_SIZE])
+    return len(rows)
+
+
+def verify(db: Session):
+    """Groups whose rollup differs from the administrations, as ``(key, stored, expected)``."""
+    administration = models.Administration
+    expected = _aggregate(db.query(
+        administration.medication_assignment_id, administration.caregiver_id, administration.administered_at
+    ).yield_per(REBUILD_BATCH_SIZE))
+    stored = {
+        (row.day, row.medication_assignment_id, row.caregiver_id): [
+            row.administration_count, _utc(row.first_administered_at), _utc(row.last_administered_at)
+        ]
+        for row in db.query(models.AdministrationDailyRollup)
+    }
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(set(stored) | set(expected), key=lambda key: (key[0], key[1], key[2] or 0))
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Daily administration rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Rebuild every rollup from the administrations")
+    commands.add_parser("verify", help="Compare the rollups with the administrations")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            rows = rebuild(db)
+            db.commit()
+            print(f"✓ Rebuilt {rows} daily rollups ({ROLLUP_TIMEZONE} days)")
+        elif args.command == "verify":
+            mismatches = verify(db)
+            if mismatches:
+                print(f"✗ {len(mismatches)} rollup(s) differ from the administrations; run `rebuild`")
+                for key, stored, expected in mismatches[:20]:
+                    print(f"  {key}: stored {stored}, expected {expected}")
+                return 1
+            print("✓ Rollups match the administrations")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Administrative diagnostics endpoints."""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .. import profiling, slow_queries
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/slow-queries")
+def get_slow_queries(limit: int = Query(100, ge=1, le=1000)):
+    """Get the most recent slow statements and the query plans of their shapes."""
+    return {
+        "enabled": slow_queries.SLOW_QUERY_LOG,
+        **slow_queries.get_log().snapshot(limit)
+    }
+
+
+@router.delete("/slow-queries", status_code=204)
+def clear_slow_queries():
+    """Clear the slow-query log, e.g. after adding an index."""
+    slow_queries.get_log().clear()
+    return None
+
+
+def _get_profile(profile_id: str):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiles")
+def get_profiles():
+    """List the stored request profiles, newest first."""
+    return {
+        "enabled": profiling.is_enabled(),
+        "profiles": [profile.summary() for profile in profiling.profiles()]
+    }
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Get a profile's summary and its top allocation sites."""
+    profile = _get_profile(profile_id)
+    return {**profile.summary(), "allocations": profile.allocations}
+
+
+@router.get("/profiles/{profile_id}/download")
+def download_profile(profile_id: str, format: str = Query("speedscope", pattern="^(speedscope|collapsed)$")):
+    """Download a profile as speedscope JSON or collapsed stacks."""
+    profile = _get_profile(profile_id)
+    if format == "collapsed":
+        return PlainTextResponse(
+            profile.collapsed(),
+            headers={"Content-Disposition": f"attachment; filename=profile-{profile.id}.collapsed.txt"}
+        )
+    return JSONResponse(
+        content=profile.speedscope(),
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile.id}.speedscope.json"}
+    )
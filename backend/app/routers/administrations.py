@@ -1,16 +1,67 @@
 """Medication administration tracking endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import desc, insert
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
-from .. import models, schemas
+from .. import audit, models, schemas, inventory_ledger, rollups
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
 
 router = APIRouter(prefix="/api/administrations", tags=["administrations"])
 
 
+def _with_relationships(query):
+    """Eager load the assignment, its family member and medication, and the caregiver."""
+    return query.options(
+        joinedload(models.Administration.assignment).joinedload(models.MedicationAssignment.medication),
+        joinedload(models.Administration.assignment).joinedload(models.MedicationAssignment.family_member),
+        joinedload(models.Administration.caregiver)
+    )
+
+
+def _administered_at(value):
+    """Validated administration time in UTC; now when not given.
+    
+    Backdating is allowed up to 24 hours, future times are not.
+    """
+    if not value:
+        # Default to current time if not provided
+        return datetime.now(timezone.utc)
+    # Parse and validate the datetime
+    if isinstance(value, str):
+        # Parse ISO string - if it has timezone info, use it; otherwise assume UTC
+        dt_str = value
+        if dt_str.endswith('Z'):
+            dt_str = dt_str.replace('Z', '+00:00')
+        try:
+            value = datetime.fromisoformat(dt_str)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid datetime format")
+    # Ensure datetime is timezone-aware and in UTC
+    if value.tzinfo is None:
+        administered_at = value.replace(tzinfo=timezone.utc)
+    else:
+        administered_at = value.astimezone(timezone.utc)
+    
+    # Validate not in future
+    now_utc = datetime.now(timezone.utc)
+    if administered_at > now_utc:
+        raise HTTPException(status_code=400, detail="Administration time cannot be in the future")
+    
+    # Validate not more than 24 hours in the past
+    max_backdate = timedelta(hours=24)
+    if administered_at < (now_utc - max_backdate):
+        raise HTTPException(
+            status_code=400, 
+            detail="Administration time cannot be more than 24 hours in the past"
+        )
+    return administered_at
+
+
 @router.get("", response_model=List[schemas.Administration])
+@query_budget(1)
 def get_administrations(
     assignment_id: Optional[int] = None,
     family_member_id: Optional[int] = None,
@@ -47,17 +98,12 @@ def get_administrations(
         query = query.limit(limit)
     
     # Eager load relationships
-    from sqlalchemy.orm import joinedload
-    query = query.options(
-        joinedload(models.Administration.assignment).joinedload(models.MedicationAssignment.medication),
-        joinedload(models.Administration.assignment).joinedload(models.MedicationAssignment.family_member),
-        joinedload(models.Administration.caregiver)
-    )
-    
-    return query.all()
+    return _with_relationships(query).all()
 
 
 @router.post("", response_model=schemas.Administration, status_code=201)
+@query_budget(13)
+@idempotent
 def create_administration(administration: schemas.AdministrationCreate, db: Session = Depends(get_db)):
     """Record a medication administration."""
     # Verify assignment exists
@@ -76,48 +122,7 @@ def create_administration(administration: schemas.AdministrationCreate, db: Sess
         if not caregiver:
             raise HTTPException(status_code=404, detail="Caregiver not found")
     
-    # Handle administered_at time (for backdating)
-    if administration.administered_at:
-        # Parse and validate the datetime
-        if isinstance(administration.administered_at, str):
-            # Parse ISO string - if it has timezone info, use it; otherwise assume UTC
-            dt_str = administration.administered_at
-            if dt_str.endswith('Z'):
-                dt_str = dt_str.replace('Z', '+00:00')
-            try:
-                dt = datetime.fromisoformat(dt_str)
-                # If no timezone info, assume it's UTC
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                else:
-                    # Convert to UTC
-                    dt = dt.astimezone(timezone.utc)
-                administered_at = dt
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid datetime format")
-        else:
-            administered_at = administration.administered_at
-            # Ensure datetime is timezone-aware and in UTC
-            if administered_at.tzinfo is None:
-                administered_at = administered_at.replace(tzinfo=timezone.utc)
-            else:
-                administered_at = administered_at.astimezone(timezone.utc)
-        
-        # Validate not in future
-        now_utc = datetime.now(timezone.utc)
-        if administered_at > now_utc:
-            raise HTTPException(status_code=400, detail="Administration time cannot be in the future")
-        
-        # Validate not more than 24 hours in the past
-        max_backdate = timedelta(hours=24)
-        if administered_at < (now_utc - max_backdate):
-            raise HTTPException(
-                status_code=400, 
-                detail="Administration time cannot be more than 24 hours in the past"
-            )
-    else:
-        # Default to current time if not provided
-        administered_at = datetime.now(timezone.utc)
+    administered_at = _administered_at(administration.administered_at)
     
     # Create administration
     db_administration = models.Administration(
@@ -128,15 +133,113 @@ def create_administration(administration: schemas.AdministrationCreate, db: Sess
         notes=administration.notes
     )
     db.add(db_administration)
+    db.flush()
+    # Consume stock and count the dose in the same transaction as the administration
+    inventory_ledger.record_consumption(
+        db, assignment.medication_id, db_administration.id, db_administration.dose_given
+    )
+    rollups.refresh(db, [rollups.rollup_key(
+        db_administration.medication_assignment_id, db_administration.caregiver_id, administered_at
+    )])
     db.commit()
     db.refresh(db_administration)
     return db_administration
 
 
+@router.post("/batch", response_model=schemas.AdministrationBatchResult)
+@query_budget(10)
+@idempotent
+def create_administrations_batch(batch: schemas.AdministrationBatchCreate, db: Session = Depends(get_db)):
+    """Record several administrations (e.g. a bedtime round) in one transaction.
+    
+    Assignments and caregivers are validated with one query each. Results are
+    reported per item, in request order. With ``atomic`` (the default) nothing
+    is recorded unless every item is valid; otherwise the valid items are
+    recorded and the rest reported as failed.
+    """
+    items = batch.administrations
+    assignment_ids = {item.medication_assignment_id for item in items}
+    medication_ids = dict(db.query(models.MedicationAssignment.id, models.MedicationAssignment.medication_id).filter(
+        models.MedicationAssignment.id.in_(assignment_ids)
+    ).all())
+    caregiver_ids = {item.caregiver_id for item in items if item.caregiver_id}
+    active_caregivers = set()
+    if caregiver_ids:
+        active_caregivers = {row.id for row in db.query(models.Caregiver.id).filter(
+            models.Caregiver.id.in_(caregiver_ids),
+            models.Caregiver.active == True
+        )}
+    
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            if item.medication_assignment_id not in medication_ids:
+                raise HTTPException(status_code=404, detail="Assignment not found")
+            if item.caregiver_id and item.caregiver_id not in active_caregivers:
+                raise HTTPException(status_code=404, detail="Caregiver not found")
+            administered_at = _administered_at(item.administered_at)
+        except HTTPException as e:
+            results.append(schemas.AdministrationBatchItem(index=index, status_code=e.status_code, error=e.detail))
+            continue
+        results.append(None)
+        valid.append((index, {
+            "medication_assignment_id": item.medication_assignment_id,
+            "caregiver_id": item.caregiver_id,
+            "administered_at": administered_at,
+            "dose_given": item.dose_given,
+            "notes": item.notes
+        }))
+    
+    failed = len(items) - len(valid)
+    if failed and batch.atomic:
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = schemas.AdministrationBatchItem(
+                    index=index, status_code=424, error="Not recorded: other items in the batch failed"
+                )
+        raise HTTPException(status_code=400, detail={
+            "message": f"{failed} of {len(items)} administrations failed validation; none were recorded",
+            "results": [result.model_dump() for result in results]
+        })
+    
+    if valid:
+        # One multi-row insert; SQLite assigns the rowids in VALUES order
+        ids = sorted(row.id for row in db.execute(
+            insert(models.Administration).values([values for _, values in valid]).returning(models.Administration.id)
+        ))
+        audit.record_inserts(db, models.Administration, [
+            {"id": administration_id, **values} for (_, values), administration_id in zip(valid, ids)
+        ])
+        # Consume stock in the same transaction as the administrations
+        inventory_ledger.record_consumptions(db, [
+            (medication_ids[values["medication_assignment_id"]], administration_id, values["dose_given"])
+            for (_, values), administration_id in zip(valid, ids)
+        ])
+        rollups.refresh(db, [
+            rollups.rollup_key(values["medication_assignment_id"], values["caregiver_id"], values["administered_at"])
+            for _, values in valid
+        ])
+        db.commit()
+        created = {
+            administration.id: administration
+            for administration in _with_relationships(db.query(models.Administration)).filter(
+                models.Administration.id.in_(ids)
+            )
+        }
+        for (index, _), administration_id in zip(valid, ids):
+            results[index] = schemas.AdministrationBatchItem(
+                index=index, status_code=201, administration=created[administration_id]
+            )
+    
+    return schemas.AdministrationBatchResult(created=len(valid), failed=failed, results=results)
+
+
 @router.get("/{administration_id}", response_model=schemas.Administration)
+@query_budget(1)
 def get_administration(administration_id: int, db: Session = Depends(get_db)):
     """Get a specific administration record."""
-    db_administration = db.query(models.Administration).filter(
+    db_administration = _with_relationships(db.query(models.Administration)).filter(
         models.Administration.id == administration_id
     ).first()
     if not db_administration:
@@ -197,9 +300,32 @@ def update_administration(
             if update_data['administered_at'] > datetime.now(timezone.utc):
                 raise HTTPException(status_code=400, detail="Administration time cannot be in the future")
         
+        dose_changed = 'dose_given' in update_data and update_data['dose_given'] != db_administration.dose_given
+        old_key = rollups.rollup_key(
+            db_administration.medication_assignment_id, db_administration.caregiver_id,
+            db_administration.administered_at
+        )
+        
         for field, value in update_data.items():
             setattr(db_administration, field, value)
         
+        new_key = rollups.rollup_key(
+            db_administration.medication_assignment_id, db_administration.caregiver_id,
+            db_administration.administered_at
+        )
+        if new_key != old_key or 'administered_at' in update_data:
+            # Recount the dose's group, and the one it moved from (another day or caregiver)
+            db.flush()
+            rollups.refresh(db, [old_key, new_key])
+        
+        if dose_changed:
+            # Replace the stock consumed by the old dose with the new dose
+            medication_id = db_administration.assignment.medication_id
+            inventory_ledger.reverse_consumption(db, medication_id, administration_id)
+            inventory_ledger.record_consumption(
+                db, medication_id, administration_id, db_administration.dose_given
+            )
+        
         db.commit()
         db.refresh(db_administration)
         return db_administration
@@ -220,7 +346,19 @@ def delete_administration(administration_id: int, db: Session = Depends(get_db))
     if not db_administration:
         raise HTTPException(status_code=404, detail="Administration not found")
     
+    # Return the stock the administration consumed
+    inventory_ledger.reverse_consumption(
+        db, db_administration.assignment.medication_id, administration_id
+    )
+    key = rollups.rollup_key(
+        db_administration.medication_assignment_id, db_administration.caregiver_id,
+        db_administration.administered_at
+    )
     db.delete(db_administration)
+    # Record a tombstone so incremental exports can propagate the delete
+    db.add(models.DeletedRecord(table_name="administrations", record_id=administration_id))
+    db.flush()
+    rollups.refresh(db, [key])
     db.commit()
     return None
 
@@ -1,23 +1,34 @@
 """Medication assignment management endpoints."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import bindparam, desc, update
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
-from .. import models, schemas
+from .. import audit, cache, models, schemas, assignment_history
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
 
 router = APIRouter(prefix="/api/assignments", tags=["assignments"])
 
 
+def _with_relationships(query):
+    """Eager load the family member and medication nested in assignment responses."""
+    return query.options(
+        joinedload(models.MedicationAssignment.family_member),
+        joinedload(models.MedicationAssignment.medication)
+    )
+
+
 @router.get("", response_model=List[schemas.MedicationAssignment])
+@query_budget(1)
 def get_assignments(
     family_member_id: Optional[int] = None,
     active: Optional[bool] = None,
     db: Session = Depends(get_db)
 ):
     """Get medication assignments, optionally filtered by family member."""
-    query = db.query(models.MedicationAssignment)
+    query = _with_relationships(db.query(models.MedicationAssignment))
     
     if family_member_id:
         query = query.filter(models.MedicationAssignment.family_member_id == family_member_id)
@@ -29,6 +40,7 @@ def get_assignments(
 
 
 @router.post("", response_model=schemas.MedicationAssignment, status_code=201)
+@idempotent
 def create_assignment(assignment: schemas.MedicationAssignmentCreate, db: Session = Depends(get_db)):
     """Create a new medication assignment."""
     # Verify family member exists
@@ -69,6 +81,8 @@ def create_assignment(assignment: schemas.MedicationAssignmentCreate, db: Sessio
     try:
         db_assignment = models.MedicationAssignment(**assignment.model_dump())
         db.add(db_assignment)
+        db.flush()
+        assignment_history.record_creation(db, db_assignment)
         db.commit()
         db.refresh(db_assignment)
         return db_assignment
@@ -81,9 +95,10 @@ def create_assignment(assignment: schemas.MedicationAssignmentCreate, db: Sessio
 
 
 @router.get("/{assignment_id}", response_model=schemas.MedicationAssignment)
+@query_budget(1)
 def get_assignment(assignment_id: int, db: Session = Depends(get_db)):
     """Get a specific assignment."""
-    db_assignment = db.query(models.MedicationAssignment).filter(
+    db_assignment = _with_relationships(db.query(models.MedicationAssignment)).filter(
         models.MedicationAssignment.id == assignment_id
     ).first()
     if not db_assignment:
@@ -91,7 +106,21 @@ def get_assignment(assignment_id: int, db: Session = Depends(get_db)):
     return db_assignment
 
 
+def _validate_frequency(db_assignment, update_data):
+    """Validate a frequency override being updated; raises ValueError."""
+    if any(k in update_data for k in ['frequency_hours', 'frequency_min_hours', 'frequency_max_hours']):
+        temp_data = {
+            'family_member_id': db_assignment.family_member_id,
+            'medication_id': db_assignment.medication_id,
+            'frequency_hours': update_data.get('frequency_hours', db_assignment.frequency_hours),
+            'frequency_min_hours': update_data.get('frequency_min_hours', db_assignment.frequency_min_hours),
+            'frequency_max_hours': update_data.get('frequency_max_hours', db_assignment.frequency_max_hours),
+        }
+        schemas.MedicationAssignmentBase(**temp_data)
+
+
 @router.put("/{assignment_id}", response_model=schemas.MedicationAssignment)
+@query_budget(7)
 def update_assignment(
     assignment_id: int,
     assignment: schemas.MedicationAssignmentUpdate,
@@ -107,39 +136,11 @@ def update_assignment(
     try:
         update_data = assignment.model_dump(exclude_unset=True)
         
-        # Validate frequency override if being updated
-        if any(k in update_data for k in ['frequency_hours', 'frequency_min_hours', 'frequency_max_hours']):
-            temp_data = {
-                'family_member_id': db_assignment.family_member_id,
-                'medication_id': db_assignment.medication_id,
-                'frequency_hours': update_data.get('frequency_hours', db_assignment.frequency_hours),
-                'frequency_min_hours': update_data.get('frequency_min_hours', db_assignment.frequency_min_hours),
-                'frequency_max_hours': update_data.get('frequency_max_hours', db_assignment.frequency_max_hours),
-            }
-            schemas.MedicationAssignmentBase(**temp_data)
-        
-        # Track changes for audit log
-        audit_logs = []
-        for field, new_value in update_data.items():
-            old_value = getattr(db_assignment, field, None)
-            
-            # Convert values to strings for comparison and storage
-            old_str = str(old_value) if old_value is not None else None
-            new_str = str(new_value) if new_value is not None else None
-            
-            # Only log if value actually changed
-            if old_str != new_str:
-                audit_logs.append(models.AssignmentAuditLog(
-                    assignment_id=assignment_id,
-                    field_name=field,
-                    old_value=old_str,
-                    new_value=new_str
-                ))
-            setattr(db_assignment, field, new_value)
+        _validate_frequency(db_assignment, update_data)
         
-        # Save audit logs
-        if audit_logs:
-            db.add_all(audit_logs)
+        # Record the changed fields as one revision in the edit history
+        changes = assignment_history.apply_update(db_assignment, update_data)
+        assignment_history.record_update(db, db_assignment, changes)
         
         db.commit()
         db.refresh(db_assignment)
@@ -152,6 +153,98 @@ def update_assignment(
         raise HTTPException(status_code=500, detail=f"Failed to update assignment: {str(e)}")
 
 
+@router.patch("/bulk", response_model=schemas.MedicationAssignmentBulkResult)
+@query_budget(5)
+def update_assignments_bulk(bulk: schemas.MedicationAssignmentBulkUpdate, db: Session = Depends(get_db)):
+    """Update several assignments (e.g. doses after a checkup) in one transaction.
+    
+    The assignments are loaded with one query and validated and diffed in
+    memory; the changes, their edit history revisions and their audit events
+    are written together. Errors are reported per item as by the single
+    update. With ``atomic`` (the default) nothing is saved unless every item
+    is valid.
+    """
+    assignments = {
+        db_assignment.id: db_assignment
+        for db_assignment in db.query(models.MedicationAssignment).filter(
+            models.MedicationAssignment.id.in_([item.id for item in bulk.updates])
+        )
+    }
+    
+    results = []
+    updated = []
+    for index, item in enumerate(bulk.updates):
+        db_assignment = assignments.get(item.id)
+        if not db_assignment:
+            results.append(schemas.MedicationAssignmentBulkItemResult(
+                index=index, id=item.id, status_code=404, error="Assignment not found"
+            ))
+            continue
+        update_data = item.model_dump(exclude_unset=True, exclude={'id'})
+        try:
+            _validate_frequency(db_assignment, update_data)
+        except ValueError as e:
+            results.append(schemas.MedicationAssignmentBulkItemResult(
+                index=index, id=item.id, status_code=400, error=str(e)
+            ))
+            continue
+        state = assignment_history.assignment_state(db_assignment)
+        changes = {
+            field: [state[field], value] for field, value in update_data.items() if state[field] != value
+        }
+        state.update(update_data)
+        results.append(None)
+        updated.append((index, item.id, state, changes))
+    
+    failed = len(bulk.updates) - len(updated)
+    if failed and bulk.atomic:
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = schemas.MedicationAssignmentBulkItemResult(
+                    index=index, id=bulk.updates[index].id, status_code=424,
+                    error="Not saved: other items in the request failed"
+                )
+        raise HTTPException(status_code=400, detail={
+            "message": f"{failed} of {len(bulk.updates)} updates failed validation; none were saved",
+            "results": [result.model_dump() for result in results]
+        })
+    
+    changed = [(assignment_id, state, changes) for _, assignment_id, state, changes in updated if changes]
+    if changed:
+        table = models.MedicationAssignment.__table__
+        fields = list(schemas.MedicationAssignmentUpdate.model_fields)
+        try:
+            # Every row sets the same columns, so the rows go to one executemany
+            db.execute(
+                update(table).where(table.c.id == bindparam("assignment_id")),
+                [
+                    {"assignment_id": assignment_id, **{field: state[field] for field in fields}}
+                    for assignment_id, state, _ in changed
+                ]
+            )
+            assignment_history.record_updates(db, changed)
+            audit.record_updates(db, models.MedicationAssignment, {
+                assignment_id: changes for assignment_id, _, changes in changed
+            })
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to update assignments: {str(e)}")
+    
+    reloaded = {
+        db_assignment.id: db_assignment
+        for db_assignment in _with_relationships(db.query(models.MedicationAssignment)).filter(
+            models.MedicationAssignment.id.in_([assignment_id for _, assignment_id, _, _ in updated])
+        ).populate_existing()
+    } if updated else {}
+    for index, assignment_id, _, _ in updated:
+        results[index] = schemas.MedicationAssignmentBulkItemResult(
+            index=index, id=assignment_id, status_code=200, assignment=reloaded[assignment_id]
+        )
+    
+    return schemas.MedicationAssignmentBulkResult(updated=len(updated), failed=failed, results=results)
+
+
 @router.delete("/{assignment_id}", status_code=204)
 def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
     """Delete (deactivate) a medication assignment."""
@@ -161,55 +254,84 @@ def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
     if not db_assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    db_assignment.active = False
+    changes = assignment_history.apply_update(db_assignment, {"active": False})
+    assignment_history.record_update(db, db_assignment, changes)
     db.commit()
     return None
 
 
-@router.get("/{assignment_id}/can-administer", response_model=schemas.AssignmentStatus)
-def can_administer(assignment_id: int, db: Session = Depends(get_db)):
-    """Check if medication can be administered and get status."""
-    db_assignment = db.query(models.MedicationAssignment).filter(
-        models.MedicationAssignment.id == assignment_id
-    ).first()
-    if not db_assignment:
-        raise HTTPException(status_code=404, detail="Assignment not found")
-    
-    # Determine frequency type and values
+def frequency_settings(assignment, medication):
+    """Frequency type and hours an assignment is given at, from its overrides or the medication's defaults.
+
+    Returns ``(frequency_type, frequency_hours, min_hours, max_hours)``; hours
+    that are not configured are None.
+    """
     # Check if assignment has range override
-    has_range_override = (db_assignment.frequency_min_hours is not None and 
-                          db_assignment.frequency_max_hours is not None)
-    has_fixed_override = db_assignment.frequency_hours is not None
+    has_range_override = (assignment.frequency_min_hours is not None and 
+                          assignment.frequency_max_hours is not None)
+    has_fixed_override = assignment.frequency_hours is not None
     
     # Check medication defaults
-    med_has_range = (db_assignment.medication.default_frequency_min_hours is not None and
-                     db_assignment.medication.default_frequency_max_hours is not None)
-    med_has_fixed = db_assignment.medication.default_frequency_hours is not None
+    med_has_range = (medication.default_frequency_min_hours is not None and
+                     medication.default_frequency_max_hours is not None)
     
-    # Determine frequency type
     if has_range_override or (not has_fixed_override and med_has_range):
         # Range frequency
-        frequency_type = "range"
-        min_hours = db_assignment.frequency_min_hours or db_assignment.medication.default_frequency_min_hours
-        max_hours = db_assignment.frequency_max_hours or db_assignment.medication.default_frequency_max_hours
-        frequency_hours = None
-        if min_hours is None or max_hours is None:
-            raise HTTPException(status_code=400, detail="Medication range frequency not properly configured")
-    else:
-        # Fixed frequency
-        frequency_type = "fixed"
-        frequency_hours = db_assignment.frequency_hours or db_assignment.medication.default_frequency_hours
-        min_hours = None
-        max_hours = None
-        if frequency_hours is None:
-            raise HTTPException(status_code=400, detail="Medication frequency not properly configured")
+        min_hours = assignment.frequency_min_hours or medication.default_frequency_min_hours
+        max_hours = assignment.frequency_max_hours or medication.default_frequency_max_hours
+        return "range", None, min_hours, max_hours
+    # Fixed frequency
+    return "fixed", assignment.frequency_hours or medication.default_frequency_hours, None, None
+
+
+def utc_datetime(value):
+    """A stored timestamp as an aware UTC datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _status_inputs(assignment_id: int, db: Session):
+    """Frequency settings and last dose time of an assignment, read from the database."""
+    db_assignment = db.query(models.MedicationAssignment).options(
+        joinedload(models.MedicationAssignment.medication)
+    ).filter(
+        models.MedicationAssignment.id == assignment_id
+    ).first()
+    if not db_assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    
+    # Determine frequency type and values
+    frequency_type, frequency_hours, min_hours, max_hours = frequency_settings(
+        db_assignment, db_assignment.medication
+    )
+    if frequency_type == "range" and (min_hours is None or max_hours is None):
+        raise HTTPException(status_code=400, detail="Medication range frequency not properly configured")
+    if frequency_type == "fixed" and frequency_hours is None:
+        raise HTTPException(status_code=400, detail="Medication frequency not properly configured")
     
     # Get last administration
     last_admin = db.query(models.Administration).filter(
         models.Administration.medication_assignment_id == assignment_id
     ).order_by(desc(models.Administration.administered_at)).first()
     
-    if not last_admin:
+    last_time = utc_datetime(last_admin.administered_at) if last_admin else None
+    
+    return frequency_type, frequency_hours, min_hours, max_hours, last_time
+
+
+@router.get("/{assignment_id}/can-administer", response_model=schemas.AssignmentStatus)
+@query_budget(3)
+def can_administer(assignment_id: int, db: Session = Depends(get_db)):
+    """Check if medication can be administered and get status."""
+    # The database part is cached until the assignment, medication or administration tables change
+    frequency_type, frequency_hours, min_hours, max_hours, last_time = cache.assignment_status.get(
+        db, assignment_id, lambda: _status_inputs(assignment_id, db)
+    )
+    
+    if last_time is None:
         return schemas.AssignmentStatus(
             can_administer=True,
             status="ready",
@@ -219,16 +341,6 @@ def can_administer(assignment_id: int, db: Session = Depends(get_db)):
             frequency_type=frequency_type
         )
     
-    last_time = last_admin.administered_at
-    if isinstance(last_time, str):
-        last_time = datetime.fromisoformat(last_time.replace('Z', '+00:00'))
-    
-    # Ensure last_time is timezone-aware (UTC)
-    if last_time.tzinfo is None:
-        last_time = last_time.replace(tzinfo=timezone.utc)
-    else:
-        last_time = last_time.astimezone(timezone.utc)
-    
     # Use UTC for now
     now = datetime.now(timezone.utc)
     
@@ -298,23 +410,35 @@ def can_administer(assignment_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{assignment_id}/status", response_model=schemas.AssignmentStatus)
+@query_budget(3)
 def get_assignment_status(assignment_id: int, db: Session = Depends(get_db)):
     """Get detailed status of an assignment."""
     return can_administer(assignment_id, db)
 
 
 @router.get("/scheduled/list", response_model=List[schemas.MedicationAssignment])
+@query_budget(1)
 def get_scheduled_assignments(db: Session = Depends(get_db)):
     """Get all assignments with recurring schedules."""
-    return db.query(models.MedicationAssignment).filter(
+    return _with_relationships(db.query(models.MedicationAssignment)).filter(
         models.MedicationAssignment.schedule_type.isnot(None),
         models.MedicationAssignment.active == True
     ).all()
 
 
-@router.get("/{assignment_id}/edit-history", response_model=List[schemas.AssignmentAuditLog])
-def get_assignment_edit_history(assignment_id: int, db: Session = Depends(get_db)):
-    """Get edit history for an assignment."""
+@router.get("/{assignment_id}/edit-history", response_model=List[schemas.AssignmentRevision])
+@query_budget(2)
+def get_assignment_edit_history(
+    assignment_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get edit history for an assignment, newest first.
+    
+    Pages are keyed by revision id: pass the last id of a page as
+    ``before_id`` to get the next one.
+    """
     # Verify assignment exists
     db_assignment = db.query(models.MedicationAssignment).filter(
         models.MedicationAssignment.id == assignment_id
@@ -322,10 +446,36 @@ def get_assignment_edit_history(assignment_id: int, db: Session = Depends(get_db
     if not db_assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    # Get audit logs
-    audit_logs = db.query(models.AssignmentAuditLog).filter(
-        models.AssignmentAuditLog.assignment_id == assignment_id
-    ).order_by(models.AssignmentAuditLog.changed_at.desc()).all()
+    query = db.query(models.AssignmentRevision).filter(
+        models.AssignmentRevision.assignment_id == assignment_id,
+        models.AssignmentRevision.changes.isnot(None)
+    )
+    if before_id is not None:
+        query = query.filter(models.AssignmentRevision.id < before_id)
+    revisions = query.order_by(models.AssignmentRevision.id.desc()).limit(limit).all()
     
-    return audit_logs
+    return [
+        schemas.AssignmentRevision(
+            id=revision.id,
+            assignment_id=revision.assignment_id,
+            changes=assignment_history.revision_changes(revision),
+            changed_at=revision.changed_at
+        )
+        for revision in revisions
+    ]
+
 
+@router.get("/{assignment_id}/as-of", response_model=schemas.AssignmentAsOf)
+@query_budget(3)
+def get_assignment_as_of(assignment_id: int, ts: datetime, db: Session = Depends(get_db)):
+    """Get the state of an assignment at a point in time."""
+    db_assignment = db.query(models.MedicationAssignment.id).filter(
+        models.MedicationAssignment.id == assignment_id
+    ).first()
+    if not db_assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    
+    state = assignment_history.state_as_of(db, assignment_id, ts)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Assignment has no recorded state at this time")
+    return state
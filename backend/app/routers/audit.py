@@ -0,0 +1,55 @@
+"""Audit log endpoints."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import json
+from .. import models, schemas, audit
+from ..database import get_db
+
+router = APIRouter(prefix="/api/audit", tags=["audit"])
+
+
+@router.get("", response_model=List[schemas.AuditEvent])
+def get_audit_events(
+    table: Optional[str] = None,
+    record_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Get the most recent audit events, optionally for one table or row."""
+    if table is not None and table not in audit.AUDITED_MODELS:
+        raise HTTPException(status_code=400, detail=f"Table is not audited: {table}")
+    
+    # Write out queued events first so the trail includes the latest changes
+    audit.get_pipeline().flush()
+    
+    query = db.query(models.AuditEvent)
+    if table is not None:
+        query = query.filter(models.AuditEvent.table_name == table)
+    if record_id is not None:
+        query = query.filter(models.AuditEvent.record_id == record_id)
+    events = query.order_by(models.AuditEvent.id.desc()).limit(limit).all()
+    
+    return [
+        schemas.AuditEvent(
+            id=e.id,
+            table_name=e.table_name,
+            record_id=e.record_id,
+            action=e.action,
+            changes=json.loads(e.changes),
+            occurred_at=e.occurred_at
+        )
+        for e in events
+    ]
+
+
+@router.get("/stats")
+def get_audit_stats():
+    """Get audit pipeline counters and the current queue depth."""
+    pipeline = audit.get_pipeline()
+    return {
+        "enabled": audit.AUDIT_ENABLED,
+        "running": pipeline.running,
+        "pending": pipeline.pending(),
+        **pipeline.stats
+    }
@@ -0,0 +1,23 @@
+"""Snapshot backup endpoints."""
+from fastapi import APIRouter, HTTPException
+import sqlite3
+from .. import backup
+from ..workloads import bulk_workload
+
+router = APIRouter(prefix="/api/backup", tags=["backup"])
+
+
+@router.post("/snapshot", status_code=201)
+@bulk_workload
+def create_snapshot(compress: bool = False):
+    """Write a consistent snapshot of the database using SQLite's backup API."""
+    try:
+        return backup.create_snapshot(compress=compress)
+    except (OSError, sqlite3.Error) as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot failed: {str(e)}")
+
+
+@router.get("/snapshots")
+def list_snapshots():
+    """List snapshot files, newest first."""
+    return backup.list_snapshots()
@@ -2,19 +2,28 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-from .. import models, schemas
+from .. import cache, models, schemas
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
 
 router = APIRouter(prefix="/api/caregivers", tags=["caregivers"])
 
 
 @router.get("", response_model=List[schemas.Caregiver])
+@query_budget(2)
 def get_caregivers(db: Session = Depends(get_db)):
     """Get all caregivers."""
-    return db.query(models.Caregiver).filter(models.Caregiver.active == True).all()
+    def load():
+        rows = db.query(models.Caregiver).filter(models.Caregiver.active == True).all()
+        return [schemas.Caregiver.model_validate(row) for row in rows]
+
+    # Cached as response schemas until another write to the reference tables
+    return cache.reference_data.get(db, "caregivers", load)
 
 
 @router.post("", response_model=schemas.Caregiver, status_code=201)
+@idempotent
 def create_caregiver(caregiver: schemas.CaregiverCreate, db: Session = Depends(get_db)):
     """Create a new caregiver."""
     db_caregiver = models.Caregiver(**caregiver.model_dump())
@@ -41,6 +50,7 @@ def update_caregiver(caregiver_id: int, caregiver: schemas.CaregiverUpdate, db:
 
 
 @router.get("/{caregiver_id}/can-delete")
+@query_budget(2)
 def can_delete_caregiver(caregiver_id: int, db: Session = Depends(get_db)):
     """Check if a caregiver can be deleted (no recorded administrations)."""
     db_caregiver = db.query(models.Caregiver).filter(models.Caregiver.id == caregiver_id).first()
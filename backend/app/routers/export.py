@@ -2,13 +2,18 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from sqlalchemy import insert
+from typing import Dict, Any, Optional
 import json
 import csv
+import gzip
 import io
+import zlib
 from datetime import datetime, timezone
-from .. import models, schemas
+from .. import assignment_history, audit, inventory_ledger, models, rollups, schemas
 from ..database import get_db
+from ..query_inspection import query_budget
+from ..workloads import bulk_stream, bulk_workload
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -20,100 +25,167 @@ def serialize_datetime(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
+def _isoformat(value):
+    """Format an optional datetime column for export."""
+    return value.isoformat() if value else None
+
+
+def _family_member_to_dict(member):
+    return {
+        "id": member.id,
+        "name": member.name,
+        "active": member.active,
+        "created_at": _isoformat(member.created_at),
+        "updated_at": _isoformat(member.updated_at)
+    }
+
+
+def _caregiver_to_dict(caregiver):
+    return {
+        "id": caregiver.id,
+        "name": caregiver.name,
+        "active": caregiver.active,
+        "created_at": _isoformat(caregiver.created_at),
+        "updated_at": _isoformat(caregiver.updated_at)
+    }
+
+
+def _medication_to_dict(med):
+    return {
+        "id": med.id,
+        "name": med.name,
+        "default_dose": med.default_dose,
+        "default_frequency_hours": med.default_frequency_hours,
+        "default_frequency_min_hours": med.default_frequency_min_hours,
+        "default_frequency_max_hours": med.default_frequency_max_hours,
+        "notes": med.notes,
+        "created_at": _isoformat(med.created_at),
+        "updated_at": _isoformat(med.updated_at)
+    }
+
+
+def _assignment_to_dict(assignment):
+    return {
+        "id": assignment.id,
+        "family_member_id": assignment.family_member_id,
+        "medication_id": assignment.medication_id,
+        "current_dose": assignment.current_dose,
+        "frequency_hours": assignment.frequency_hours,
+        "frequency_min_hours": assignment.frequency_min_hours,
+        "frequency_max_hours": assignment.frequency_max_hours,
+        "active": assignment.active,
+        "schedule_type": assignment.schedule_type,
+        "schedule_time": assignment.schedule_time,
+        "schedule_days": assignment.schedule_days,
+        "created_at": _isoformat(assignment.created_at),
+        "updated_at": _isoformat(assignment.updated_at)
+    }
+
+
+def _administration_to_dict(admin):
+    return {
+        "id": admin.id,
+        "medication_assignment_id": admin.medication_assignment_id,
+        "caregiver_id": admin.caregiver_id,
+        "administered_at": _isoformat(admin.administered_at),
+        "dose_given": admin.dose_given,
+        "notes": admin.notes,
+        "created_at": _isoformat(admin.created_at),
+        "updated_at": _isoformat(admin.updated_at)
+    }
+
+
+def _inventory_to_dict(inv):
+    return {
+        "id": inv.id,
+        "medication_id": inv.medication_id,
+        "quantity": inv.quantity,
+        "unit": inv.unit,
+        "low_stock_threshold": inv.low_stock_threshold,
+        "last_updated": _isoformat(inv.last_updated)
+    }
+
+
+# Exported sections: (key, model, serializer)
+EXPORT_SECTIONS = [
+    ("family_members", models.FamilyMember, _family_member_to_dict),
+    ("caregivers", models.Caregiver, _caregiver_to_dict),
+    ("medications", models.Medication, _medication_to_dict),
+    ("assignments", models.MedicationAssignment, _assignment_to_dict),
+    ("administrations", models.Administration, _administration_to_dict),
+    ("inventory", models.MedicationInventory, _inventory_to_dict),
+]
+
+
 @router.get("/json")
+@query_budget(6)
+@bulk_workload
 def export_json(db: Session = Depends(get_db)):
     """Export all data as JSON."""
-    data = {
-        "export_date": datetime.now().isoformat(),
-        "family_members": [],
-        "caregivers": [],
-        "medications": [],
-        "assignments": [],
-        "administrations": [],
-        "inventory": []
-    }
+    data = {"export_date": datetime.now().isoformat()}
     
-    # Export family members
-    family_members = db.query(models.FamilyMember).all()
-    for member in family_members:
-        data["family_members"].append({
-            "id": member.id,
-            "name": member.name,
-            "active": member.active,
-            "created_at": member.created_at.isoformat() if member.created_at else None
-        })
+    for key, model, serialize in EXPORT_SECTIONS:
+        data[key] = [serialize(row) for row in db.query(model).all()]
     
-    # Export caregivers
-    caregivers = db.query(models.Caregiver).all()
-    for caregiver in caregivers:
-        data["caregivers"].append({
-            "id": caregiver.id,
-            "name": caregiver.name,
-            "active": caregiver.active,
-            "created_at": caregiver.created_at.isoformat() if caregiver.created_at else None
-        })
+    return JSONResponse(content=data)
+
+
+@router.get("/changes")
+@query_budget(8)
+@bulk_workload
+def export_changes(since: Optional[str] = None, db: Session = Depends(get_db)):
+    """Export rows created, modified or deleted since a previous change token.
     
-    # Export medications
-    medications = db.query(models.Medication).all()
-    for med in medications:
-        data["medications"].append({
-            "id": med.id,
-            "name": med.name,
-            "default_dose": med.default_dose,
-            "default_frequency_hours": med.default_frequency_hours,
-            "default_frequency_min_hours": med.default_frequency_min_hours,
-            "default_frequency_max_hours": med.default_frequency_max_hours,
-            "notes": med.notes,
-            "created_at": med.created_at.isoformat() if med.created_at else None
-        })
+    Without a token every row is returned, so the first sync is a full export.
+    The response's next_token is passed as ``since`` on the following call.
+    Tokens are change sequence numbers, which grow in commit order (see
+    ``_migrate_change_sequence``), so a transaction committing after a token
+    was issued is always in the next sync, however long it ran. Timestamp
+    tokens issued before sequence numbers get a full export.
+    """
+    # Read before the rows, so changes committed in between are exported again rather than missed
+    next_token = db.query(models.ChangeSequence.value).filter(models.ChangeSequence.id == 1).scalar() or 0
     
-    # Export assignments
-    assignments = db.query(models.MedicationAssignment).all()
-    for assignment in assignments:
-        data["assignments"].append({
-            "id": assignment.id,
-            "family_member_id": assignment.family_member_id,
-            "medication_id": assignment.medication_id,
-            "current_dose": assignment.current_dose,
-            "frequency_hours": assignment.frequency_hours,
-            "frequency_min_hours": assignment.frequency_min_hours,
-            "frequency_max_hours": assignment.frequency_max_hours,
-            "active": assignment.active,
-            "schedule_type": assignment.schedule_type,
-            "schedule_time": assignment.schedule_time,
-            "schedule_days": assignment.schedule_days,
-            "created_at": assignment.created_at.isoformat() if assignment.created_at else None
-        })
+    since_seq = None
+    if since:
+        try:
+            since_seq = int(since)
+        except ValueError:
+            try:
+                datetime.fromisoformat(since.replace('Z', '+00:00'))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid change token")
     
-    # Export administrations
-    administrations = db.query(models.Administration).all()
-    for admin in administrations:
-        data["administrations"].append({
-            "id": admin.id,
-            "medication_assignment_id": admin.medication_assignment_id,
-            "caregiver_id": admin.caregiver_id,
-            "administered_at": admin.administered_at.isoformat() if admin.administered_at else None,
-            "dose_given": admin.dose_given,
-            "notes": admin.notes,
-            "created_at": admin.created_at.isoformat() if admin.created_at else None
-        })
+    data = {
+        "export_date": datetime.now().isoformat(),
+        "since": since,
+        "next_token": str(next_token)
+    }
+    
+    for key, model, serialize in EXPORT_SECTIONS:
+        query = db.query(model)
+        if since_seq is not None:
+            query = query.filter(model.change_seq > since_seq)
+        data[key] = [serialize(row) for row in query.order_by(model.change_seq).all()]
     
-    # Export inventory
-    inventory = db.query(models.MedicationInventory).all()
-    for inv in inventory:
-        data["inventory"].append({
-            "id": inv.id,
-            "medication_id": inv.medication_id,
-            "quantity": inv.quantity,
-            "unit": inv.unit,
-            "low_stock_threshold": inv.low_stock_threshold,
-            "last_updated": inv.last_updated.isoformat() if inv.last_updated else None
-        })
+    deleted = db.query(models.DeletedRecord)
+    if since_seq is not None:
+        deleted = deleted.filter(models.DeletedRecord.change_seq > since_seq)
+    data["deleted"] = [
+        {
+            "table": record.table_name,
+            "id": record.record_id,
+            "deleted_at": _isoformat(record.deleted_at)
+        }
+        for record in deleted.order_by(models.DeletedRecord.change_seq).all()
+    ]
     
     return JSONResponse(content=data)
 
 
 @router.get("/csv")
+@query_budget(1)
+@bulk_workload
 def export_csv(db: Session = Depends(get_db)):
     """Export administrations as CSV."""
     output = io.StringIO()
@@ -124,8 +196,8 @@ def export_csv(db: Session = Depends(get_db)):
         "ID", "Family Member", "Medication", "Caregiver", "Administered At", "Dose Given", "Notes"
     ])
     
-    # Write data
-    from sqlalchemy.orm import joinedload
+    # Write data; the joined rows fill the relationships used below
+    from sqlalchemy.orm import contains_eager, joinedload
     administrations = db.query(models.Administration).join(
         models.MedicationAssignment
     ).join(
@@ -133,6 +205,8 @@ def export_csv(db: Session = Depends(get_db)):
     ).join(
         models.Medication
     ).options(
+        contains_eager(models.Administration.assignment).contains_eager(models.MedicationAssignment.family_member),
+        contains_eager(models.Administration.assignment).contains_eager(models.MedicationAssignment.medication),
         joinedload(models.Administration.caregiver)
     ).order_by(models.Administration.administered_at.desc()).all()
     
@@ -156,138 +230,462 @@ def export_csv(db: Session = Depends(get_db)):
     )
 
 
+def _parse_utc(value):
+    """Parse an exported ISO timestamp as an aware UTC datetime."""
+    if not value:
+        return datetime.now(timezone.utc)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Ensure UTC
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _family_member_row(member_data):
+    return {
+        "id": member_data["id"],
+        "name": member_data["name"],
+        "active": member_data.get("active", True)
+    }
+
+
+def _caregiver_row(caregiver_data):
+    return {
+        "id": caregiver_data["id"],
+        "name": caregiver_data["name"],
+        "active": caregiver_data.get("active", True)
+    }
+
+
+def _medication_row(med_data):
+    return {
+        "id": med_data["id"],
+        "name": med_data["name"],
+        "default_dose": med_data["default_dose"],
+        "default_frequency_hours": med_data.get("default_frequency_hours"),
+        "default_frequency_min_hours": med_data.get("default_frequency_min_hours"),
+        "default_frequency_max_hours": med_data.get("default_frequency_max_hours"),
+        "notes": med_data.get("notes")
+    }
+
+
+def _assignment_row(assign_data):
+    return {
+        "id": assign_data["id"],
+        "family_member_id": assign_data["family_member_id"],
+        "medication_id": assign_data["medication_id"],
+        "current_dose": assign_data.get("current_dose"),
+        "frequency_hours": assign_data.get("frequency_hours"),
+        "frequency_min_hours": assign_data.get("frequency_min_hours"),
+        "frequency_max_hours": assign_data.get("frequency_max_hours"),
+        "active": assign_data.get("active", True),
+        "schedule_type": assign_data.get("schedule_type"),
+        "schedule_time": assign_data.get("schedule_time"),
+        "schedule_days": assign_data.get("schedule_days")
+    }
+
+
+def _administration_row(admin_data):
+    return {
+        "id": admin_data["id"],
+        "medication_assignment_id": admin_data["medication_assignment_id"],
+        "caregiver_id": admin_data.get("caregiver_id"),
+        "administered_at": _parse_utc(admin_data.get("administered_at")),
+        "dose_given": admin_data["dose_given"],
+        "notes": admin_data.get("notes")
+    }
+
+
+def _inventory_row(inv_data):
+    return {
+        "id": inv_data["id"],
+        "medication_id": inv_data["medication_id"],
+        "quantity": inv_data["quantity"],
+        "unit": inv_data["unit"],
+        "low_stock_threshold": inv_data.get("low_stock_threshold")
+    }
+
+
+# Imported sections: key -> (model, row builder)
+IMPORT_SECTIONS = {
+    "family_members": (models.FamilyMember, _family_member_row),
+    "caregivers": (models.Caregiver, _caregiver_row),
+    "medications": (models.Medication, _medication_row),
+    "assignments": (models.MedicationAssignment, _assignment_row),
+    "administrations": (models.Administration, _administration_row),
+    "inventory": (models.MedicationInventory, _inventory_row),
+}
+
+IMPORT_BATCH_SIZE = 500
+
+
+def _insert_missing(db, model, rows):
+    """Insert rows whose id does not exist yet, with one lookup per batch, and audit them.
+
+    Returns the inserted rows.
+    """
+    rows_by_id = {}
+    for row in rows:
+        rows_by_id.setdefault(row["id"], row)
+    
+    existing = {
+        row_id for (row_id,) in db.query(model.id).filter(model.id.in_(list(rows_by_id)))
+    }
+    new_rows = [row for row_id, row in rows_by_id.items() if row_id not in existing]
+    if new_rows:
+        db.execute(insert(model), new_rows)
+        audit.record_inserts(db, model, new_rows)
+    return new_rows
+
+
+def _import_batch(db, key, records, imported, touched):
+    """Import a batch of exported records of one section.
+    
+    Adds the assignments of imported administrations to ``touched``, whose
+    daily rollups are rebuilt before the import commits. Imported
+    assignments start their history and imported inventory its ledger with
+    a snapshot, as when they are created through the API.
+    """
+    model, build_row = IMPORT_SECTIONS[key]
+    rows = [build_row(record) for record in records]
+    new_rows = _insert_missing(db, model, rows)
+    imported[key] += len(new_rows)
+    if model is models.MedicationAssignment:
+        assignment_history.record_creations(db, new_rows)
+    if model is models.MedicationInventory:
+        inventory_ledger.start_ledgers(db, new_rows)
+    if model is models.Administration:
+        touched.update(row["medication_assignment_id"] for row in rows)
+
+
 @router.post("/import/json")
+@bulk_workload
 def import_json(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Import data from JSON backup."""
     try:
         content = file.file.read()
         data = json.loads(content)
         
-        imported = {
-            "family_members": 0,
-            "caregivers": 0,
-            "medications": 0,
-            "assignments": 0,
-            "administrations": 0,
-            "inventory": 0
+        imported = {key: 0 for key in IMPORT_SECTIONS}
+        touched = set()
+        
+        for key in IMPORT_SECTIONS:
+            records = data.get(key, [])
+            for start in range(0, len(records), IMPORT_BATCH_SIZE):
+                _import_batch(db, key, records[start:start + IMPORT_BATCH_SIZE], imported, touched)
+        
+        rollups.rebuild(db, touched)
+        db.commit()
+        
+        return {
+            "message": "Import completed successfully",
+            "imported": imported
+        }
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+
+
+CSV_REQUIRED_COLUMNS = ["Family Member", "Medication", "Administered At", "Dose Given"]
+CSV_MAX_REPORTED_ERRORS = 50
+
+
+def _name_key(name):
+    """Normalize a name for matching CSV values to database rows."""
+    return " ".join((name or "").split()).casefold()
+
+
+def _name_index(rows):
+    """Map normalized names to ids; active rows win over inactive namesakes."""
+    index = {}
+    for row_id, name, active in sorted(rows, key=lambda row: bool(row[2])):
+        index[_name_key(name)] = row_id
+    return index
+
+
+@router.post("/import/csv")
+@bulk_workload
+def import_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Import administrations from CSV in the format written by the CSV export.
+    
+    Family member, medication and caregiver names are resolved to ids through
+    lookup tables built once per import. Rows whose names cannot be resolved
+    are skipped and reported in the summary.
+    """
+    try:
+        reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""))
+        missing = [column for column in CSV_REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(missing)}")
+        
+        # Build lookup tables once instead of querying per row
+        members = _name_index(db.query(
+            models.FamilyMember.id, models.FamilyMember.name, models.FamilyMember.active
+        ).all())
+        medications = _name_index(db.query(
+            models.Medication.id, models.Medication.name, True
+        ).all())
+        caregivers = _name_index(db.query(
+            models.Caregiver.id, models.Caregiver.name, models.Caregiver.active
+        ).all())
+        assignments = {
+            (member_id, medication_id): assignment_id
+            for assignment_id, member_id, medication_id, active in sorted(
+                db.query(
+                    models.MedicationAssignment.id,
+                    models.MedicationAssignment.family_member_id,
+                    models.MedicationAssignment.medication_id,
+                    models.MedicationAssignment.active
+                ).all(),
+                key=lambda row: bool(row[3])
+            )
         }
         
-        # Import family members
-        if "family_members" in data:
-            for member_data in data["family_members"]:
-                existing = db.query(models.FamilyMember).filter(
-                    models.FamilyMember.id == member_data["id"]
-                ).first()
-                if not existing:
-                    db_member = models.FamilyMember(
-                        id=member_data["id"],
-                        name=member_data["name"],
-                        active=member_data.get("active", True)
-                    )
-                    db.add(db_member)
-                    imported["family_members"] += 1
+        imported = {key: 0 for key in IMPORT_SECTIONS}
+        unresolved = {"family_members": {}, "medications": {}, "caregivers": {}, "assignments": {}}
+        errors = []
+        error_count = 0
+        rows_read = 0
+        with_id = []
+        without_id = []
         
-        # Import caregivers
-        if "caregivers" in data:
-            for caregiver_data in data["caregivers"]:
-                existing = db.query(models.Caregiver).filter(
-                    models.Caregiver.id == caregiver_data["id"]
-                ).first()
-                if not existing:
-                    db_caregiver = models.Caregiver(
-                        id=caregiver_data["id"],
-                        name=caregiver_data["name"],
-                        active=caregiver_data.get("active", True)
-                    )
-                    db.add(db_caregiver)
-                    imported["caregivers"] += 1
+        touched = set()
         
-        # Import medications
-        if "medications" in data:
-            for med_data in data["medications"]:
-                existing = db.query(models.Medication).filter(
-                    models.Medication.id == med_data["id"]
-                ).first()
-                if not existing:
-                    db_med = models.Medication(
-                        id=med_data["id"],
-                        name=med_data["name"],
-                        default_dose=med_data["default_dose"],
-                        default_frequency_hours=med_data.get("default_frequency_hours"),
-                        default_frequency_min_hours=med_data.get("default_frequency_min_hours"),
-                        default_frequency_max_hours=med_data.get("default_frequency_max_hours"),
-                        notes=med_data.get("notes")
-                    )
-                    db.add(db_med)
-                    imported["medications"] += 1
+        def flush():
+            touched.update(record["medication_assignment_id"] for record in with_id + without_id)
+            if with_id:
+                imported["administrations"] += len(_insert_missing(db, models.Administration, with_id))
+                with_id.clear()
+            if without_id:
+                # One multi-row insert; SQLite assigns the rowids in VALUES order
+                ids = sorted(row.id for row in db.execute(
+                    insert(models.Administration).values(without_id).returning(models.Administration.id)
+                ))
+                audit.record_inserts(db, models.Administration, [
+                    {"id": administration_id, **record} for record, administration_id in zip(without_id, ids)
+                ])
+                imported["administrations"] += len(without_id)
+                without_id.clear()
+        
+        for line_number, row in enumerate(reader, start=2):
+            rows_read += 1
+            member_name = (row.get("Family Member") or "").strip()
+            medication_name = (row.get("Medication") or "").strip()
+            caregiver_name = (row.get("Caregiver") or "").strip()
+            
+            member_id = members.get(_name_key(member_name))
+            medication_id = medications.get(_name_key(medication_name))
+            caregiver_id = caregivers.get(_name_key(caregiver_name)) if caregiver_name else None
+            resolved = True
+            if member_id is None:
+                unresolved["family_members"][member_name] = unresolved["family_members"].get(member_name, 0) + 1
+                resolved = False
+            if medication_id is None:
+                unresolved["medications"][medication_name] = unresolved["medications"].get(medication_name, 0) + 1
+                resolved = False
+            if caregiver_name and caregiver_id is None:
+                unresolved["caregivers"][caregiver_name] = unresolved["caregivers"].get(caregiver_name, 0) + 1
+                resolved = False
+            if not resolved:
+                continue
+            
+            assignment_id = assignments.get((member_id, medication_id))
+            if assignment_id is None:
+                pair = f"{member_name} / {medication_name}"
+                unresolved["assignments"][pair] = unresolved["assignments"].get(pair, 0) + 1
+                continue
+            
+            administered_at = (row.get("Administered At") or "").strip()
+            dose_given = (row.get("Dose Given") or "").strip()
+            try:
+                if not administered_at:
+                    raise ValueError("missing Administered At")
+                if not dose_given:
+                    raise ValueError("missing Dose Given")
+                record = {
+                    "medication_assignment_id": assignment_id,
+                    "caregiver_id": caregiver_id,
+                    "administered_at": _parse_utc(administered_at),
+                    "dose_given": dose_given,
+                    "notes": (row.get("Notes") or "").strip() or None
+                }
+                row_id = (row.get("ID") or "").strip()
+                if row_id:
+                    record["id"] = int(row_id)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < CSV_MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_number, "error": str(e)})
+                continue
+            
+            if "id" in record:
+                with_id.append(record)
+            else:
+                without_id.append(record)
+            if len(with_id) + len(without_id) >= IMPORT_BATCH_SIZE:
+                flush()
+        
+        flush()
+        rollups.rebuild(db, touched)
+        db.commit()
         
-        # Import assignments
-        if "assignments" in data:
-            for assign_data in data["assignments"]:
-                existing = db.query(models.MedicationAssignment).filter(
-                    models.MedicationAssignment.id == assign_data["id"]
-                ).first()
-                if not existing:
-                    db_assign = models.MedicationAssignment(
-                        id=assign_data["id"],
-                        family_member_id=assign_data["family_member_id"],
-                        medication_id=assign_data["medication_id"],
-                        current_dose=assign_data.get("current_dose"),
-                        frequency_hours=assign_data.get("frequency_hours"),
-                        frequency_min_hours=assign_data.get("frequency_min_hours"),
-                        frequency_max_hours=assign_data.get("frequency_max_hours"),
-                        active=assign_data.get("active", True),
-                        schedule_type=assign_data.get("schedule_type"),
-                        schedule_time=assign_data.get("schedule_time"),
-                        schedule_days=assign_data.get("schedule_days")
-                    )
-                    db.add(db_assign)
-                    imported["assignments"] += 1
+        skipped = rows_read - imported["administrations"]
+        return {
+            "message": "Import completed successfully",
+            "rows": rows_read,
+            "imported": {"administrations": imported["administrations"]},
+            "skipped": skipped,
+            "unresolved": unresolved,
+            "error_count": error_count,
+            "errors": errors
+        }
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+
+
+# NDJSON record type for each exported section
+NDJSON_RECORD_TYPES = {
+    "family_members": "family_member",
+    "caregivers": "caregiver",
+    "medications": "medication",
+    "assignments": "assignment",
+    "administrations": "administration",
+    "inventory": "inventory",
+}
+NDJSON_SECTIONS = {record_type: key for key, record_type in NDJSON_RECORD_TYPES.items()}
+NDJSON_FORMAT_VERSION = 1
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+
+def _zstandard():
+    """The optional zstandard module, imported on first use rather than at startup."""
+    try:
+        import zstandard
+    except ImportError:  # Optional: only needed for zstd-compressed NDJSON
+        return None
+    return zstandard
+
+
+def _ndjson_compressor(compression):
+    """Return a streaming compressor with compress()/flush(), or None."""
+    if compression == "gzip":
+        # wbits=31 writes a gzip member; concatenated members stay valid gzip
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise HTTPException(status_code=400, detail="zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if compression == "none":
+        return None
+    raise HTTPException(status_code=400, detail="compression must be one of: gzip, zstd, none")
+
+
+def _ndjson_lines(db):
+    """Yield one JSON line per exported row, preceded by a header record."""
+    yield json.dumps({
+        "type": "export",
+        "format_version": NDJSON_FORMAT_VERSION,
+        "export_date": datetime.now().isoformat()
+    }, separators=(",", ":")) + "\n"
+    for key, model, serialize in EXPORT_SECTIONS:
+        record_type = NDJSON_RECORD_TYPES[key]
+        for row in db.query(model).order_by(model.id).yield_per(1000):
+            yield json.dumps({"type": record_type, **serialize(row)}, separators=(",", ":")) + "\n"
+
+
+def _ndjson_stream(db, compressor):
+    """Encode and compress NDJSON lines in chunks as they are produced."""
+    buffer = []
+    size = 0
+    for line in _ndjson_lines(db):
+        buffer.append(line)
+        size += len(line)
+        if size >= NDJSON_CHUNK_SIZE:
+            chunk = "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = "".join(buffer).encode("utf-8")
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+@router.get("/ndjson")
+@query_budget(6)
+@bulk_workload
+def export_ndjson(compression: str = "gzip", db: Session = Depends(get_db)):
+    """Export all data as NDJSON, one typed record per line, streamed.
+    
+    Files from several exports can be concatenated and imported together.
+    """
+    compressor = _ndjson_compressor(compression)
+    extension, media_type = {
+        "gzip": (".ndjson.gz", "application/gzip"),
+        "zstd": (".ndjson.zst", "application/zstd"),
+        "none": (".ndjson", "application/x-ndjson"),
+    }[compression]
+    return StreamingResponse(
+        bulk_stream(_ndjson_stream(db, compressor)),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=medication_export{extension}"}
+    )
+
+
+def _open_ndjson(raw):
+    """Wrap an uploaded file in a decompressing line stream, by magic bytes."""
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if magic == ZSTD_MAGIC:
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise ValueError("zstd compressed imports require the zstandard package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+    return raw
+
+
+@router.post("/import/ndjson")
+@bulk_workload
+def import_ndjson(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Import data from an NDJSON backup (plain, gzip or zstd), streamed."""
+    try:
+        imported = {key: 0 for key in IMPORT_SECTIONS}
+        touched = set()
+        batch_key = None
+        batch = []
         
-        # Import administrations
-        if "administrations" in data:
-            for admin_data in data["administrations"]:
-                existing = db.query(models.Administration).filter(
-                    models.Administration.id == admin_data["id"]
-                ).first()
-                if not existing:
-                    if admin_data.get("administered_at"):
-                        admin_time = datetime.fromisoformat(admin_data["administered_at"].replace('Z', '+00:00'))
-                        # Ensure UTC
-                        if admin_time.tzinfo is None:
-                            admin_time = admin_time.replace(tzinfo=timezone.utc)
-                        else:
-                            admin_time = admin_time.astimezone(timezone.utc)
-                    else:
-                        admin_time = datetime.now(timezone.utc)
-                    db_admin = models.Administration(
-                        id=admin_data["id"],
-                        medication_assignment_id=admin_data["medication_assignment_id"],
-                        caregiver_id=admin_data.get("caregiver_id"),
-                        administered_at=admin_time,
-                        dose_given=admin_data["dose_given"],
-                        notes=admin_data.get("notes")
-                    )
-                    db.add(db_admin)
-                    imported["administrations"] += 1
+        for line_number, line in enumerate(_open_ndjson(file.file), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"line {line_number} is not valid JSON")
+            # Header records (one per concatenated export) and unknown types are skipped
+            key = NDJSON_SECTIONS.get(record.get("type"))
+            if key is None:
+                continue
+            if key != batch_key or len(batch) >= IMPORT_BATCH_SIZE:
+                if batch:
+                    _import_batch(db, batch_key, batch, imported, touched)
+                batch_key, batch = key, []
+            batch.append(record)
         
-        # Import inventory
-        if "inventory" in data:
-            for inv_data in data["inventory"]:
-                existing = db.query(models.MedicationInventory).filter(
-                    models.MedicationInventory.id == inv_data["id"]
-                ).first()
-                if not existing:
-                    db_inv = models.MedicationInventory(
-                        id=inv_data["id"],
-                        medication_id=inv_data["medication_id"],
-                        quantity=inv_data["quantity"],
-                        unit=inv_data["unit"],
-                        low_stock_threshold=inv_data.get("low_stock_threshold")
-                    )
-                    db.add(db_inv)
-                    imported["inventory"] += 1
+        if batch:
+            _import_batch(db, batch_key, batch, imported, touched)
         
+        rollups.rebuild(db, touched)
         db.commit()
         
         return {
@@ -298,4 +696,3 @@ def import_json(file: UploadFile = File(...), db: Session = Depends(get_db)):
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
-
@@ -1,20 +1,103 @@
 """Family member management endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 from typing import List
-from .. import models, schemas
+from datetime import datetime, timedelta, timezone
+from .. import cache, models, schemas
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
+from .assignments import frequency_settings, utc_datetime
 
 router = APIRouter(prefix="/api/family-members", tags=["family-members"])
 
 
 @router.get("", response_model=List[schemas.FamilyMember])
+@query_budget(2)
 def get_family_members(db: Session = Depends(get_db)):
     """Get all family members."""
-    return db.query(models.FamilyMember).filter(models.FamilyMember.active == True).all()
+    def load():
+        rows = db.query(models.FamilyMember).filter(models.FamilyMember.active == True).all()
+        return [schemas.FamilyMember.model_validate(row) for row in rows]
+
+    # Cached as response schemas until another write to the reference tables
+    return cache.reference_data.get(db, "family_members", load)
+
+
+@router.get("/overview", response_model=List[schemas.FamilyMemberOverview])
+@query_budget(1)
+def get_family_members_overview(db: Session = Depends(get_db)):
+    """Assignment counts, last dose, next due time and overdue count per family member.
+    
+    Read in a single query: every member's assignments with their frequency
+    settings and last dose. Due times are then computed from the frequency
+    each assignment is given at, exactly as for its status.
+    """
+    assignment = models.MedicationAssignment
+    medication = models.Medication
+    administration = models.Administration
+    
+    # Correlated per assignment, so SQLite reads each maximum with one index seek
+    last_dose = db.query(func.max(administration.administered_at)).filter(
+        administration.medication_assignment_id == assignment.id
+    ).correlate(assignment).scalar_subquery()
+    
+    rows = db.query(
+        models.FamilyMember.id,
+        models.FamilyMember.name,
+        assignment.id.label("assignment_id"),
+        assignment.active,
+        assignment.frequency_hours,
+        assignment.frequency_min_hours,
+        assignment.frequency_max_hours,
+        medication.default_frequency_hours,
+        medication.default_frequency_min_hours,
+        medication.default_frequency_max_hours,
+        last_dose.label("last_dose")
+    ).outerjoin(assignment, assignment.family_member_id == models.FamilyMember.id).outerjoin(
+        medication, medication.id == assignment.medication_id
+    ).filter(
+        models.FamilyMember.active == True
+    ).order_by(models.FamilyMember.id).all()
+    
+    now = datetime.now(timezone.utc)
+    overview = {}
+    for row in rows:
+        member = overview.get(row.id)
+        if member is None:
+            member = overview[row.id] = schemas.FamilyMemberOverview(
+                id=row.id, name=row.name, active_assignments=0, inactive_assignments=0, overdue_count=0
+            )
+        if row.assignment_id is None:
+            continue
+        if not row.active:
+            member.inactive_assignments += 1
+        else:
+            member.active_assignments += 1
+        if row.last_dose is None:
+            continue
+        last_time = utc_datetime(row.last_dose)
+        if member.last_administration is None or last_time > member.last_administration:
+            member.last_administration = last_time
+        if not row.active:
+            continue
+        
+        _, frequency_hours, min_hours, max_hours = frequency_settings(row, row)
+        due_hours = min_hours if frequency_hours is None else frequency_hours
+        latest_hours = max_hours if frequency_hours is None else frequency_hours
+        if due_hours is not None:
+            next_due = last_time + timedelta(hours=due_hours)
+            if member.next_due is None or next_due < member.next_due:
+                member.next_due = next_due
+        if latest_hours is not None and now >= last_time + timedelta(hours=latest_hours):
+            member.overdue_count += 1
+    
+    return list(overview.values())
 
 
 @router.post("", response_model=schemas.FamilyMember, status_code=201)
+@idempotent
 def create_family_member(member: schemas.FamilyMemberCreate, db: Session = Depends(get_db)):
     """Create a new family member."""
     db_member = models.FamilyMember(**member.model_dump())
@@ -25,6 +108,7 @@ def create_family_member(member: schemas.FamilyMemberCreate, db: Session = Depen
 
 
 @router.put("/{member_id}", response_model=schemas.FamilyMember)
+@query_budget(3)
 def update_family_member(member_id: int, member: schemas.FamilyMemberUpdate, db: Session = Depends(get_db)):
     """Update a family member."""
     db_member = db.query(models.FamilyMember).filter(models.FamilyMember.id == member_id).first()
@@ -41,6 +125,7 @@ def update_family_member(member_id: int, member: schemas.FamilyMemberUpdate, db:
 
 
 @router.get("/{member_id}/can-delete")
+@query_budget(2)
 def can_delete_family_member(member_id: int, db: Session = Depends(get_db)):
     """Check if a family member can be deleted (no active assignments)."""
     db_member = db.query(models.FamilyMember).filter(models.FamilyMember.id == member_id).first()
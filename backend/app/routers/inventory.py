@@ -1,33 +1,48 @@
 """Medication inventory management endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from .. import models, schemas, inventory_ledger
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
 
 router = APIRouter(prefix="/api/inventory", tags=["inventory"])
 
 
 @router.get("", response_model=List[schemas.MedicationInventory])
+@query_budget(1)
 def get_inventory(db: Session = Depends(get_db)):
     """Get all medication inventory records."""
-    return db.query(models.MedicationInventory).all()
+    return db.query(models.MedicationInventory).options(
+        joinedload(models.MedicationInventory.medication)
+    ).all()
 
 
 @router.get("/low-stock", response_model=List[schemas.MedicationInventory])
-def get_low_stock(db: Session = Depends(get_db)):
-    """Get medications with low stock."""
-    inventory_items = db.query(models.MedicationInventory).all()
-    low_stock = []
-    
-    for item in inventory_items:
-        if item.low_stock_threshold and item.quantity <= item.low_stock_threshold:
-            low_stock.append(item)
-    
-    return low_stock
+@query_budget(1)
+def get_low_stock(forecast_days: Optional[float] = None, db: Session = Depends(get_db)):
+    """Get medications at or below their threshold or projected to run out soon."""
+    return db.query(models.MedicationInventory).options(
+        joinedload(models.MedicationInventory.medication)
+    ).filter(
+        inventory_ledger.low_stock_condition(forecast_days)
+    ).all()
+
+
+@router.get("/forecast", response_model=List[schemas.InventoryForecast])
+@query_budget(1)
+def get_inventory_forecast(forecast_days: Optional[float] = None, db: Session = Depends(get_db)):
+    """Get consumption rates and projected run-out dates for all inventory."""
+    items = db.query(models.MedicationInventory).order_by(
+        models.MedicationInventory.projected_run_out_at.is_(None),
+        models.MedicationInventory.projected_run_out_at
+    ).all()
+    return [inventory_ledger.forecast(item, forecast_days) for item in items]
 
 
 @router.post("", response_model=schemas.MedicationInventory, status_code=201)
+@idempotent
 def create_inventory(inventory: schemas.MedicationInventoryCreate, db: Session = Depends(get_db)):
     """Create or update inventory for a medication."""
     # Check if inventory already exists
@@ -36,10 +51,13 @@ def create_inventory(inventory: schemas.MedicationInventoryCreate, db: Session =
     ).first()
     
     if existing:
-        # Update existing
+        # Update existing; the quantity goes through the ledger
         update_data = inventory.model_dump(exclude_unset=True)
+        quantity = update_data.pop('quantity', None)
         for field, value in update_data.items():
             setattr(existing, field, value)
+        if quantity is not None:
+            inventory_ledger.set_quantity(db, existing.medication_id, quantity)
         db.commit()
         db.refresh(existing)
         return existing
@@ -53,15 +71,19 @@ def create_inventory(inventory: schemas.MedicationInventoryCreate, db: Session =
     
     db_inventory = models.MedicationInventory(**inventory.model_dump())
     db.add(db_inventory)
+    inventory_ledger.start_ledger(db, db_inventory.medication_id, db_inventory.quantity)
     db.commit()
     db.refresh(db_inventory)
     return db_inventory
 
 
 @router.get("/{inventory_id}", response_model=schemas.MedicationInventory)
+@query_budget(1)
 def get_inventory_item(inventory_id: int, db: Session = Depends(get_db)):
     """Get a specific inventory record."""
-    db_inventory = db.query(models.MedicationInventory).filter(
+    db_inventory = db.query(models.MedicationInventory).options(
+        joinedload(models.MedicationInventory.medication)
+    ).filter(
         models.MedicationInventory.id == inventory_id
     ).first()
     if not db_inventory:
@@ -83,14 +105,66 @@ def update_inventory(
         raise HTTPException(status_code=404, detail="Inventory record not found")
     
     update_data = inventory.model_dump(exclude_unset=True)
+    # The quantity goes through the ledger rather than a read-modify-write
+    quantity = update_data.pop('quantity', None)
     for field, value in update_data.items():
         setattr(db_inventory, field, value)
+    if quantity is not None:
+        inventory_ledger.set_quantity(db, db_inventory.medication_id, quantity)
     
     db.commit()
     db.refresh(db_inventory)
     return db_inventory
 
 
+@router.post("/{inventory_id}/adjustments", response_model=schemas.MedicationInventory)
+@query_budget(6)
+@idempotent
+def adjust_inventory(
+    inventory_id: int,
+    adjustment: schemas.InventoryAdjustment,
+    db: Session = Depends(get_db)
+):
+    """Atomically add to (restock) or subtract from an inventory quantity."""
+    db_inventory = db.query(models.MedicationInventory).filter(
+        models.MedicationInventory.id == inventory_id
+    ).first()
+    if not db_inventory:
+        raise HTTPException(status_code=404, detail="Inventory record not found")
+    
+    inventory_ledger.apply_change(db, db_inventory.medication_id, adjustment.quantity_change, "adjustment")
+    db.commit()
+    db.refresh(db_inventory)
+    return db_inventory
+
+
+@router.get("/{inventory_id}/ledger", response_model=List[schemas.InventoryTransaction])
+@query_budget(2)
+def get_inventory_ledger(inventory_id: int, limit: int = 100, db: Session = Depends(get_db)):
+    """Get the most recent ledger entries for an inventory record."""
+    db_inventory = db.query(models.MedicationInventory).filter(
+        models.MedicationInventory.id == inventory_id
+    ).first()
+    if not db_inventory:
+        raise HTTPException(status_code=404, detail="Inventory record not found")
+    
+    return db.query(models.InventoryTransaction).filter(
+        models.InventoryTransaction.medication_id == db_inventory.medication_id
+    ).order_by(models.InventoryTransaction.id.desc()).limit(limit).all()
+
+
+@router.get("/{inventory_id}/ledger/balance", response_model=schemas.InventoryLedgerBalance)
+def get_inventory_ledger_balance(inventory_id: int, db: Session = Depends(get_db)):
+    """Reconcile an inventory quantity against its ledger since the last snapshot."""
+    db_inventory = db.query(models.MedicationInventory).filter(
+        models.MedicationInventory.id == inventory_id
+    ).first()
+    if not db_inventory:
+        raise HTTPException(status_code=404, detail="Inventory record not found")
+    
+    return inventory_ledger.ledger_balance(db, db_inventory.medication_id)
+
+
 @router.delete("/{inventory_id}", status_code=204)
 def delete_inventory(inventory_id: int, db: Session = Depends(get_db)):
     """Delete an inventory record."""
@@ -101,6 +175,8 @@ def delete_inventory(inventory_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Inventory record not found")
     
     db.delete(db_inventory)
+    # Record a tombstone so incremental exports can propagate the delete
+    db.add(models.DeletedRecord(table_name="inventory", record_id=inventory_id))
     db.commit()
     return None
 
@@ -2,19 +2,27 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from typing import List
-from .. import models, schemas
+from .. import cache, models, schemas
 from ..database import get_db
+from ..idempotency import idempotent
+from ..query_inspection import query_budget
 
 router = APIRouter(prefix="/api/medications", tags=["medications"])
 
 
 @router.get("", response_model=List[schemas.Medication])
+@query_budget(2)
 def get_medications(db: Session = Depends(get_db)):
     """Get all medications."""
-    return db.query(models.Medication).all()
+    def load():
+        return [schemas.Medication.model_validate(row) for row in db.query(models.Medication).all()]
+
+    # Cached as response schemas until another write to the reference tables
+    return cache.reference_data.get(db, "medications", load)
 
 
 @router.post("", response_model=schemas.Medication, status_code=201)
+@idempotent
 def create_medication(medication: schemas.MedicationCreate, db: Session = Depends(get_db)):
     """Create a new medication."""
     try:
@@ -32,6 +40,7 @@ def create_medication(medication: schemas.MedicationCreate, db: Session = Depend
 
 
 @router.get("/{medication_id}", response_model=schemas.Medication)
+@query_budget(1)
 def get_medication(medication_id: int, db: Session = Depends(get_db)):
     """Get a specific medication."""
     db_medication = db.query(models.Medication).filter(models.Medication.id == medication_id).first()
@@ -41,6 +50,7 @@ def get_medication(medication_id: int, db: Session = Depends(get_db)):
 
 
 @router.put("/{medication_id}", response_model=schemas.Medication)
+@query_budget(3)
 def update_medication(medication_id: int, medication: schemas.MedicationUpdate, db: Session = Depends(get_db)):
     """Update a medication."""
     db_medication = db.query(models.Medication).filter(models.Medication.id == medication_id).first()
@@ -78,6 +88,7 @@ def update_medication(medication_id: int, medication: schemas.MedicationUpdate,
 
 
 @router.get("/{medication_id}/can-delete")
+@query_budget(3)
 def can_delete_medication(medication_id: int, db: Session = Depends(get_db)):
     """Check if a medication can be deleted (no assignments or inventory records)."""
     db_medication = db.query(models.Medication).filter(models.Medication.id == medication_id).first()
@@ -170,6 +181,8 @@ def delete_medication(medication_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=error_details)
     
     db.delete(db_medication)
+    # Record a tombstone so incremental exports can propagate the delete
+    db.add(models.DeletedRecord(table_name="medications", record_id=medication_id))
     db.commit()
     return None
 
@@ -0,0 +1,85 @@
+"""Dose reports read from the daily administration rollups."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime, timedelta, timezone
+from .. import models, schemas, rollups
+from ..database import get_db
+from ..query_inspection import query_budget
+
+router = APIRouter(prefix="/api/reports", tags=["reports"])
+
+# Days covered when a report is requested without a start date
+DEFAULT_REPORT_DAYS = 30
+
+
+def _date_range(start: Optional[date], end: Optional[date]):
+    """Requested days, ending today (in the rollup time zone) by default."""
+    end = end or rollups.day_of(datetime.now(timezone.utc))
+    start = start or end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+@router.get("/daily", response_model=List[schemas.DailyDoseReport])
+@query_budget(1)
+def get_daily_doses(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    family_member_id: Optional[int] = None,
+    medication_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Doses per day and family member, optionally for one member or medication."""
+    start, end = _date_range(start, end)
+    rollup = models.AdministrationDailyRollup
+    assignment = models.MedicationAssignment
+    query = db.query(
+        rollup.day,
+        assignment.family_member_id,
+        models.FamilyMember.name.label("family_member_name"),
+        func.sum(rollup.administration_count).label("doses"),
+        func.min(rollup.first_administered_at).label("first_administered_at"),
+        func.max(rollup.last_administered_at).label("last_administered_at")
+    ).join(assignment, assignment.id == rollup.medication_assignment_id).join(
+        models.FamilyMember, models.FamilyMember.id == assignment.family_member_id
+    ).filter(rollup.day >= start, rollup.day <= end)
+    if family_member_id is not None:
+        query = query.filter(assignment.family_member_id == family_member_id)
+    if medication_id is not None:
+        query = query.filter(assignment.medication_id == medication_id)
+    rows = query.group_by(rollup.day, assignment.family_member_id).order_by(
+        rollup.day, assignment.family_member_id
+    ).all()
+    return [schemas.DailyDoseReport(**row._mapping) for row in rows]
+
+
+@router.get("/caregivers", response_model=List[schemas.CaregiverDoseReport])
+@query_budget(1)
+def get_caregiver_doses(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    family_member_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Doses each caregiver logged, and on how many days, optionally for one family member."""
+    start, end = _date_range(start, end)
+    rollup = models.AdministrationDailyRollup
+    query = db.query(
+        rollup.caregiver_id,
+        models.Caregiver.name.label("caregiver_name"),
+        func.sum(rollup.administration_count).label("doses"),
+        func.count(func.distinct(rollup.day)).label("days"),
+        func.min(rollup.first_administered_at).label("first_administered_at"),
+        func.max(rollup.last_administered_at).label("last_administered_at")
+    ).outerjoin(models.Caregiver, models.Caregiver.id == rollup.caregiver_id).filter(
+        rollup.day >= start, rollup.day <= end
+    )
+    if family_member_id is not None:
+        query = query.join(
+            models.MedicationAssignment, models.MedicationAssignment.id == rollup.medication_assignment_id
+        ).filter(models.MedicationAssignment.family_member_id == family_member_id)
+    rows = query.group_by(rollup.caregiver_id).order_by(func.sum(rollup.administration_count).desc()).all()
+    return [schemas.CaregiverDoseReport(**row._mapping) for row in rows]
@@ -1,8 +1,11 @@
 """Pydantic schemas for request/response validation."""
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Any, Optional, List
 from pydantic import BaseModel, field_validator, model_validator
 
+# Most items accepted by one batch or bulk request
+MAX_BATCH_SIZE = 100
+
 
 # Family Member Schemas
 class FamilyMemberBase(BaseModel):
@@ -27,6 +30,19 @@ class FamilyMember(FamilyMemberBase):
         from_attributes = True
 
 
+class FamilyMemberOverview(BaseModel):
+    """Medication summary of a family member."""
+    id: int
+    name: str
+    active_assignments: int
+    inactive_assignments: int
+    last_administration: Optional[datetime] = None
+    # Earliest next dose among active assignments that have been dosed
+    next_due: Optional[datetime] = None
+    # Active assignments past their latest dose time (the range maximum, or the fixed interval)
+    overdue_count: int
+
+
 # Caregiver Schemas
 class CaregiverBase(BaseModel):
     name: str
@@ -166,17 +182,71 @@ class MedicationAssignment(MedicationAssignmentBase):
         from_attributes = True
 
 
-class AssignmentAuditLog(BaseModel):
-    """Audit log entry for assignment changes."""
+class MedicationAssignmentBulkItem(MedicationAssignmentUpdate):
     id: int
-    assignment_id: int
+
+
+class MedicationAssignmentBulkUpdate(BaseModel):
+    updates: List[MedicationAssignmentBulkItem]
+    # All-or-nothing by default; with atomic false the valid updates are saved anyway
+    atomic: bool = True
+
+    @field_validator('updates')
+    @classmethod
+    def validate_updates(cls, v):
+        if not 0 < len(v) <= MAX_BATCH_SIZE:
+            raise ValueError(f'A bulk update must have 1 to {MAX_BATCH_SIZE} items')
+        if len({item.id for item in v}) != len(v):
+            raise ValueError('Each assignment can only be updated once per request')
+        return v
+
+
+class MedicationAssignmentBulkItemResult(BaseModel):
+    index: int
+    id: int
+    status_code: int
+    assignment: Optional[MedicationAssignment] = None
+    error: Optional[str] = None
+
+
+class MedicationAssignmentBulkResult(BaseModel):
+    updated: int
+    failed: int
+    results: List[MedicationAssignmentBulkItemResult]
+
+
+class AssignmentFieldChange(BaseModel):
+    """Change of one field in an assignment revision."""
     field_name: str
-    old_value: Optional[str] = None
-    new_value: Optional[str] = None
+    old_value: Optional[Any] = None
+    new_value: Optional[Any] = None
+
+
+class AssignmentRevision(BaseModel):
+    """One update of an assignment, with all fields it changed."""
+    id: int
+    assignment_id: int
+    changes: List[AssignmentFieldChange]
     changed_at: datetime
 
-    class Config:
-        from_attributes = True
+
+class AssignmentAsOf(BaseModel):
+    """State of an assignment rebuilt as of a point in time."""
+    id: int
+    as_of: datetime
+    revision_id: int
+    revision_changed_at: datetime
+    replayed_diffs: int
+    family_member_id: int
+    medication_id: int
+    current_dose: Optional[str] = None
+    frequency_hours: Optional[float] = None
+    frequency_min_hours: Optional[float] = None
+    frequency_max_hours: Optional[float] = None
+    active: Optional[bool] = None
+    schedule_type: Optional[str] = None
+    schedule_time: Optional[str] = None
+    schedule_days: Optional[str] = None
 
 
 class AssignmentStatus(BaseModel):
@@ -225,6 +295,32 @@ class Administration(AdministrationBase):
         from_attributes = True
 
 
+class AdministrationBatchCreate(BaseModel):
+    administrations: List[AdministrationCreate]
+    # All-or-nothing by default; with atomic false the valid items are recorded anyway
+    atomic: bool = True
+
+    @field_validator('administrations')
+    @classmethod
+    def validate_size(cls, v):
+        if not 0 < len(v) <= MAX_BATCH_SIZE:
+            raise ValueError(f'A batch must have 1 to {MAX_BATCH_SIZE} administrations')
+        return v
+
+
+class AdministrationBatchItem(BaseModel):
+    index: int
+    status_code: int
+    administration: Optional[Administration] = None
+    error: Optional[str] = None
+
+
+class AdministrationBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[AdministrationBatchItem]
+
+
 # Inventory Schemas
 class MedicationInventoryBase(BaseModel):
     medication_id: int
@@ -251,3 +347,75 @@ class MedicationInventory(MedicationInventoryBase):
     class Config:
         from_attributes = True
 
+
+
+class InventoryAdjustment(BaseModel):
+    """Relative change to an inventory quantity (positive to restock)."""
+    quantity_change: float
+
+
+class InventoryTransaction(BaseModel):
+    id: int
+    medication_id: int
+    administration_id: Optional[int] = None
+    kind: str
+    quantity_change: float
+    balance: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class InventoryLedgerBalance(BaseModel):
+    """Stored quantity reconciled against the ledger since the last snapshot."""
+    medication_id: int
+    quantity: float
+    ledger_balance: float
+    snapshot_id: Optional[int] = None
+    entries_since_snapshot: int
+    consistent: bool
+
+
+class InventoryForecast(BaseModel):
+    """Projected consumption of a medication's stock."""
+    inventory_id: int
+    medication_id: int
+    quantity: float
+    unit: str
+    low_stock_threshold: Optional[float] = None
+    consumption_per_day: float
+    days_remaining: Optional[float] = None
+    projected_run_out_at: Optional[datetime] = None
+    low_stock: bool
+
+
+class AuditEvent(BaseModel):
+    """Recorded change to a row of an audited table."""
+    id: int
+    table_name: str
+    record_id: int
+    action: str
+    changes: dict
+    occurred_at: datetime
+
+
+# Report Schemas
+class DailyDoseReport(BaseModel):
+    """Doses given to a family member on one day, read from the daily rollups."""
+    day: date
+    family_member_id: int
+    family_member_name: str
+    doses: int
+    first_administered_at: datetime
+    last_administered_at: datetime
+
+
+class CaregiverDoseReport(BaseModel):
+    """Doses a caregiver logged in a date range; no caregiver when none was recorded."""
+    caregiver_id: Optional[int] = None
+    caregiver_name: Optional[str] = None
+    doses: int
+    days: int
+    first_administered_at: datetime
+    last_administered_at: datetime
@@ -0,0 +1,174 @@
+"""Slow-query log with query plans.
+
+Engine hooks time every SQL statement. Statements taking at least
+``SLOW_QUERY_THRESHOLD_MS`` are recorded with their SQL text, the shape of
+their bound parameters (types only, never values, since rows hold health
+data), their duration and the route of the request that ran them. Entries
+are kept in a ring buffer of ``SLOW_QUERY_LOG_SIZE`` entries, so the log
+can't grow without limit.
+
+The first time a statement shape (the SQL text with ``IN`` lists collapsed)
+is slow, its ``EXPLAIN QUERY PLAN`` is captured on the same connection;
+later slow runs of that shape only update its counters.
+"""
+import collections
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from .database import engine
+from .metrics import BACKGROUND_ROUTE, current_stats
+from .query_inspection import statement_shape
+
+# Set to "false" to turn the slow-query log off
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "true").lower() in ("1", "true", "yes")
+# Statements taking at least this long are logged
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+# Slow statements kept in memory, oldest dropped first
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+# Statements SQLite can explain; others (PRAGMA, BEGIN, ...) are logged without a plan
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def parameter_shape(parameters, executemany=False):
+    """Types of bound parameters, e.g. ``["int", "str"]``; values are left out."""
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else []}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements and the plans of their shapes."""
+
+    def __init__(self, capacity=SLOW_QUERY_LOG_SIZE, threshold_ms=SLOW_QUERY_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self.entries = collections.deque(maxlen=capacity)
+        self.shapes = {}
+        self.recorded = 0
+        self.lock = threading.Lock()
+
+    def is_new_shape(self, shape_id):
+        with self.lock:
+            return shape_id not in self.shapes
+
+    def record(self, shape_id, shape, statement, parameters, duration_ms, route, plan=None):
+        entry = {
+            "occurred_at": datetime.now(timezone.utc).isoformat(),
+            "shape_id": shape_id,
+            "statement": statement,
+            "parameters": parameters,
+            "duration_ms": round(duration_ms, 3),
+            "route": route,
+        }
+        with self.lock:
+            summary = self.shapes.get(shape_id)
+            if summary is None:
+                summary = self.shapes[shape_id] = {
+                    "shape_id": shape_id,
+                    "statement": shape,
+                    "plan": plan,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": [],
+                }
+            summary["count"] += 1
+            summary["total_ms"] = round(summary["total_ms"] + duration_ms, 3)
+            summary["max_ms"] = max(summary["max_ms"], entry["duration_ms"])
+            if route not in summary["routes"]:
+                summary["routes"].append(route)
+            self.entries.append(entry)
+            self.recorded += 1
+
+    def snapshot(self, limit=None):
+        """Entries newest first, with the shapes they reference."""
+        with self.lock:
+            entries = list(reversed(self.entries))[:limit]
+            shape_ids = {entry["shape_id"] for entry in entries}
+            return {
+                "threshold_ms": self.threshold_ms,
+                "capacity": self.entries.maxlen,
+                "recorded": self.recorded,
+                "entries": entries,
+                "shapes": [dict(s) for s in self.shapes.values() if s["shape_id"] in shape_ids],
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.shapes.clear()
+            self.recorded = 0
+
+
+_log = SlowQueryLog()
+
+
+def get_log():
+    return _log
+
+
+def _explain(dbapi_connection, statement, parameters, executemany):
+    """``EXPLAIN QUERY PLAN`` rows of a statement, or None if it can't be explained."""
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = next(iter(parameters or ()), ())
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        return [
+            {"id": row[0], "parent": row[1], "detail": row[3]}
+            for row in cursor.fetchall()
+        ]
+    except Exception as e:
+        return [{"id": 0, "parent": 0, "detail": f"plan unavailable: {e}"}]
+    finally:
+        cursor.close()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if SLOW_QUERY_LOG:
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("slow_query_started")
+    if not started:
+        return
+    duration_ms = (time.perf_counter() - started.pop()) * 1000
+    if duration_ms < _log.threshold_ms:
+        return
+
+    shape = statement_shape(statement)
+    shape_id = hashlib.sha1(shape.encode()).hexdigest()[:12]
+    # Explain each shape once; its plan doesn't depend on the parameter values
+    plan = None
+    if _log.is_new_shape(shape_id):
+        plan = _explain(conn.connection.dbapi_connection, statement, parameters, executemany)
+    stats = current_stats()
+    _log.record(
+        shape_id,
+        shape,
+        statement,
+        parameter_shape(parameters, executemany),
+        duration_ms,
+        stats.route if stats is not None else BACKGROUND_ROUTE,
+        plan
+    )
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("slow_query_started") if context.connection is not None else None
+    if started:
+        started.pop()
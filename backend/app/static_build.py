@@ -0,0 +1,162 @@
+"""Build the frontend for long-lived caching.
+
+Copies the frontend into an output directory, writing every asset a second
+time under a name including a hash of its content (``js/api.js`` as
+``js/api.<hash>.js``), rewrites the ``/static/...`` references in
+``index.html`` to the hashed names, and writes gzip and, when the optional
+``brotli`` package is installed, brotli variants next to each compressible
+file. Since a changed file gets a new name, the server can let browsers
+cache hashed assets indefinitely (see ``static_files.py``). The unhashed
+copies keep pages cached before a deploy working.
+
+The JS modules import each other by relative path, in cycles, so their
+imports can't carry content hashes; ``index.html`` gets an import map that
+redirects each module's plain URL to its hashed file instead.
+
+``manifest.json`` records the hashed name of every asset and the encodings
+written for each file. Run as a module:
+
+    python -m app.static_build <frontend dir> <output dir>
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+URL_PREFIX = "/static/"
+MANIFEST_NAME = "manifest.json"
+INDEX_NAME = "index.html"
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = {".css", ".html", ".js", ".json", ".svg", ".txt"}
+# Smaller files don't gain enough from compression to be worth a variant
+MIN_COMPRESS_SIZE = 512
+
+
+def hashed_name(relative_path, content):
+    """``relative_path`` with a hash of ``content`` inserted before the extension."""
+    root, extension = os.path.splitext(relative_path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+
+def _brotli():
+    """The optional brotli module, or None."""
+    try:
+        import brotli
+    except ImportError:  # Optional: only needed for .br variants
+        return None
+    return brotli
+
+
+def compressed_variants(relative_path, content):
+    """``(encoding, suffix, data)`` for each variant worth serving instead of ``content``."""
+    if os.path.splitext(relative_path)[1] not in COMPRESSIBLE_EXTENSIONS or len(content) < MIN_COMPRESS_SIZE:
+        return []
+    variants = [("gzip", ".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    brotli = _brotli()
+    if brotli is not None:
+        variants.insert(0, ("br", ".br", brotli.compress(content, mode=brotli.MODE_TEXT, quality=11)))
+    return [variant for variant in variants if len(variant[2]) < len(content)]
+
+
+def rewrite_index(html, assets):
+    """Point ``/static/`` references at hashed names and add the modules' import map."""
+    for source, target in sorted(assets.items(), key=lambda item: -len(item[0])):
+        html = re.sub(
+            rf'(["\']){re.escape(URL_PREFIX + source)}(["\'])',
+            lambda match: f"{match.group(1)}{URL_PREFIX}{target}{match.group(2)}",
+            html,
+        )
+
+    imports = {
+        URL_PREFIX + source: URL_PREFIX + target
+        for source, target in sorted(assets.items())
+        if source.endswith(".js")
+    }
+    if imports:
+        # Must precede every module script to apply to them
+        first_module = re.search(r'[ \t]*<script type="module"', html)
+        if first_module is None:
+            raise ValueError(f"{INDEX_NAME} has no module script to put the import map before")
+        indent = re.match(r"[ \t]*", first_module.group(0)).group(0)
+        import_map = json.dumps({"imports": imports}, indent=2).replace("\n", "\n" + indent)
+        html = (
+            f'{html[:first_module.start()]}{indent}<script type="importmap">\n{indent}{import_map}\n'
+            f"{indent}</script>\n{html[first_module.start():]}"
+        )
+    return html
+
+
+def build(source_dir, output_dir):
+    """Build ``source_dir`` into ``output_dir``; returns the manifest."""
+    source_dir = os.path.abspath(source_dir)
+    output_dir = os.path.abspath(output_dir)
+    if output_dir == source_dir:
+        raise ValueError("The output directory must differ from the frontend directory")
+    if not os.path.isfile(os.path.join(source_dir, INDEX_NAME)):
+        raise FileNotFoundError(f"No {INDEX_NAME} in {source_dir}")
+
+    files = {}
+    for directory, subdirectories, names in os.walk(source_dir):
+        subdirectories.sort()
+        for name in sorted(names):
+            relative_path = os.path.relpath(os.path.join(directory, name), source_dir).replace(os.sep, "/")
+            if relative_path != MANIFEST_NAME and not name.startswith("."):
+                with open(os.path.join(directory, name), "rb") as f:
+                    files[relative_path] = f.read()
+
+    assets = {
+        relative_path: hashed_name(relative_path, content)
+        for relative_path, content in files.items()
+        if relative_path != INDEX_NAME
+    }
+    outputs = dict(files)
+    for relative_path, hashed_path in assets.items():
+        outputs[hashed_path] = files[relative_path]
+    with open(os.path.join(source_dir, INDEX_NAME), encoding="utf-8") as f:
+        outputs[INDEX_NAME] = rewrite_index(f.read(), assets).encode("utf-8")
+
+    encodings = {}
+    for relative_path, content in outputs.items():
+        path = os.path.join(output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        variants = compressed_variants(relative_path, content)
+        for _, suffix, data in variants:
+            with open(path + suffix, "wb") as f:
+                f.write(data)
+        if variants:
+            encodings[relative_path] = [encoding for encoding, _, _ in variants]
+
+    manifest = {"assets": assets, "encodings": encodings}
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the frontend with hashed, precompressed assets")
+    parser.add_argument("source", help="Frontend directory containing index.html")
+    parser.add_argument("output", help="Directory to write the built frontend to")
+    parser.add_argument("--clean", action="store_true", help="Empty the output directory first")
+    args = parser.parse_args()
+
+    if args.clean and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    try:
+        manifest = build(args.source, args.output)
+    except (OSError, ValueError) as e:
+        print(f"✗ Build failed: {e}")
+        return 1
+    print(f"✓ Built {len(manifest['assets'])} assets into {args.output} "
+          f"({len(manifest['encodings'])} with precompressed variants"
+          f"{'' if _brotli() else '; install brotli for .br files'})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
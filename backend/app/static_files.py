@@ -0,0 +1,103 @@
+"""Serving the frontend with long-lived caching and precompressed variants.
+
+A frontend built by ``static_build.py`` has a ``manifest.json`` listing
+its content-hashed assets and the compressed variants written for each
+file. Hashed assets never change under the same name, so they are served
+with ``Cache-Control: immutable`` and a year's max-age and repeat page
+loads make no requests for them. ``index.html`` and anything not in the
+manifest are served with ``no-cache``, so browsers revalidate them (a 304
+while unchanged) and pick up a new build straight away.
+
+When the request's ``Accept-Encoding`` allows it, the brotli or gzip
+variant is sent with the matching ``Content-Encoding``. An unbuilt frontend
+(e.g. the source directory mounted during development) is served as is.
+"""
+import json
+import mimetypes
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .static_build import MANIFEST_NAME
+
+# Directory of the frontend, built or not
+STATIC_DIR = os.getenv("STATIC_DIR", "/app/static")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Preferred first
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def accepted_encodings(headers):
+    """Content codings the client accepts, from its Accept-Encoding header."""
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        coding, _, parameters = part.strip().partition(";")
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"assets": {}, "encodings": {}}
+
+
+class FrontendFiles(StaticFiles):
+    """StaticFiles serving a built frontend's hashed assets and compressed variants."""
+
+    def __init__(self, directory):
+        super().__init__(directory=directory, html=False)
+        self.root = os.path.realpath(directory)
+        manifest = load_manifest(directory)
+        self.immutable = set(manifest["assets"].values())
+        self.encodings = manifest["encodings"]
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        relative_path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+        request_headers = Headers(scope=scope)
+        available = self.encodings.get(relative_path, ())
+
+        path, encoding = full_path, None
+        if available:
+            accepted = accepted_encodings(request_headers)
+            encoding = next((e for e in ENCODING_SUFFIXES if e in available and e in accepted), None)
+            if encoding is not None:
+                path = full_path + ENCODING_SUFFIXES[encoding]
+                stat_result = os.stat(path)
+
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            stat_result=stat_result,
+            method=scope["method"],
+            media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+        )
+        if encoding is not None:
+            response.headers["content-encoding"] = encoding
+        if available:
+            response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = IMMUTABLE if relative_path in self.immutable else REVALIDATE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def index_response(self, scope):
+        """The frontend's index.html, or None when there is none."""
+        full_path, stat_result = self.lookup_path("index.html")
+        if stat_result is None:
+            return None
+        return self.file_response(full_path, stat_result, scope)
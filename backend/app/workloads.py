@@ -0,0 +1,171 @@
+"""Workload classes keeping exports and imports from starving dose logging.
+
+Sync endpoints run on Starlette's threadpool. Left there, a few long
+exports or imports would take worker threads and database connections away
+from the quick interactive requests (dose logging, dashboard polls) sharing
+it. Endpoints marked ``@bulk_workload`` run on the bulk executor instead: at
+most ``BULK_CONCURRENCY`` of them run at once, and with them the database
+connections they hold. Up to ``BULK_QUEUE_SIZE`` more wait their turn, and
+beyond that requests are turned away with a 503 and ``Retry-After``. The
+threadpool, sized ``INTERACTIVE_THREADS``, is left to every other request.
+
+Interactive requests still share the CPU (and, within a worker process, the
+GIL) with the running bulk ones, which is why only one runs by default.
+
+The time each request waited for its thread (from arrival, so including
+time spent waiting for a bulk slot) is recorded per class in
+``workload_queue_seconds``. An interactive request's wait is taken when its
+database session is opened, the first thing it runs on the threadpool.
+"""
+import functools
+import os
+import threading
+import time
+
+import anyio.lowlevel
+import anyio.to_thread
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from . import metrics
+
+# Bulk endpoints (exports, imports) running at once
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "1"))
+# Bulk requests waiting for a slot before more are rejected with a 503
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "4"))
+# Threadpool size for every other request
+INTERACTIVE_THREADS = int(os.getenv("INTERACTIVE_THREADS", "40"))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Seconds a rejected client is asked to wait before retrying
+RETRY_AFTER_SECONDS = 5
+
+QUEUE_SECONDS = metrics.registry.register(metrics.Histogram(
+    "workload_queue_seconds", "Time requests waited for a worker thread, by workload class.", ("workload",)))
+ACTIVE = metrics.registry.register(metrics.Gauge(
+    "workload_active", "Requests admitted per workload class, running or queued.", ("workload",)))
+REJECTED = metrics.registry.register(metrics.Counter(
+    "workload_rejected_total", "Requests rejected because their workload class was full.", ("workload",)))
+
+
+def route_workload(scope):
+    """Workload class of the route a request matched."""
+    endpoint = getattr(scope.get("route"), "endpoint", None)
+    return getattr(endpoint, "workload", INTERACTIVE)
+
+
+def thread_started(workload=INTERACTIVE):
+    """Record how long the current request waited for a thread of ``workload``."""
+    stats = metrics.current_stats()
+    if stats is None or stats.queue_recorded or route_workload(stats.scope) != workload:
+        return
+    stats.queue_recorded = True
+    waited = time.perf_counter() - stats.started
+    with metrics.registry.lock:
+        QUEUE_SECONDS.observe((workload,), waited)
+
+
+class WorkloadExecutor:
+    """Runs sync calls on at most ``concurrency`` threads, admitting ``queue_size`` waiting requests."""
+
+    def __init__(self, name, concurrency, queue_size):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.admitted = 0
+        self._lock = threading.Lock()
+        # One limiter per event loop, as anyio does for its default limiter
+        self._limiter = anyio.lowlevel.RunVar(f"{name}_limiter")
+
+    def limiter(self):
+        try:
+            return self._limiter.get()
+        except LookupError:
+            limiter = anyio.CapacityLimiter(self.concurrency)
+            self._limiter.set(limiter)
+            return limiter
+
+    def admit(self):
+        """Take a slot for a request, or raise a 503 when running and queued slots are full."""
+        with self._lock:
+            full = self.admitted >= self.concurrency + self.queue_size
+            if not full:
+                self.admitted += 1
+        with metrics.registry.lock:
+            if full:
+                REJECTED.inc((self.name,))
+            else:
+                ACTIVE.inc((self.name,), 1)
+        if full:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many exports and imports are running; try again shortly",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+
+    def release(self):
+        with self._lock:
+            self.admitted -= 1
+        with metrics.registry.lock:
+            ACTIVE.inc((self.name,), -1)
+
+    async def run(self, func, *args):
+        def call():
+            thread_started(self.name)
+            return func(*args)
+        return await anyio.to_thread.run_sync(call, limiter=self.limiter())
+
+    async def iterate(self, iterator):
+        """Produce each item of a sync iterator on the executor's threads."""
+        done = object()
+        while True:
+            item = await self.run(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+
+bulk = WorkloadExecutor(BULK, BULK_CONCURRENCY, BULK_QUEUE_SIZE)
+
+
+def bulk_stream(iterator):
+    """Body of a bulk endpoint's StreamingResponse, produced on the bulk executor."""
+    return bulk.iterate(iter(iterator))
+
+
+async def _releasing(body_iterator, executor):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        executor.release()
+
+
+def bulk_workload(endpoint):
+    """Run a sync endpoint on the bulk executor.
+
+    The request holds its slot until its response is produced; a streamed
+    response holds it until the stream ends.
+    """
+    @functools.wraps(endpoint)
+    async def run(*args, **kwargs):
+        bulk.admit()
+        try:
+            response = await bulk.run(functools.partial(endpoint, *args, **kwargs))
+        except BaseException:
+            bulk.release()
+            raise
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = _releasing(response.body_iterator, bulk)
+        else:
+            bulk.release()
+        return response
+
+    run.workload = BULK
+    return run
+
+
+def configure_threadpool():
+    """Size the threadpool left to interactive requests; call from the event loop."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = INTERACTIVE_THREADS
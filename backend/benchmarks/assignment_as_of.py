@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Benchmark point-in-time reconstruction of an assignment with a long edit history.
+
+Builds an assignment with many revisions in a scratch database, then times
+GET /api/assignments/{id}/as-of at random points in its history and a full
+replay of every diff from creation for comparison.
+
+Usage (from the backend directory):
+    python benchmarks/assignment_as_of.py [--revisions 20000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+WORK_DIR = tempfile.mkdtemp(prefix="as-of-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+# The history is built directly through the session in long transactions
+os.environ["AUDIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app import assignment_history, models  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+
+
+def build_history(assignment_id, revisions):
+    """Append revisions with timestamps one minute apart, as edits through the API would."""
+    db = SessionLocal()
+    try:
+        assignment = db.get(models.MedicationAssignment, assignment_id)
+        started = datetime.now(timezone.utc) - timedelta(minutes=revisions + 1)
+        db.query(models.AssignmentRevision).update({"changed_at": started})
+        for i in range(revisions):
+            changes = assignment_history.apply_update(assignment, {"current_dose": f"{i}mL"})
+            revision = assignment_history.record_update(db, assignment, changes)
+            revision.changed_at = started + timedelta(minutes=i + 1)
+            if i % 1000 == 999:
+                db.commit()
+        db.commit()
+        return started
+    finally:
+        db.close()
+
+
+def full_replay(assignment_id, ts):
+    """Rebuild the state by replaying every diff since creation."""
+    db = SessionLocal()
+    try:
+        revision = models.AssignmentRevision
+        rows = db.query(revision.changes, revision.snapshot).filter(
+            revision.assignment_id == assignment_id,
+            revision.changed_at <= ts.replace(tzinfo=None)
+        ).order_by(revision.id).all()
+        state = json.loads(rows[0].snapshot)
+        for row in rows[1:]:
+            for field, (_, new_value) in json.loads(row.changes).items():
+                state[field] = new_value
+        return state
+    finally:
+        db.close()
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--revisions", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        member = client.post("/api/family-members", json={"name": "Benchmark"}).json()
+        medication = client.post("/api/medications", json={
+            "name": "Benchmarkol", "default_dose": "5mL", "default_frequency_hours": 4
+        }).json()
+        assignment = client.post("/api/assignments", json={
+            "family_member_id": member["id"], "medication_id": medication["id"]
+        }).json()
+        started = build_history(assignment["id"], args.revisions)
+
+        rng = random.Random(42)
+        points = [started + timedelta(minutes=rng.randint(1, args.revisions)) for _ in range(args.queries)]
+
+        as_of, replay = [], []
+        for ts in points:
+            begin = time.perf_counter()
+            response = client.get(f"/api/assignments/{assignment['id']}/as-of", params={"ts": ts.isoformat()})
+            as_of.append((time.perf_counter() - begin) * 1000)
+            assert response.status_code == 200, response.text
+
+            begin = time.perf_counter()
+            state = full_replay(assignment["id"], ts)
+            replay.append((time.perf_counter() - begin) * 1000)
+            assert state["current_dose"] == response.json()["current_dose"], (state, response.json())
+
+        print(f"{args.revisions} revisions, snapshot every {assignment_history.ASSIGNMENT_SNAPSHOT_INTERVAL}")
+        print(f"{'':14}{'p50 ms':>10}{'p95 ms':>10}")
+        for label, latencies in (("as-of", as_of), ("full replay", replay)):
+            p50, p95 = percentiles(latencies)
+            print(f"{label:14}{p50:>10.2f}{p95:>10.2f}")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark write latency with the audit log disabled, asynchronous and inline.
+
+Runs a mix of mutating requests (log a dose, edit an assignment, rename a
+family member, delete a dose) against a scratch database three times: with
+auditing off, with events flushed by the background writer, and with each
+request waiting for its events to be written, which approximates writing
+audit rows inline in the request.
+
+Usage (from the backend directory):
+    python benchmarks/audit_overhead.py [--rounds 200]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="audit-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app import audit  # noqa: E402
+
+
+def run_writes(client, member_id, assignment_id, rounds, wait_for_audit=False):
+    """Return per-request latencies in milliseconds."""
+    pipeline = audit.get_pipeline()
+    latencies = []
+
+    def timed(method, url, **kwargs):
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        if wait_for_audit:
+            pipeline.flush()
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code < 300, response.text
+        return response
+
+    for i in range(rounds):
+        dose = timed("POST", "/api/administrations", json={
+            "medication_assignment_id": assignment_id, "dose_given": "5mL"
+        }).json()
+        timed("PUT", f"/api/assignments/{assignment_id}", json={"current_dose": f"{i % 5 + 1}mL"})
+        timed("PUT", f"/api/family-members/{member_id}", json={"name": f"Benchmark {i}"})
+        timed("DELETE", f"/api/administrations/{dose['id']}")
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[int(len(ordered) * 0.95) - 1],
+        "mean": statistics.fmean(ordered)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200,
+                        help="Rounds of the four-request write mix per mode")
+    args = parser.parse_args()
+
+    try:
+        with TestClient(app) as client:
+            member = client.post("/api/family-members", json={"name": "Benchmark"}).json()
+            medication = client.post("/api/medications", json={
+                "name": "Benchmarkol", "default_dose": "5mL", "default_frequency_hours": 4
+            }).json()
+            assignment = client.post("/api/assignments", json={
+                "family_member_id": member["id"], "medication_id": medication["id"]
+            }).json()
+
+            # Warm up connections and caches
+            run_writes(client, member["id"], assignment["id"], 10)
+
+            results = {}
+            audit.AUDIT_ENABLED = False
+            results["disabled"] = summarize(run_writes(client, member["id"], assignment["id"], args.rounds))
+            audit.AUDIT_ENABLED = True
+            results["async"] = summarize(run_writes(client, member["id"], assignment["id"], args.rounds))
+            results["inline"] = summarize(
+                run_writes(client, member["id"], assignment["id"], args.rounds, wait_for_audit=True)
+            )
+
+        print(f"{'':10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for label, result in results.items():
+            print(f"{label:10}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['mean']:>10.2f}")
+        print(f"\nasync p95 overhead: {results['async']['p95'] - results['disabled']['p95']:.2f} ms")
+        print(f"inline p95 overhead: {results['inline']['p95'] - results['disabled']['p95']:.2f} ms")
+        print(f"pipeline: {audit.get_pipeline().stats}")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Check that incremental change exports never miss a committed change.
+
+Syncs a scratch database through GET /api/export/changes the way a client
+does, passing each response's next_token to the following call, while a
+write transaction stays open across a sync and commits only after it, well
+past any clock skew a timestamp watermark would allow for. Also checks
+updates, tombstones and that a sync without changes is empty.
+
+Fails (exit code 1) when a sync misses a change or a token is rejected.
+
+Usage (from the backend directory, e.g. in CI):
+    python benchmarks/change_export.py [--hold-seconds 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="change-export-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app import models  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+
+
+class Sync:
+    """An incremental sync client keeping the last token."""
+
+    def __init__(self, client):
+        self.client = client
+        self.token = None
+
+    def pull(self):
+        params = {"since": self.token} if self.token is not None else {}
+        response = self.client.get("/api/export/changes", params=params)
+        response.raise_for_status()
+        data = response.json()
+        self.token = data["next_token"]
+        return data
+
+
+def member_names(data):
+    return {member["name"] for member in data["family_members"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hold-seconds", type=float, default=3.0,
+                        help="How long the late transaction stays open after its write")
+    args = parser.parse_args()
+
+    try:
+        init_db()
+        failures = []
+        with TestClient(app) as client:
+            sync = Sync(client)
+            member_id = client.post("/api/family-members", json={"name": "Early"}).json()["id"]
+            if "Early" not in member_names(sync.pull()):
+                failures.append("the first sync is missing a committed member")
+
+            # Written now, committed only after a sync has issued its token
+            db = SessionLocal()
+            try:
+                db.add(models.FamilyMember(name="Late"))
+                db.flush()
+                time.sleep(args.hold_seconds)
+                if "Late" in member_names(sync.pull()):
+                    failures.append("a sync returned an uncommitted member")
+                db.commit()
+            finally:
+                db.close()
+            if "Late" not in member_names(sync.pull()):
+                failures.append(f"a member committed {args.hold_seconds:g}s after its write was missed")
+
+            client.put(f"/api/family-members/{member_id}", json={"name": "Renamed"})
+            if member_names(sync.pull()) != {"Renamed"}:
+                failures.append("the sync after an update doesn't hold just the updated member")
+
+            medication_id = client.post("/api/medications", json={
+                "name": "Medication", "default_dose": "5mL", "default_frequency_hours": 6.0
+            }).json()["id"]
+            sync.pull()
+            client.delete(f"/api/medications/{medication_id}")
+            deleted = sync.pull()["deleted"]
+            if {"table": "medications", "id": medication_id} not in [
+                {"table": record["table"], "id": record["id"]} for record in deleted
+            ]:
+                failures.append("the sync after a delete has no tombstone")
+
+            data = sync.pull()
+            if any(data[key] for key in data if isinstance(data[key], list)):
+                failures.append("a sync without changes returned rows")
+
+        for failure in failures:
+            print(f"✗ {failure}")
+        if failures:
+            return 1
+        print(f"✓ Every change, including one committed {args.hold_seconds:g}s after its write, "
+              f"was in the next sync")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Benchmark GET /api/reports/daily against grouping the administrations.
+
+Copies a generated dataset (see ``dataset.py``) into a scratch database,
+checks its daily rollups against the administrations, and times the doses
+per day and family member over the default report window and the whole
+history two ways: with the report, which reads the rollups, and with the
+same grouping run over the administrations, as it was before them. The
+rollups read one row per day, assignment and caregiver rather than one per
+dose, so they gain most where doses are logged several times a day.
+
+Fails (exit code 1) when the rollups or the two reports disagree.
+
+Usage (from the backend directory):
+    python benchmarks/daily_rollups.py [--size large] [--rounds 30]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="daily-rollups-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+# Grouping the raw rows by SQLite date() counts UTC days
+os.environ["ROLLUP_TIMEZONE"] = "UTC"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import dataset  # noqa: E402
+from datetime import timedelta  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+from app import models, rollups, schemas  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.routers import reports  # noqa: E402
+
+
+def history_range(db):
+    """First and last day with an administration."""
+    first, last = db.query(
+        func.min(models.Administration.administered_at), func.max(models.Administration.administered_at)
+    ).one()
+    return rollups.day_of(first), rollups.day_of(last)
+
+
+def raw_report(db, start, end):
+    """The daily report grouped from the administrations, as it was before the rollups."""
+    administration = models.Administration
+    assignment = models.MedicationAssignment
+    day = func.date(administration.administered_at)
+    lower, _ = rollups.day_bounds(start)
+    _, upper = rollups.day_bounds(end)
+    rows = db.query(
+        day.label("day"),
+        assignment.family_member_id,
+        models.FamilyMember.name.label("family_member_name"),
+        func.count(administration.id).label("doses"),
+        func.min(administration.administered_at).label("first_administered_at"),
+        func.max(administration.administered_at).label("last_administered_at")
+    ).join(assignment, assignment.id == administration.medication_assignment_id).join(
+        models.FamilyMember, models.FamilyMember.id == assignment.family_member_id
+    ).filter(
+        administration.administered_at >= lower, administration.administered_at < upper
+    ).group_by(day, assignment.family_member_id).order_by(day, assignment.family_member_id).all()
+    return [schemas.DailyDoseReport(**row._mapping) for row in rows]
+
+
+def rollup_report(db, start, end):
+    return reports.get_daily_doses(start=start, end=end, family_member_id=None, medication_id=None, db=db)
+
+
+def _comparable(report):
+    return [
+        (row.day, row.family_member_id, row.doses,
+         rollups._utc(row.first_administered_at), rollups._utc(row.last_administered_at))
+        for row in report
+    ]
+
+
+def time_rounds(func, rounds, *args):
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="large")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        shutil.copyfile(source, os.environ["DATABASE_PATH"])
+        # Fills the rollups of datasets generated before they existed
+        init_db()
+        db = SessionLocal()
+        try:
+            mismatches = rollups.verify(db)
+            first, last = history_range(db)
+            default_start = last - timedelta(days=reports.DEFAULT_REPORT_DAYS - 1)
+            windows = [
+                (f"last {reports.DEFAULT_REPORT_DAYS} days", default_start, last),
+                (f"{(last - first).days + 1} days", first, last),
+            ]
+            disagreeing = []
+            results = []
+            for label, start, end in windows:
+                if _comparable(raw_report(db, start, end)) != _comparable(rollup_report(db, start, end)):
+                    disagreeing.append(label)
+                results.append((
+                    label,
+                    time_rounds(raw_report, args.rounds, db, start, end),
+                    time_rounds(rollup_report, args.rounds, db, start, end),
+                ))
+            rollup_rows = db.query(func.count(models.AdministrationDailyRollup.id)).scalar()
+            administrations = db.query(func.count(models.Administration.id)).scalar()
+        finally:
+            db.close()
+
+        print(f"Doses per day and family member from the {args.size} dataset, {args.rounds} rounds each "
+              f"({rollup_rows} rollups of {administrations} administrations)")
+        print(f"{'window':18}{'administrations p50 ms':>24}{'rollups p50 ms':>16}")
+        for label, before, after in results:
+            print(f"{label:18}{statistics.median(before):>24.2f}{statistics.median(after):>16.2f}")
+
+        if mismatches:
+            print(f"\n✗ {len(mismatches)} rollup(s) differ from the administrations")
+            return 1
+        if disagreeing:
+            print(f"\n✗ The report disagrees with the administrations over {', '.join(disagreeing)}")
+            return 1
+        print("\n✓ The rollups and the report match the administrations")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
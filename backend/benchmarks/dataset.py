@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""Generate a realistic synthetic medication tracker database.
+
+Builds family members, caregivers, a medication catalog with inventory, and
+assignments that were dosed at their real frequencies over the given span:
+chronic medications daily or twice daily with occasional missed doses,
+antibiotic-style courses, and as-needed medications in short episodes.
+Each administration comes with its inventory ledger entry (with periodic
+snapshots and restocks) and audit event, and assignments have an edit
+history of dose changes, so every table has a realistic shape. The same
+size and seed always produce the same rows, ending at the given time.
+
+Rows are written through SQLAlchemy Core in bulk, bypassing the API, so a
+``huge`` database takes a minute or two rather than hours.
+
+Usage (from the backend directory):
+    python benchmarks/dataset.py --size medium --output /tmp/medium.db [--seed 42]
+
+Other benchmarks use ``ensure_dataset()`` to build a database once and
+reuse it from a cache directory.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCHMARKS_DIR, "..")
+DEFAULT_CACHE_DIR = os.path.join(BENCHMARKS_DIR, ".datasets")
+
+SIZES = {
+    "small": {"members": 3, "caregivers": 2, "medications": 8, "per_member": 3, "days": 30},
+    "medium": {"members": 6, "caregivers": 3, "medications": 20, "per_member": 4, "days": 365},
+    "large": {"members": 12, "caregivers": 5, "medications": 50, "per_member": 6, "days": 3 * 365},
+    "huge": {"members": 40, "caregivers": 8, "medications": 150, "per_member": 8, "days": 5 * 365},
+}
+
+FIRST_NAMES = [
+    "Emma", "Liam", "Olivia", "Noah", "Ava", "Elijah", "Sophia", "Lucas", "Mia", "Mateo",
+    "Isabella", "Levi", "Amelia", "Ezra", "Harper", "Leo", "Evelyn", "Theo", "Grandma Rose", "Grandpa Joe",
+]
+CAREGIVER_NAMES = ["Mom", "Dad", "Nana", "Babysitter", "Aunt Kate", "Uncle Ben", "Nurse Pat", "Grandpa"]
+
+# name, dose, (fixed hours | (min, max) hours), inventory unit, stock, pattern
+# Patterns: "chronic" doses every interval, "course" for a few days now and
+# then, "prn" (as needed) a few doses a day in short episodes
+CATALOG = [
+    ("Children's Acetaminophen", "5mL", (4, 6), "mL", 120, "prn"),
+    ("Children's Ibuprofen", "5mL", (6, 8), "mL", 120, "prn"),
+    ("Amoxicillin", "5mL", 12, "mL", 150, "course"),
+    ("Cetirizine", "5mL", 24, "mL", 120, "chronic"),
+    ("Vitamin D", "1 tablet", 24, "tablets", 90, "chronic"),
+    ("Albuterol Inhaler", "2 puffs", (4, 6), "puffs", 200, "prn"),
+    ("Levothyroxine", "1 tablet", 24, "tablets", 90, "chronic"),
+    ("Metformin", "1 tablet", 12, "tablets", 180, "chronic"),
+    ("Melatonin", "1 tablet", 24, "tablets", 60, "chronic"),
+    ("Fluticasone Nasal Spray", "1 spray", 12, "sprays", 120, "chronic"),
+    ("Omeprazole", "1 capsule", 24, "capsules", 30, "chronic"),
+    ("Prednisolone", "5mL", 24, "mL", 100, "course"),
+    ("Azithromycin", "5mL", 24, "mL", 30, "course"),
+    ("Loratadine", "1 tablet", 24, "tablets", 30, "chronic"),
+    ("Ondansetron", "4mg", 8, "mg", 40, "prn"),
+    ("Famotidine", "2.5mL", 12, "mL", 100, "chronic"),
+]
+
+CHUNK_SIZE = 10000
+
+
+def _strengths(index):
+    """Distinct catalog entries beyond the base list, e.g. "Cetirizine (2)"."""
+    base = CATALOG[index % len(CATALOG)]
+    generation = index // len(CATALOG)
+    if generation == 0:
+        return base
+    return (f"{base[0]} ({generation + 1})",) + base[1:]
+
+
+def _dose_times(rng, pattern, frequency, start, end):
+    """Administration times of one assignment between start and end."""
+    times = []
+    if pattern == "chronic":
+        hours = frequency if isinstance(frequency, (int, float)) else frequency[0]
+        t = start.replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        while t < end:
+            # Roughly 3% of doses are missed; the rest are given within half an hour
+            if rng.random() > 0.03:
+                times.append(t + timedelta(minutes=rng.gauss(0, 12)))
+            t += timedelta(hours=hours)
+        return times
+
+    t = start + timedelta(days=rng.uniform(0, 30))
+    while t < end:
+        if pattern == "course":
+            hours, days = frequency, rng.choice((5, 7, 10))
+        else:
+            low, high = frequency if isinstance(frequency, tuple) else (frequency, frequency)
+            hours, days = rng.uniform(low, high), rng.randint(1, 4)
+        episode_end = min(t + timedelta(days=days), end)
+        dose = t.replace(hour=rng.randint(7, 10), minute=rng.randint(0, 59))
+        while dose < episode_end:
+            # As-needed doses skip the night
+            if pattern == "course" or 7 <= dose.hour <= 22:
+                times.append(dose)
+            dose += timedelta(hours=hours, minutes=rng.uniform(0, 40))
+        t = episode_end + timedelta(days=rng.expovariate(1 / (45 if pattern == "course" else 20)))
+    return times
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+class _Writer:
+    """Buffers rows per table and inserts them in chunks."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= CHUNK_SIZE:
+            self.flush(table)
+
+    def flush(self, table=None):
+        from sqlalchemy import insert
+
+        for pending in [table] if table is not None else list(self.buffers):
+            rows = self.buffers.get(pending)
+            if rows:
+                self.connection.execute(insert(pending), rows)
+                self.counts[pending.name] = self.counts.get(pending.name, 0) + len(rows)
+                rows.clear()
+
+
+def generate(size="small", seed=42, end=None, **overrides):
+    """Fill the application's (empty) database; returns row counts per table.
+
+    ``DATABASE_PATH`` must point at the target database before this is
+    called, since the app binds its engine on import.
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from app import models
+    from app.assignment_history import ASSIGNMENT_SNAPSHOT_INTERVAL, HISTORY_FIELDS
+    from app.database import SessionLocal, engine, init_db
+    from app.inventory_ledger import (
+        CONSUMPTION_RATE_WINDOW_DAYS, LEDGER_SNAPSHOT_INTERVAL, consumption_rate, dose_amount, projected_run_out
+    )
+    from app.rollups import rebuild
+
+    init_db()
+    config = {**SIZES[size], **{k: v for k, v in overrides.items() if v is not None}}
+    rng = random.Random(seed)
+    end = (end or datetime.now(timezone.utc)).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=config["days"])
+
+    with engine.begin() as connection:
+        writer = _Writer(connection)
+        tables = {model: model.__table__ for model in (
+            models.FamilyMember, models.Caregiver, models.Medication, models.MedicationInventory,
+            models.MedicationAssignment, models.Administration, models.InventoryTransaction,
+            models.AssignmentRevision, models.AuditEvent,
+        )}
+        audit_id = 0
+
+        def audit(table, record_id, action, changes, occurred_at):
+            nonlocal audit_id
+            audit_id += 1
+            writer.add(tables[models.AuditEvent], {
+                "id": audit_id, "table_name": table, "record_id": record_id, "action": action,
+                "changes": _dumps(changes), "occurred_at": occurred_at,
+            })
+
+        members = []
+        for member_id in range(1, config["members"] + 1):
+            name = FIRST_NAMES[(member_id - 1) % len(FIRST_NAMES)]
+            if member_id > len(FIRST_NAMES):
+                name = f"{name} {member_id // len(FIRST_NAMES) + 1}"
+            row = {"id": member_id, "name": name, "active": member_id % 10 != 0,
+                   "created_at": start, "updated_at": start}
+            members.append(row)
+            writer.add(tables[models.FamilyMember], row)
+            audit("family_members", member_id, "create", {"name": name}, start)
+
+        caregiver_ids = list(range(1, config["caregivers"] + 1))
+        for caregiver_id in caregiver_ids:
+            name = CAREGIVER_NAMES[(caregiver_id - 1) % len(CAREGIVER_NAMES)]
+            writer.add(tables[models.Caregiver], {
+                "id": caregiver_id, "name": name, "active": True, "created_at": start, "updated_at": start,
+            })
+            audit("caregivers", caregiver_id, "create", {"name": name}, start)
+        # A couple of caregivers log most doses
+        caregiver_weights = [1 / rank for rank in range(1, len(caregiver_ids) + 1)]
+
+        medications = []
+        for medication_id in range(1, config["medications"] + 1):
+            name, dose, frequency, unit, stock, pattern = _strengths(medication_id - 1)
+            fixed = isinstance(frequency, (int, float))
+            row = {
+                "id": medication_id, "name": name, "default_dose": dose,
+                "default_frequency_hours": frequency if fixed else None,
+                "default_frequency_min_hours": None if fixed else frequency[0],
+                "default_frequency_max_hours": None if fixed else frequency[1],
+                "notes": None, "created_at": start, "updated_at": start,
+            }
+            medications.append((row, unit, stock, pattern))
+            writer.add(tables[models.Medication], row)
+            audit("medications", medication_id, "create", {"name": name, "default_dose": dose}, start)
+
+        transaction_id = 0
+
+        def ledger(medication_id, kind, change, at, administration=None, balance=None):
+            nonlocal transaction_id
+            transaction_id += 1
+            writer.add(tables[models.InventoryTransaction], {
+                "id": transaction_id, "medication_id": medication_id, "administration_id": administration,
+                "kind": kind, "quantity_change": change, "balance": balance, "created_at": at,
+            })
+
+        # Per-medication stock kept while doses are generated in time order;
+        # the ledger starts with the initial quantity as the API's does
+        stock = {}
+        for row, unit, amount, _ in medications:
+            stock[row["id"]] = {"quantity": float(amount), "unit": unit, "threshold": amount * 0.2,
+                                "since_snapshot": 0, "doses": []}
+            ledger(row["id"], "snapshot", 0, start, balance=float(amount))
+
+        assignment_id = administration_id = revision_id = 0
+        doses = []
+        for member in members:
+            for row, unit, _, pattern in rng.sample(medications, min(config["per_member"], len(medications))):
+                assignment_id += 1
+                created = start + timedelta(days=rng.uniform(0, min(config["days"] * 0.2, 60)))
+                frequency = (row["default_frequency_hours"]
+                             or (row["default_frequency_min_hours"], row["default_frequency_max_hours"]))
+                # Some courses and as-needed medications have since been stopped
+                active = pattern == "chronic" or rng.random() < 0.6
+                stopped = end if active else created + (end - created) * rng.uniform(0.3, 0.9)
+                assignment = {
+                    "id": assignment_id, "family_member_id": member["id"], "medication_id": row["id"],
+                    "current_dose": row["default_dose"], "frequency_hours": None,
+                    "frequency_min_hours": None, "frequency_max_hours": None, "active": active,
+                    "schedule_type": "daily" if pattern == "chronic" else None,
+                    "schedule_time": "08:00" if pattern == "chronic" else None,
+                    "schedule_days": None, "created_at": created, "updated_at": created,
+                }
+                writer.add(tables[models.MedicationAssignment], assignment)
+                audit("medication_assignments", assignment_id, "create",
+                      {"family_member_id": member["id"], "medication_id": row["id"]}, created)
+
+                # Creation snapshot, then a dose change every few months
+                state = {field: assignment[field] for field in HISTORY_FIELDS}
+                state["active"] = True
+                revision_id += 1
+                writer.add(tables[models.AssignmentRevision], {
+                    "id": revision_id, "assignment_id": assignment_id, "changes": None,
+                    "snapshot": _dumps(state), "diffs_since_snapshot": 0, "changed_at": created,
+                })
+                depth = 0
+                changed_at = created + timedelta(days=rng.uniform(30, 120))
+                edits = []
+                while changed_at < stopped:
+                    edits.append((changed_at, "current_dose", rng.choice(("2.5mL", "5mL", "7.5mL", "1 tablet"))))
+                    changed_at += timedelta(days=rng.uniform(30, 120))
+                if not active:
+                    edits.append((stopped, "active", False))
+                for changed_at, field, value in edits:
+                    if state[field] == value:
+                        continue
+                    changes = {field: [state[field], value]}
+                    state[field] = value
+                    depth += 1
+                    snapshot = None
+                    if depth >= ASSIGNMENT_SNAPSHOT_INTERVAL:
+                        snapshot, depth = _dumps(state), 0
+                    revision_id += 1
+                    writer.add(tables[models.AssignmentRevision], {
+                        "id": revision_id, "assignment_id": assignment_id, "changes": _dumps(changes),
+                        "snapshot": snapshot, "diffs_since_snapshot": depth, "changed_at": changed_at,
+                    })
+                    audit("medication_assignments", assignment_id, "update", changes, changed_at)
+
+                for administered_at in _dose_times(rng, pattern, frequency, created, stopped):
+                    doses.append((administered_at, assignment_id, row["id"], row["default_dose"]))
+
+        doses.sort()
+
+        def count_entry(medication_id, at):
+            item = stock[medication_id]
+            item["since_snapshot"] += 1
+            if item["since_snapshot"] >= LEDGER_SNAPSHOT_INTERVAL:
+                ledger(medication_id, "snapshot", 0, at, balance=item["quantity"])
+                item["since_snapshot"] = 0
+
+        for administered_at, dose_assignment_id, medication_id, dose in doses:
+            administration_id += 1
+            caregiver_id = rng.choices(caregiver_ids, caregiver_weights)[0]
+            writer.add(tables[models.Administration], {
+                "id": administration_id, "medication_assignment_id": dose_assignment_id,
+                "caregiver_id": caregiver_id, "administered_at": administered_at, "dose_given": dose,
+                "notes": None, "created_at": administered_at, "updated_at": administered_at,
+            })
+            audit("administrations", administration_id, "create", {
+                "medication_assignment_id": dose_assignment_id, "caregiver_id": caregiver_id,
+                "dose_given": dose,
+            }, administered_at)
+
+            item = stock[medication_id]
+            amount = dose_amount(dose, item["unit"])
+            if amount is None:
+                continue
+            item["quantity"] -= amount
+            item["doses"].append((administered_at, amount))
+            ledger(medication_id, "consumption", -amount, administered_at, administration_id)
+            count_entry(medication_id, administered_at)
+            # Restock when below the threshold, usually within a day or two
+            if item["quantity"] <= item["threshold"] and rng.random() < 0.5:
+                restock = round(item["threshold"] * 5)
+                item["quantity"] += restock
+                ledger(medication_id, "adjustment", restock, administered_at + timedelta(hours=rng.uniform(1, 48)))
+                count_entry(medication_id, administered_at)
+
+        now = end.replace(tzinfo=timezone.utc)
+        for row, unit, _, _ in medications:
+            item = stock[row["id"]]
+            # Exponentially weighted consumption as the ledger maintains it, as of the last dose
+            ewma = updated_at = tracked_since = None
+            if item["doses"]:
+                tracked_since, updated_at = item["doses"][0][0], item["doses"][-1][0]
+                ewma = sum(
+                    amount * math.exp(-(updated_at - at).total_seconds() / 86400 / CONSUMPTION_RATE_WINDOW_DAYS)
+                    for at, amount in item["doses"]
+                )
+            rate = consumption_rate(
+                ewma, updated_at and updated_at.replace(tzinfo=timezone.utc),
+                tracked_since and tracked_since.replace(tzinfo=timezone.utc), now
+            )
+            run_out = projected_run_out(item["quantity"], rate, now)
+            writer.add(tables[models.MedicationInventory], {
+                "id": row["id"], "medication_id": row["id"], "quantity": item["quantity"],
+                "unit": unit, "low_stock_threshold": item["threshold"], "last_updated": updated_at or start,
+                "ledger_entries_since_snapshot": item["since_snapshot"], "consumption_ewma": ewma or 0,
+                "consumption_tracked_since": tracked_since, "consumption_updated_at": updated_at,
+                "projected_run_out_at": run_out.replace(tzinfo=None) if run_out else None,
+            })
+        writer.flush()
+
+    # The daily rollups are derived from the administrations just written
+    db = SessionLocal()
+    try:
+        writer.counts[models.AdministrationDailyRollup.__tablename__] = rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    return writer.counts
+
+
+def dataset_file(size, seed, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{size}-{seed}.db")
+
+
+def ensure_dataset(size, seed=42, cache_dir=DEFAULT_CACHE_DIR):
+    """Path of a cached generated database, generating it first if needed.
+
+    Generation runs in a subprocess so the caller can still point the app
+    at its own copy of the database before importing it.
+    """
+    path = dataset_file(size, seed, cache_dir)
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f"{path}.partial"
+        for leftover in (partial, f"{partial}-wal", f"{partial}-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--size", size, "--seed", str(seed), "--output", partial],
+            check=True
+        )
+        os.replace(partial, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="Database file to create")
+    parser.add_argument("--members", type=int, help="Override the size's family member count")
+    parser.add_argument("--medications", type=int, help="Override the size's medication count")
+    parser.add_argument("--days", type=int, help="Override the size's span of history in days")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        print(f"✗ {args.output} already exists")
+        return 1
+    os.environ["DATABASE_PATH"] = os.path.abspath(args.output)
+    # Rows are written directly; the audit history is generated with them
+    os.environ["AUDIT_ENABLED"] = "false"
+
+    started = time.perf_counter()
+    counts = generate(args.size, args.seed, members=args.members, medications=args.medications, days=args.days)
+
+    from app.database import engine
+    with engine.connect() as connection:
+        # Leave a self-contained file that can be copied without its WAL
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+    engine.dispose()
+
+    print(f"✓ Generated {args.size} dataset (seed {args.seed}) in {time.perf_counter() - started:.1f}s: {args.output}")
+    for table, count in sorted(counts.items()):
+        print(f"  {table:24}{count:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Compare the JSON and NDJSON export/import formats.
+
+Seeds a scratch database with a long administration history, then measures
+file size, export time and import time (into an empty database) for the
+JSON export and for NDJSON with each available compression.
+
+Usage (from the backend directory):
+    python benchmarks/export_formats.py [--administrations 100000]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORK_DIR = tempfile.mkdtemp(prefix="export-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.routers.export import _zstandard  # noqa: E402
+
+
+def seed(administrations):
+    """Insert a family's worth of reference data and a dose history."""
+    conn = sqlite3.connect(os.environ["DATABASE_PATH"])
+    conn.executemany("INSERT INTO family_members (id, name, active) VALUES (?, ?, 1)",
+                     [(i, f"Member {i}") for i in range(1, 5)])
+    conn.executemany("INSERT INTO caregivers (id, name, active) VALUES (?, ?, 1)",
+                     [(i, f"Caregiver {i}") for i in range(1, 3)])
+    conn.executemany("INSERT INTO medications (id, name, default_dose, default_frequency_hours) VALUES (?, ?, '5mL', 6)",
+                     [(i, f"Medication {i}") for i in range(1, 9)])
+    conn.executemany("INSERT INTO medication_assignments (id, family_member_id, medication_id, active) VALUES (?, ?, ?, 1)",
+                     [(i, (i - 1) % 4 + 1, i) for i in range(1, 9)])
+    start = datetime(2020, 1, 1)
+    conn.executemany(
+        "INSERT INTO administrations (id, medication_assignment_id, caregiver_id, administered_at, dose_given, notes) "
+        "VALUES (?, ?, ?, ?, '5mL', ?)",
+        [
+            (i, i % 8 + 1, i % 2 + 1, (start + timedelta(hours=i)).isoformat(sep=" "),
+             "Given with food" if i % 5 == 0 else None)
+            for i in range(1, administrations + 1)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def reset_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def measure(client, label, export_url, import_url):
+    started = time.perf_counter()
+    response = client.get(export_url)
+    export_seconds = time.perf_counter() - started
+    assert response.status_code == 200, response.text
+    content = response.content
+
+    reset_database()
+    started = time.perf_counter()
+    response = client.post(import_url, files={"file": ("export", content)})
+    import_seconds = time.perf_counter() - started
+    assert response.status_code == 200, response.text
+    return label, len(content), export_seconds, import_seconds, response.json()["imported"]["administrations"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--administrations", type=int, default=100000)
+    args = parser.parse_args()
+
+    try:
+        client = TestClient(app)
+        cases = [
+            ("json", "/api/export/json", "/api/export/import/json"),
+            ("ndjson", "/api/export/ndjson?compression=none", "/api/export/import/ndjson"),
+            ("ndjson+gzip", "/api/export/ndjson?compression=gzip", "/api/export/import/ndjson"),
+        ]
+        if _zstandard() is not None:
+            cases.append(("ndjson+zstd", "/api/export/ndjson?compression=zstd", "/api/export/import/ndjson"))
+
+        print(f"{'format':14}{'size KB':>12}{'export s':>10}{'import s':>10}{'rows':>10}")
+        for case in cases:
+            reset_database()
+            seed(args.administrations)
+            label, size, export_seconds, import_seconds, rows = measure(client, *case)
+            print(f"{label:14}{size / 1024:>12.0f}{export_seconds:>10.2f}{import_seconds:>10.2f}{rows:>10}")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Benchmark GET /api/family-members/overview against per-assignment status calls.
+
+Copies a generated dataset (see ``dataset.py``) into a scratch database and
+times building every family member's summary (assignment counts, last
+dose, next due time, overdue count) two ways: with the overview endpoint's
+single grouped query, and as clients did before it, listing members and
+assignments and then fetching each active assignment's status.
+
+Fails (exit code 1) when the two disagree on a member's assignment counts,
+last dose, next due time or overdue count (times must be identical), or
+when the overview is not faster at the median.
+
+Usage (from the backend directory):
+    python benchmarks/family_overview.py [--size large] [--rounds 30]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+WORK_DIR = tempfile.mkdtemp(prefix="family-overview-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+# Only reads are timed
+os.environ["AUDIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import dataset  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+
+
+def _parse(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+
+def per_assignment_summary(client, inactive_status=False):
+    """Member summaries from the member list, the assignment list and a status call per assignment.
+
+    Clients fetched the status of active assignments only; ``inactive_status``
+    fetches the rest as well, for their last doses, when comparing.
+    """
+    members = client.get("/api/family-members").json()
+    assignments = client.get("/api/assignments").json()
+    summary = {
+        member["id"]: {
+            "active_assignments": 0, "inactive_assignments": 0, "last_administration": None,
+            "next_due": None, "overdue_count": 0
+        }
+        for member in members
+    }
+    now = datetime.now(timezone.utc)
+    for assignment in assignments:
+        entry = summary.get(assignment["family_member_id"])
+        if entry is None:
+            continue
+        if not assignment["active"] and not inactive_status:
+            entry["inactive_assignments"] += 1
+            continue
+        status = client.get(f"/api/assignments/{assignment['id']}/status").json()
+        last_administration = _parse(status["last_administration"])
+        if last_administration and (
+            entry["last_administration"] is None or last_administration > entry["last_administration"]
+        ):
+            entry["last_administration"] = last_administration
+        if not assignment["active"]:
+            entry["inactive_assignments"] += 1
+            continue
+        entry["active_assignments"] += 1
+        next_due = _parse(status["next_dose_time"])
+        if next_due and (entry["next_due"] is None or next_due < entry["next_due"]):
+            entry["next_due"] = next_due
+        latest = _parse(status["next_dose_max_time"] or status["next_dose_time"])
+        if latest and now >= latest:
+            entry["overdue_count"] += 1
+    return summary
+
+
+def overview_summary(client):
+    return {
+        row["id"]: {
+            "active_assignments": row["active_assignments"],
+            "inactive_assignments": row["inactive_assignments"],
+            "last_administration": _parse(row["last_administration"]),
+            "next_due": _parse(row["next_due"]),
+            "overdue_count": row["overdue_count"],
+        }
+        for row in client.get("/api/family-members/overview").json()
+    }
+
+
+def disagreements(expected, actual):
+    problems = []
+    for member_id, entry in expected.items():
+        other = actual.get(member_id)
+        if other is None:
+            problems.append(f"member {member_id} missing from the overview")
+            continue
+        for field in ("active_assignments", "inactive_assignments", "last_administration", "next_due",
+                      "overdue_count"):
+            if entry[field] != other[field]:
+                problems.append(f"member {member_id} {field}: {entry[field]} vs {other[field]}")
+    return problems
+
+
+def time_rounds(func, client, rounds):
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(client)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="large")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        shutil.copyfile(source, os.environ["DATABASE_PATH"])
+        # Adds the administrations index the overview reads the last doses from
+        init_db()
+        client = TestClient(app)
+
+        problems = disagreements(per_assignment_summary(client, inactive_status=True), overview_summary(client))
+        results = [
+            ("per-assignment", time_rounds(per_assignment_summary, client, args.rounds)),
+            ("overview", time_rounds(overview_summary, client, args.rounds)),
+        ]
+
+        print(f"Member summaries of the {args.size} dataset, {args.rounds} rounds each")
+        print(f"{'':16}{'p50 ms':>10}{'p95 ms':>10}")
+        for label, latencies in results:
+            print(f"{label:16}{statistics.median(latencies):>10.2f}"
+                  f"{latencies[int(len(latencies) * 0.95) - 1]:>10.2f}")
+
+        if problems:
+            print("\n✗ The overview disagrees with the status endpoints:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        before, after = (statistics.median(latencies) for _, latencies in results)
+        if after >= before:
+            print(f"\n✗ The overview is not faster ({after:.2f} ms vs {before:.2f} ms)")
+            return 1
+        print(f"\n✓ The overview matches and is {before / after:.1f}x faster at the median")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark replaying POST /api/administrations retried with an Idempotency-Key.
+
+Times logging doses without a key, with a new key per request, and
+retries replayed from a worker's in-memory cache and from the
+``idempotency_keys`` table, and counts the SQL statements each runs.
+Then sends the same key from several threads at once, as retries racing
+the first request would.
+
+Fails (exit code 1) when a replay writes an administration, runs a query
+on the in-memory path, or the racing requests log more than one dose.
+
+Usage (from the backend directory):
+    python benchmarks/idempotency_replay.py [--requests 300] [--threads 8]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+WORK_DIR = tempfile.mkdtemp(prefix="idempotency-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, func  # noqa: E402
+from app import audit, idempotency, models  # noqa: E402
+from app.database import SessionLocal, engine, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+
+statements = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def administration_count():
+    db = SessionLocal()
+    try:
+        return db.query(func.count(models.Administration.id)).scalar()
+    finally:
+        db.close()
+
+
+def time_requests(client, body, keys, clear_memory=False):
+    """Per-request latencies in milliseconds, and statements run per request."""
+    global statements
+    # Audit events of earlier requests would otherwise be written during the timing
+    audit.get_pipeline().flush()
+    latencies = []
+    before = statements
+    for key in keys:
+        if clear_memory:
+            idempotency.responses.clear()
+        headers = {"Idempotency-Key": key} if key else {}
+        started = time.perf_counter()
+        response = client.post("/api/administrations", json=body, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 201, response.text
+    return latencies, (statements - before) / len(keys)
+
+
+def race(client, body, threads):
+    """Send one key from ``threads`` threads at once; returns the status codes."""
+    key = str(uuid.uuid4())
+    barrier = threading.Barrier(threads)
+    statuses = []
+
+    def send():
+        barrier.wait()
+        response = client.post("/api/administrations", json=body, headers={"Idempotency-Key": key})
+        statuses.append(response.status_code)
+
+    workers = [threading.Thread(target=send) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent requests sharing one key")
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        member = client.post("/api/family-members", json={"name": "Benchmark"}).json()
+        medication = client.post("/api/medications", json={
+            "name": "Benchmarkol", "default_dose": "5mL", "default_frequency_hours": 4
+        }).json()
+        assignment = client.post("/api/assignments", json={
+            "family_member_id": member["id"], "medication_id": medication["id"]
+        }).json()
+        body = {"medication_assignment_id": assignment["id"], "dose_given": "5mL"}
+
+        # Warm up connections and caches
+        time_requests(client, body, [None] * 20)
+
+        keys = [str(uuid.uuid4()) for _ in range(args.requests)]
+        results = [
+            ("no key", time_requests(client, body, [None] * args.requests)),
+            ("new key", time_requests(client, body, keys)),
+        ]
+        logged = administration_count()
+        results += [
+            ("replay (memory)", time_requests(client, body, keys)),
+            ("replay (table)", time_requests(client, body, keys, clear_memory=True)),
+        ]
+        replay_writes = administration_count() - logged
+
+        statuses = race(client, body, args.threads)
+        race_doses = administration_count() - logged
+
+        print(f"{'':18}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}")
+        for label, (latencies, queries) in results:
+            ordered = sorted(latencies)
+            print(f"{label:18}{statistics.median(ordered):>9.2f}{ordered[int(len(ordered) * 0.95) - 1]:>9.2f}"
+                  f"{queries:>9.1f}")
+        print(f"\n{args.threads} racing requests with one key: statuses {sorted(statuses)}, "
+              f"{race_doses} dose(s) logged")
+
+        failures = []
+        if replay_writes:
+            failures.append(f"replays logged {replay_writes} administration(s)")
+        if results[2][1][1]:
+            failures.append("replays from memory ran queries")
+        if race_doses != 1:
+            failures.append(f"racing requests logged {race_doses} doses")
+        if failures:
+            print(f"\n✗ {'; '.join(failures)}")
+            return 1
+        print("\n✓ Replays touch no administrations and racing retries log one dose")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
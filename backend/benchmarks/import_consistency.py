@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Check that data imported from JSON and NDJSON backups is complete.
+
+Imports a small backup with each format into a scratch database, then
+checks what the write endpoints would have set up for the same rows: the
+inventory ledger starts at the imported quantity and stays consistent as
+doses are logged, and an assignment's state before its first edit can be
+read back from its history.
+
+Fails (exit code 1) on the first import whose derived data is missing or
+wrong.
+
+Usage (from the backend directory, e.g. in CI):
+    python benchmarks/import_consistency.py
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+WORK_DIR = tempfile.mkdtemp(prefix="import-consistency-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.routers.export import NDJSON_RECORD_TYPES  # noqa: E402
+
+INITIAL_QUANTITY = 100.0
+DOSE = "5mL"
+EDITED_DOSE = "10mL"
+
+
+def backup(record_id):
+    """Backup sections with one member, medication, assignment and inventory record."""
+    return {
+        "family_members": [{"id": record_id, "name": f"Member {record_id}"}],
+        "medications": [{
+            "id": record_id, "name": f"Medication {record_id}", "default_dose": DOSE,
+            "default_frequency_hours": 6.0
+        }],
+        "assignments": [{
+            "id": record_id, "family_member_id": record_id, "medication_id": record_id,
+            "current_dose": DOSE, "frequency_hours": 6.0
+        }],
+        "inventory": [{
+            "id": record_id, "medication_id": record_id, "quantity": INITIAL_QUANTITY, "unit": "mL"
+        }],
+    }
+
+
+def json_upload(sections):
+    return "/api/export/import/json", ("backup.json", io.BytesIO(json.dumps(sections).encode()))
+
+
+def ndjson_upload(sections):
+    lines = [
+        json.dumps({"type": NDJSON_RECORD_TYPES[key], **record})
+        for key, records in sections.items() for record in records
+    ]
+    return "/api/export/import/ndjson", ("backup.ndjson", io.BytesIO("\n".join(lines).encode()))
+
+
+def check_ledger(client, medication_id):
+    """Failure messages for the imported inventory's ledger, before and after a dose."""
+    failures = []
+    expected = INITIAL_QUANTITY
+    for step in ("after the import", "after a dose"):
+        if step == "after a dose":
+            response = client.post("/api/administrations", json={
+                "medication_assignment_id": medication_id, "dose_given": DOSE
+            })
+            if response.status_code != 201:
+                return failures + [f"logging a dose failed ({response.status_code})"]
+            expected -= 5
+        balance = client.get(f"/api/inventory/{medication_id}/ledger/balance").json()
+        if balance["snapshot_id"] is None or not balance["consistent"] or balance["ledger_balance"] != expected:
+            failures.append(
+                f"ledger {step}: balance {balance['ledger_balance']}, quantity {balance['quantity']}, "
+                f"snapshot {balance['snapshot_id']}"
+            )
+    return failures
+
+
+def check_history(client, assignment_id, imported_at):
+    """Failure messages for the imported assignment's state before and after an edit."""
+    # Revisions are timestamped to the second, so the edit must land in a later one
+    time.sleep(1.1)
+    response = client.put(f"/api/assignments/{assignment_id}", json={"current_dose": EDITED_DOSE})
+    if response.status_code != 200:
+        return [f"editing the assignment failed ({response.status_code})"]
+    failures = []
+    for step, ts, expected in (
+        ("before the edit", imported_at, DOSE),
+        ("after the edit", datetime.now(timezone.utc), EDITED_DOSE),
+    ):
+        response = client.get(f"/api/assignments/{assignment_id}/as-of", params={"ts": ts.isoformat()})
+        if response.status_code != 200:
+            failures.append(f"assignment {step}: no state ({response.status_code})")
+        elif response.json()["current_dose"] != expected:
+            failures.append(f"assignment {step}: dose {response.json()['current_dose']}, expected {expected}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    try:
+        init_db()
+        failed = False
+        with TestClient(app) as client:
+            for record_id, (label, upload) in enumerate(
+                [("JSON", json_upload), ("NDJSON", ndjson_upload)], start=1
+            ):
+                path, file = upload(backup(record_id))
+                response = client.post(path, files={"file": file})
+                imported_at = datetime.now(timezone.utc)
+                if response.status_code != 200:
+                    failures = [f"import failed ({response.status_code}): {response.text}"]
+                else:
+                    failures = check_ledger(client, record_id) + check_history(client, record_id, imported_at)
+                for failure in failures:
+                    print(f"✗ {label}: {failure}")
+                if not failures:
+                    print(f"✓ {label}: the inventory ledger starts at the imported quantity "
+                          f"and the assignment history at its imported state")
+                failed = failed or bool(failures)
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Check that concurrent dose logging never loses an inventory decrement.
+
+Fires POST /api/administrations from several threads at once against one
+inventory record and verifies that the final quantity equals the starting
+quantity minus every logged dose, and that the ledger reconciles.
+
+Usage (from the backend directory):
+    python benchmarks/inventory_concurrency.py [--threads 8] [--doses 50]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="inventory-concurrency-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+
+STARTING_QUANTITY = 100000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--doses", type=int, default=50, help="Doses logged per thread")
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        member = client.post("/api/family-members", json={"name": "Concurrency"}).json()
+        medication = client.post("/api/medications", json={
+            "name": "Tabletol", "default_dose": "1 tablet", "default_frequency_hours": 4
+        }).json()
+        assignment = client.post("/api/assignments", json={
+            "family_member_id": member["id"], "medication_id": medication["id"]
+        }).json()
+        inventory = client.post("/api/inventory", json={
+            "medication_id": medication["id"], "quantity": STARTING_QUANTITY, "unit": "tablets"
+        }).json()
+
+        failures = []
+        barrier = threading.Barrier(args.threads)
+
+        def log_doses(worker):
+            worker_client = TestClient(app)
+            barrier.wait()
+            for i in range(args.doses):
+                response = worker_client.post("/api/administrations", json={
+                    "medication_assignment_id": assignment["id"],
+                    "dose_given": "1 tablet",
+                    "notes": f"worker {worker} dose {i}"
+                })
+                if response.status_code != 201:
+                    failures.append(response.text)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=log_doses, args=(n,)) for n in range(args.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        logged = args.threads * args.doses - len(failures)
+        quantity = client.get(f"/api/inventory/{inventory['id']}").json()["quantity"]
+        balance = client.get(f"/api/inventory/{inventory['id']}/ledger/balance").json()
+        expected = STARTING_QUANTITY - logged
+
+        print(f"{logged} doses from {args.threads} threads in {elapsed:.2f}s ({len(failures)} failed requests)")
+        print(f"quantity {quantity}, expected {expected}, ledger balance {balance['ledger_balance']}")
+        for failure in failures[:5]:
+            print(f"  failure: {failure}")
+        ok = quantity == expected and balance["consistent"] and not failures
+        print("OK" if ok else "FAILED")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""End-to-end load test of the API under uvicorn with simulated caregivers.
+
+Starts the app under uvicorn against a copy of a generated dataset (see
+``dataset.py``) and runs concurrent virtual caregivers, each repeatedly
+picking a scenario modelled on the frontend:
+
+- dashboard: load the active assignments, then every card's status at once,
+  and poll the statuses again a few times as the dashboard's timers do
+- dose round: the morning rush, logging doses for several assignments in
+  quick succession, then refreshing their cards
+- history: browse a family member's recent administrations
+- inventory: check stock and low-stock alerts
+- export: download a JSON or CSV export
+
+Reports p50/p95/p99 latency, throughput and errors per route, and counts
+``database is locked`` failures, both as seen in responses and as counted
+by the server's ``/api/metrics``. Results are written as JSON (``--output``)
+with the commit and settings, and ``--baseline`` compares p95 latencies and
+throughput with an earlier run.
+
+Usage (from the backend directory):
+    python benchmarks/load_test.py [--size medium] [--users 20] [--duration 30]
+        [--workers 1] [--output load.json] [--baseline load-before.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import dataset
+
+# Relative frequency of each scenario
+SCENARIOS = {
+    "dashboard": 45,
+    "dose_round": 25,
+    "history": 15,
+    "inventory": 12,
+    "export": 3,
+}
+LOCKED_MESSAGE = "database is locked"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Recorder:
+    """Latencies and outcomes of every request, per route label."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.locked = {}
+
+    def record(self, route, elapsed, response=None, error=None):
+        self.latencies.setdefault(route, []).append(elapsed)
+        failed = error is not None or response.status_code >= 400
+        if failed:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            text = str(error) if error is not None else response.text
+            if LOCKED_MESSAGE in text:
+                self.locked[route] = self.locked.get(route, 0) + 1
+
+    def summary(self, duration):
+        results = []
+        for route, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            results.append({
+                "route": route,
+                "requests": len(ordered),
+                "throughput_rps": round(len(ordered) / duration, 2),
+                "errors": self.errors.get(route, 0),
+                "error_rate": round(self.errors.get(route, 0) / len(ordered), 4),
+                "locked": self.locked.get(route, 0),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            })
+        return results
+
+
+class Caregiver:
+    """One simulated app user working through scenarios until the deadline."""
+
+    def __init__(self, client, recorder, ctx, rng, think_time, deadline):
+        self.client = client
+        self.recorder = recorder
+        self.ctx = ctx
+        self.rng = rng
+        self.think_time = think_time
+        self.deadline = deadline
+
+    async def request(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(route, time.perf_counter() - started, error=e)
+            return None
+        self.recorder.record(route, time.perf_counter() - started, response)
+        return response
+
+    async def think(self, scale=1.0):
+        await asyncio.sleep(self.rng.expovariate(1 / (self.think_time * scale)))
+
+    async def dashboard(self):
+        response = await self.request("GET /api/assignments", "GET", "/api/assignments", params={"active": "true"})
+        if response is None or response.status_code != 200:
+            return
+        ids = [assignment["id"] for assignment in response.json()]
+        # The dashboard's per-card status timers fire every minute; compressed here
+        for _ in range(self.rng.randint(1, 3)):
+            await asyncio.gather(*(
+                self.request("GET /api/assignments/{id}/status", "GET", f"/api/assignments/{i}/status")
+                for i in ids
+            ))
+            await self.think()
+
+    async def dose_round(self):
+        await self.request("GET /api/caregivers", "GET", "/api/caregivers")
+        member = self.rng.choice(self.ctx["members"])
+        assignments = self.ctx["assignments_by_member"][member]
+        for assignment_id in self.rng.sample(assignments, min(len(assignments), self.rng.randint(1, 4))):
+            await self.request(
+                "GET /api/assignments/{id}/can-administer", "GET", f"/api/assignments/{assignment_id}/can-administer"
+            )
+            await self.request("POST /api/administrations", "POST", "/api/administrations", json={
+                "medication_assignment_id": assignment_id,
+                "caregiver_id": self.rng.choice(self.ctx["caregivers"]),
+                "dose_given": self.ctx["doses"][assignment_id],
+            })
+            await self.request(
+                "GET /api/assignments/{id}/status", "GET", f"/api/assignments/{assignment_id}/status"
+            )
+            await self.think(0.3)
+
+    async def history(self):
+        member = self.rng.choice(self.ctx["members"])
+        since = datetime.now(timezone.utc) - timedelta(days=self.rng.choice((1, 7, 30)))
+        await self.request("GET /api/administrations", "GET", "/api/administrations", params={
+            "family_member_id": member, "start_date": since.isoformat()
+        })
+        await self.think()
+
+    async def inventory(self):
+        await self.request("GET /api/inventory", "GET", "/api/inventory")
+        await self.request("GET /api/inventory/low-stock", "GET", "/api/inventory/low-stock")
+
+    async def export(self):
+        route = self.rng.choice(("/api/export/json", "/api/export/csv"))
+        await self.request(f"GET {route}", "GET", route)
+
+    async def run(self):
+        names = list(SCENARIOS)
+        weights = list(SCENARIOS.values())
+        while time.monotonic() < self.deadline:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+            await self.think()
+
+
+def load_context(database_path):
+    """Ids the scenarios pick from, read from the dataset before the run."""
+    import sqlite3
+
+    connection = sqlite3.connect(database_path)
+    try:
+        assignments = connection.execute(
+            "SELECT a.id, a.family_member_id, COALESCE(a.current_dose, m.default_dose) "
+            "FROM medication_assignments a JOIN medications m ON m.id = a.medication_id "
+            "JOIN family_members f ON f.id = a.family_member_id WHERE a.active AND f.active"
+        ).fetchall()
+        caregivers = [row[0] for row in connection.execute("SELECT id FROM caregivers WHERE active")]
+    finally:
+        connection.close()
+    by_member = {}
+    for assignment_id, member_id, _ in assignments:
+        by_member.setdefault(member_id, []).append(assignment_id)
+    return {
+        "members": sorted(by_member),
+        "assignments_by_member": by_member,
+        "doses": {assignment_id: dose for assignment_id, _, dose in assignments},
+        "caregivers": caregivers,
+    }
+
+
+def busy_errors(metrics_text):
+    """Total ``db_busy_errors_total`` from the Prometheus text format."""
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith("db_busy_errors_total"):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run_load(base_url, ctx, users, duration, think_time, seed):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users * 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        busy_before = busy_errors((await client.get("/api/metrics")).text)
+        started = time.monotonic()
+        deadline = started + duration
+        caregivers = [
+            Caregiver(client, recorder, ctx, random.Random(seed * 1000 + i), think_time, deadline)
+            for i in range(users)
+        ]
+        await asyncio.gather(*(caregiver.run() for caregiver in caregivers))
+        elapsed = time.monotonic() - started
+        busy_after = busy_errors((await client.get("/api/metrics")).text)
+    return recorder, elapsed, busy_after - busy_before
+
+
+def start_server(work_dir, port, workers):
+    """Start uvicorn on a copy of the dataset and wait until it answers."""
+    env = dict(os.environ, DATABASE_PATH=os.path.join(work_dir, "medications.db"))
+    log = open(os.path.join(work_dir, "uvicorn.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--no-access-log"],
+        cwd=dataset.BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}, see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=dataset.BACKEND_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, totals, baseline, dataset_info, settings):
+    if baseline["dataset"] != dataset_info or baseline["settings"] != settings:
+        print(f"\n✗ Baseline ran with different settings ({baseline['dataset']}, {baseline['settings']}); "
+              "latencies are not directly comparable")
+    previous = {entry["route"]: entry for entry in baseline["results"]}
+    print(f"\n{'route':46}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+    for entry in results:
+        before = previous.get(entry["route"])
+        if before and before["p95_ms"]:
+            change = entry["p95_ms"] / before["p95_ms"] - 1
+            print(f"{entry['route']:46}{before['p95_ms']:>12.1f}{entry['p95_ms']:>10.1f}{change:>+9.1%}")
+    before = baseline["totals"]["throughput_rps"]
+    print(f"{'throughput (req/s)':46}{before:>12.1f}{totals['throughput_rps']:>10.1f}"
+          f"{totals['throughput_rps'] / before - 1 if before else 0:>+9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated caregivers")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between user actions")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results JSON from a previous run")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    server = None
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        database_path = os.path.join(work_dir, "medications.db")
+        shutil.copyfile(source, database_path)
+        ctx = load_context(database_path)
+
+        port = _free_port()
+        server = start_server(work_dir, port, args.workers)
+        print(f"Running {args.users} caregivers for {args.duration:.0f}s against the {args.size} dataset "
+              f"({args.workers} worker{'s' if args.workers > 1 else ''})...")
+        recorder, elapsed, server_busy = asyncio.run(run_load(
+            f"http://127.0.0.1:{port}", ctx, args.users, args.duration, args.think_time, args.seed
+        ))
+
+        results = recorder.summary(elapsed)
+        requests = sum(entry["requests"] for entry in results)
+        totals = {
+            "requests": requests,
+            "duration_s": round(elapsed, 2),
+            "throughput_rps": round(requests / elapsed, 2),
+            "errors": sum(entry["errors"] for entry in results),
+            "error_rate": round(sum(entry["errors"] for entry in results) / requests, 4) if requests else 0,
+            "locked_responses": sum(entry["locked"] for entry in results),
+            "server_busy_errors": server_busy,
+        }
+
+        print(f"\n{'route':46}{'requests':>9}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}  ms")
+        for entry in results:
+            print(f"{entry['route']:46}{entry['requests']:>9}{entry['errors']:>8}"
+                  f"{entry['p50_ms']:>9.1f}{entry['p95_ms']:>9.1f}{entry['p99_ms']:>9.1f}")
+        print(f"\n{totals['requests']} requests in {totals['duration_s']}s: {totals['throughput_rps']} req/s, "
+              f"{totals['error_rate']:.2%} errors, {totals['locked_responses']} 'database is locked' responses, "
+              f"{totals['server_busy_errors']:.0f} locked statements counted by the server")
+
+        dataset_info = {"size": args.size, "seed": args.seed}
+        settings = {"users": args.users, "duration": args.duration,
+                    "think_time": args.think_time, "workers": args.workers}
+        if args.baseline:
+            with open(args.baseline) as f:
+                print_comparison(results, totals, json.load(f), dataset_info, settings)
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({
+                    "suite": "load",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "commit": _git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "dataset": dataset_info,
+                    "settings": settings,
+                    "totals": totals,
+                    "results": results,
+                }, f, indent=2)
+            print(f"\n✓ Results written to {args.output}")
+        return 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
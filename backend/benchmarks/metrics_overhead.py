@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark the per-request overhead of request and query metrics.
+
+Times a read (GET /api/assignments/{id}/status) and a write (POST
+/api/administrations) against a scratch database with metrics disabled and
+enabled, alternating between the two in rounds so drift affects both alike.
+
+Usage (from the backend directory):
+    python benchmarks/metrics_overhead.py [--requests 1000]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="metrics-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app import metrics  # noqa: E402
+
+
+def timed(client, method, url, **kwargs):
+    started = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert response.status_code < 300, response.text
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="Requests per endpoint and mode")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        member = client.post("/api/family-members", json={"name": "Benchmark"}).json()
+        medication = client.post("/api/medications", json={
+            "name": "Benchmarkol", "default_dose": "5mL", "default_frequency_hours": 4
+        }).json()
+        assignment = client.post("/api/assignments", json={
+            "family_member_id": member["id"], "medication_id": medication["id"]
+        }).json()
+        requests = {
+            "read": ("GET", f"/api/assignments/{assignment['id']}/status", {}),
+            "write": ("POST", "/api/administrations", {"json": {
+                "medication_assignment_id": assignment["id"], "dose_given": "5mL"
+            }}),
+        }
+
+        latencies = {(name, enabled): [] for name in requests for enabled in (False, True)}
+        per_round = max(args.requests // args.rounds, 1)
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                metrics.METRICS_ENABLED = enabled
+                for name, (method, url, kwargs) in requests.items():
+                    latencies[(name, enabled)].extend(
+                        timed(client, method, url, **kwargs) for _ in range(per_round)
+                    )
+        metrics.METRICS_ENABLED = True
+
+        print(f"{'':16}{'p50 ms':>10}{'mean ms':>10}")
+        for name in requests:
+            for enabled in (False, True):
+                values = latencies[(name, enabled)]
+                label = f"{name} {'on' if enabled else 'off'}"
+                print(f"{label:16}{statistics.median(values):>10.3f}{statistics.fmean(values):>10.3f}")
+            overhead = statistics.median(latencies[(name, True)]) - statistics.median(latencies[(name, False)])
+            print(f"{name + ' overhead':16}{overhead:>10.3f}")
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Check per-route SQL query budgets and N+1 patterns against a seeded dataset.
+
+Seeds a scratch database with several family members, medications,
+caregivers, assignments and administrations, then calls the API's routes
+with query inspection enabled. Fails (exit code 1) when a request runs more
+statements than its route's ``@query_budget`` or repeats one statement
+shape ``N_PLUS_ONE_THRESHOLD`` or more times, e.g. a lazy relationship
+loaded once per row. Budgets hold regardless of the dataset size, so new
+per-row queries fail this check instead of slowing down production.
+
+Usage (from the backend directory, e.g. in CI):
+    python benchmarks/query_budgets.py [--scale 1] [--verbose]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+WORK_DIR = tempfile.mkdtemp(prefix="query-budgets-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+os.environ["QUERY_INSPECTION"] = "true"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models, query_inspection  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+
+
+def seed(scale, rng):
+    """Write a small but multi-row dataset; returns ids used by the requests."""
+    db = SessionLocal()
+    try:
+        members = [models.FamilyMember(name=f"Member {i}") for i in range(3 * scale)]
+        caregivers = [models.Caregiver(name=f"Caregiver {i}") for i in range(3 * scale)]
+        medications = [
+            models.Medication(name=f"Medication {i}", default_dose="5mL", default_frequency_hours=6)
+            for i in range(5 * scale)
+        ]
+        db.add_all(members + caregivers + medications)
+        db.flush()
+
+        assignments = [
+            models.MedicationAssignment(family_member_id=member.id, medication_id=medication.id, current_dose="5mL")
+            for member in members
+            for medication in rng.sample(medications, 3)
+        ]
+        db.add_all(assignments)
+        db.add_all(
+            models.MedicationInventory(medication_id=medication.id, quantity=100, unit="mL", low_stock_threshold=10)
+            for medication in medications
+        )
+        db.flush()
+
+        now = datetime.now(timezone.utc)
+        db.add_all(
+            models.Administration(
+                medication_assignment_id=rng.choice(assignments).id,
+                caregiver_id=rng.choice(caregivers).id,
+                administered_at=now - timedelta(hours=rng.uniform(1, 24 * 14)),
+                dose_given="5mL"
+            )
+            for _ in range(40 * scale)
+        )
+        db.commit()
+        inventory = db.query(models.MedicationInventory).first()
+        administration = db.query(models.Administration).first()
+        return {
+            "member_id": members[0].id,
+            "caregiver_id": caregivers[0].id,
+            "medication_id": medications[0].id,
+            "assignment_id": assignments[0].id,
+            "assignment_ids": [assignment.id for assignment in assignments],
+            "inventory_id": inventory.id,
+            "administration_id": administration.id,
+        }
+    finally:
+        db.close()
+
+
+def requests_to_check(ids):
+    """(method, path, json body) of the requests exercised by the check."""
+    a, m, f = ids["assignment_id"], ids["medication_id"], ids["member_id"]
+    return [
+        ("GET", "/api/family-members", None),
+        ("GET", "/api/family-members/overview", None),
+        ("GET", f"/api/family-members/{f}/can-delete", None),
+        ("GET", "/api/caregivers", None),
+        ("GET", f"/api/caregivers/{ids['caregiver_id']}/can-delete", None),
+        ("GET", "/api/medications", None),
+        ("GET", f"/api/medications/{m}", None),
+        ("GET", f"/api/medications/{m}/can-delete", None),
+        ("GET", "/api/assignments", None),
+        ("GET", f"/api/assignments?family_member_id={f}", None),
+        ("GET", f"/api/assignments/{a}", None),
+        ("GET", f"/api/assignments/{a}/can-administer", None),
+        ("GET", f"/api/assignments/{a}/status", None),
+        ("GET", "/api/assignments/scheduled/list", None),
+        ("GET", f"/api/assignments/{a}/edit-history", None),
+        ("GET", "/api/administrations", None),
+        ("GET", f"/api/administrations?family_member_id={f}", None),
+        ("GET", f"/api/administrations/{ids['administration_id']}", None),
+        ("GET", "/api/inventory", None),
+        ("GET", "/api/inventory/low-stock", None),
+        ("GET", "/api/inventory/forecast", None),
+        ("GET", f"/api/inventory/{ids['inventory_id']}", None),
+        ("GET", f"/api/inventory/{ids['inventory_id']}/ledger", None),
+        ("GET", "/api/export/json", None),
+        ("GET", "/api/export/csv", None),
+        ("GET", "/api/export/changes", None),
+        ("GET", "/api/export/ndjson?compression=none", None),
+        ("GET", "/api/reports/daily", None),
+        ("GET", f"/api/reports/daily?family_member_id={f}&medication_id={m}", None),
+        ("GET", "/api/reports/caregivers", None),
+        ("POST", "/api/administrations", {"medication_assignment_id": a, "dose_given": "5mL"}),
+        ("POST", "/api/administrations/batch", {"administrations": [
+            {"medication_assignment_id": a, "dose_given": "5mL"} for _ in range(5)
+        ]}),
+        ("PUT", f"/api/assignments/{a}", {"current_dose": "7.5mL"}),
+        ("PATCH", "/api/assignments/bulk", {"updates": [
+            {"id": assignment_id, "current_dose": "2.5mL"} for assignment_id in ids["assignment_ids"]
+        ]}),
+        ("PUT", f"/api/family-members/{f}", {"name": "Renamed"}),
+        ("PUT", f"/api/medications/{m}", {"notes": "Checked"}),
+        ("POST", f"/api/inventory/{ids['inventory_id']}/adjustments", {"quantity_change": 5}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the seeded row counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Print repeated statements")
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        ids = seed(args.scale, random.Random(args.seed))
+        query_inspection.clear_reports()
+
+        for method, path, body in requests_to_check(ids):
+            response = client.request(method, path, json=body)
+            if response.status_code >= 400:
+                print(f"✗ {method} {path} returned {response.status_code}: {response.text[:200]}")
+                return 1
+
+        failures = 0
+        unbudgeted = []
+        print(f"{'route':58}{'queries':>8}{'budget':>8}  result")
+        for report in query_inspection.reports():
+            repeated = report.repeated_shapes()
+            problems = []
+            if report.over_budget:
+                problems.append("over budget")
+            if repeated:
+                problems.append(f"N+1 ({max(repeated.values())}x)")
+            if report.budget is None:
+                unbudgeted.append(f"{report.method} {report.route}")
+            failures += bool(problems)
+
+            label = f"{report.method} {report.route}"
+            budget = "-" if report.budget is None else report.budget
+            print(f"{label:58}{report.query_count:>8}{budget:>8}  {'✗ ' + ', '.join(problems) if problems else '✓'}")
+            if problems and args.verbose:
+                for shape, count in repeated.items():
+                    print(f"    {count}x {shape[:160]}")
+
+        if unbudgeted:
+            print(f"\nRoutes without a query budget: {', '.join(sorted(set(unbudgeted)))}")
+        print(f"\n{'✗' if failures else '✓'} {failures} request(s) over budget or with N+1 patterns")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Benchmark the WAL replicator's overhead on the dose-logging write path.
+
+Times POST /api/administrations against a scratch database, first without
+and then with the replicator shipping frames, and fails if the p95 latency
+grows by more than the stated bound at the configured shipping interval.
+Much shorter intervals than the default trade write latency for RPO.
+
+Usage (from the backend directory):
+    python benchmarks/replication_overhead.py [--requests 500] [--interval 1.0]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Stated bound: shipping may add at most this much to p95 dose-logging latency
+P95_OVERHEAD_BOUND_MS = 5.0
+
+WORK_DIR = tempfile.mkdtemp(prefix="replication-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+os.environ["REPLICA_DIR"] = os.path.join(WORK_DIR, "replica")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.replication import WalReplicator  # noqa: E402
+
+
+def time_dose_logging(client, assignment_id, count):
+    """Return per-request latencies in milliseconds."""
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        response = client.post("/api/administrations", json={
+            "medication_assignment_id": assignment_id,
+            "dose_given": "5mL",
+            "notes": f"benchmark {i}"
+        })
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 201, response.text
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[int(len(ordered) * 0.95) - 1],
+        "mean": statistics.fmean(ordered)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Replicator shipping interval in seconds (default: $REPLICA_INTERVAL)")
+    args = parser.parse_args()
+
+    try:
+        # The tables are created by the app's lifespan, which a bare TestClient skips
+        init_db()
+        client = TestClient(app)
+        member = client.post("/api/family-members", json={"name": "Benchmark"}).json()
+        medication = client.post("/api/medications", json={
+            "name": "Benchmarkol", "default_dose": "5mL", "default_frequency_hours": 4
+        }).json()
+        assignment = client.post("/api/assignments", json={
+            "family_member_id": member["id"], "medication_id": medication["id"]
+        }).json()
+
+        # Warm up connections and caches
+        time_dose_logging(client, assignment["id"], 20)
+
+        baseline = summarize(time_dose_logging(client, assignment["id"], args.requests))
+
+        replicator = WalReplicator(os.environ["REPLICA_DIR"], interval=args.interval)
+        replicator.start()
+        try:
+            replicated = summarize(time_dose_logging(client, assignment["id"], args.requests))
+        finally:
+            replicator.stop()
+
+        print(f"{'':12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for label, result in (("baseline", baseline), ("replicated", replicated)):
+            print(f"{label:12}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['mean']:>10.2f}")
+        overhead = replicated["p95"] - baseline["p95"]
+        print(f"\np95 overhead: {overhead:.2f} ms (bound {P95_OVERHEAD_BOUND_MS} ms)")
+        print(f"replicator: {replicator.stats}")
+        return 0 if overhead <= P95_OVERHEAD_BOUND_MS else 1
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Microbenchmark every API route against a generated dataset.
+
+Copies a database built by ``dataset.py`` (cached in ``benchmarks/.datasets``)
+into a scratch directory and times each route of ``app/routers`` through the
+in-process test client, including validation and serialization. Write
+routes get fresh rows to act on, created outside the timed call, and run
+after the read routes. Routes without a case are reported, so new routes
+don't go unmeasured.
+
+Results are written as JSON (``--output``) and can be compared with a
+previous run (``--baseline``): a route whose median is more than
+``--threshold`` slower counts as a regression, and ``--fail-on-regression``
+turns that into exit code 1 for CI.
+
+Usage (from the backend directory):
+    python benchmarks/routes.py [--size small|medium|large|huge] [--iterations 20]
+        [--output results.json] [--baseline baseline.json] [--routes export]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import dataset
+
+WORK_DIR = tempfile.mkdtemp(prefix="routes-bench-")
+PROFILE_TOKEN = "benchmark"
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _upload(name, content, media_type):
+    return {"files": {"file": (name, content, media_type)}}
+
+
+def build_context(client, models, SessionLocal):
+    """Ids of representative rows, and exports used by the import cases."""
+    from sqlalchemy import func
+
+    db = SessionLocal()
+    try:
+        administration = models.Administration
+        # The assignment with the longest history is the worst case for per-assignment routes
+        busiest = db.query(administration.medication_assignment_id).group_by(
+            administration.medication_assignment_id
+        ).order_by(func.count().desc()).limit(1).scalar()
+        assignment = db.get(models.MedicationAssignment, busiest)
+        revised = db.query(models.AssignmentRevision.assignment_id).group_by(
+            models.AssignmentRevision.assignment_id
+        ).order_by(func.count().desc()).limit(1).scalar()
+        context = {
+            "assignment_id": assignment.id,
+            "member_id": assignment.family_member_id,
+            "medication_id": assignment.medication_id,
+            "revised_assignment_id": revised,
+            "inventory_id": db.query(models.MedicationInventory.id).filter(
+                models.MedicationInventory.medication_id == assignment.medication_id
+            ).scalar(),
+            "caregiver_id": db.query(models.Caregiver.id).order_by(models.Caregiver.id).limit(1).scalar(),
+            "administration_id": db.query(administration.id).filter(
+                administration.medication_assignment_id == assignment.id
+            ).order_by(administration.id.desc()).limit(1).scalar(),
+            # Just after the latest revision, so the most diffs are replayed
+            "as_of": (db.query(func.max(models.AssignmentRevision.changed_at)).filter(
+                models.AssignmentRevision.assignment_id == revised
+            ).scalar() + timedelta(seconds=1)).isoformat(),
+            "rows": {
+                model.__tablename__: db.query(func.count()).select_from(model).scalar()
+                for model in (models.FamilyMember, models.Medication, models.MedicationAssignment,
+                              models.Administration, models.InventoryTransaction, models.AuditEvent)
+            },
+        }
+    finally:
+        db.close()
+
+    context["export_json"] = client.get("/api/export/json").content
+    context["export_csv"] = client.get("/api/export/csv").content
+    context["export_ndjson"] = client.get("/api/export/ndjson?compression=gzip").content
+    context["profile_id"] = client.get("/api/health", headers={"X-Profile": PROFILE_TOKEN}).headers["x-profile-id"]
+    return context
+
+
+def _create(client, path, body):
+    response = client.post(path, json=body)
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def _new_medication(client, i):
+    return _create(client, "/api/medications", {
+        "name": f"Benchmark Medication {i}", "default_dose": "5mL", "default_frequency_hours": 6
+    })
+
+
+def _new_assignment(client, ctx, i):
+    return _create(client, "/api/assignments", {
+        "family_member_id": ctx["member_id"], "medication_id": _new_medication(client, i)
+    })
+
+
+def _new_inventory(client, i):
+    return _create(client, "/api/inventory", {
+        "medication_id": _new_medication(client, i), "quantity": 100, "unit": "mL"
+    })
+
+
+def _new_administration(client, ctx):
+    return _create(client, "/api/administrations", {
+        "medication_assignment_id": ctx["assignment_id"], "dose_given": "5mL"
+    })
+
+
+# (method, route template, request builder). A builder gets the client, the
+# context and the iteration number, may create rows it needs (untimed), and
+# returns the path and keyword arguments of the request to time.
+READ_CASES = [
+    ("GET", "/api/family-members", lambda c, ctx, i: ("/api/family-members", {})),
+    ("GET", "/api/family-members/{member_id}/can-delete",
+     lambda c, ctx, i: (f"/api/family-members/{ctx['member_id']}/can-delete", {})),
+    ("GET", "/api/caregivers", lambda c, ctx, i: ("/api/caregivers", {})),
+    ("GET", "/api/caregivers/{caregiver_id}/can-delete",
+     lambda c, ctx, i: (f"/api/caregivers/{ctx['caregiver_id']}/can-delete", {})),
+    ("GET", "/api/medications", lambda c, ctx, i: ("/api/medications", {})),
+    ("GET", "/api/medications/{medication_id}", lambda c, ctx, i: (f"/api/medications/{ctx['medication_id']}", {})),
+    ("GET", "/api/medications/{medication_id}/can-delete",
+     lambda c, ctx, i: (f"/api/medications/{ctx['medication_id']}/can-delete", {})),
+    ("GET", "/api/assignments", lambda c, ctx, i: ("/api/assignments?active=true", {})),
+    ("GET", "/api/assignments/{assignment_id}", lambda c, ctx, i: (f"/api/assignments/{ctx['assignment_id']}", {})),
+    ("GET", "/api/assignments/{assignment_id}/can-administer",
+     lambda c, ctx, i: (f"/api/assignments/{ctx['assignment_id']}/can-administer", {})),
+    ("GET", "/api/assignments/{assignment_id}/status",
+     lambda c, ctx, i: (f"/api/assignments/{ctx['assignment_id']}/status", {})),
+    ("GET", "/api/assignments/scheduled/list", lambda c, ctx, i: ("/api/assignments/scheduled/list", {})),
+    ("GET", "/api/assignments/{assignment_id}/edit-history",
+     lambda c, ctx, i: (f"/api/assignments/{ctx['revised_assignment_id']}/edit-history", {})),
+    ("GET", "/api/assignments/{assignment_id}/as-of",
+     lambda c, ctx, i: (f"/api/assignments/{ctx['revised_assignment_id']}/as-of", {"params": {"ts": ctx["as_of"]}})),
+    ("GET", "/api/administrations", lambda c, ctx, i: ("/api/administrations", {})),
+    ("GET", "/api/administrations?family_member_id",
+     lambda c, ctx, i: (f"/api/administrations?family_member_id={ctx['member_id']}", {})),
+    ("GET", "/api/administrations?assignment_id&limit=1",
+     lambda c, ctx, i: (f"/api/administrations?assignment_id={ctx['assignment_id']}&limit=1", {})),
+    ("GET", "/api/administrations/{administration_id}",
+     lambda c, ctx, i: (f"/api/administrations/{ctx['administration_id']}", {})),
+    ("GET", "/api/inventory", lambda c, ctx, i: ("/api/inventory", {})),
+    ("GET", "/api/inventory/low-stock", lambda c, ctx, i: ("/api/inventory/low-stock", {})),
+    ("GET", "/api/inventory/forecast", lambda c, ctx, i: ("/api/inventory/forecast", {})),
+    ("GET", "/api/inventory/{inventory_id}", lambda c, ctx, i: (f"/api/inventory/{ctx['inventory_id']}", {})),
+    ("GET", "/api/inventory/{inventory_id}/ledger",
+     lambda c, ctx, i: (f"/api/inventory/{ctx['inventory_id']}/ledger", {})),
+    ("GET", "/api/inventory/{inventory_id}/ledger/balance",
+     lambda c, ctx, i: (f"/api/inventory/{ctx['inventory_id']}/ledger/balance", {})),
+    ("GET", "/api/export/json", lambda c, ctx, i: ("/api/export/json", {})),
+    ("GET", "/api/export/csv", lambda c, ctx, i: ("/api/export/csv", {})),
+    ("GET", "/api/export/changes", lambda c, ctx, i: ("/api/export/changes", {})),
+    ("GET", "/api/export/ndjson", lambda c, ctx, i: ("/api/export/ndjson?compression=gzip", {})),
+    ("GET", "/api/audit", lambda c, ctx, i: ("/api/audit?table=administrations", {})),
+    ("GET", "/api/audit/stats", lambda c, ctx, i: ("/api/audit/stats", {})),
+    ("GET", "/api/backup/snapshots", lambda c, ctx, i: ("/api/backup/snapshots", {})),
+    ("GET", "/api/admin/slow-queries", lambda c, ctx, i: ("/api/admin/slow-queries", {})),
+    ("GET", "/api/admin/profiles", lambda c, ctx, i: ("/api/admin/profiles", {})),
+    ("GET", "/api/admin/profiles/{profile_id}", lambda c, ctx, i: (f"/api/admin/profiles/{ctx['profile_id']}", {})),
+    ("GET", "/api/admin/profiles/{profile_id}/download",
+     lambda c, ctx, i: (f"/api/admin/profiles/{ctx['profile_id']}/download", {})),
+]
+
+WRITE_CASES = [
+    ("POST", "/api/family-members", lambda c, ctx, i: ("/api/family-members", {"json": {"name": f"Member {i}"}})),
+    ("PUT", "/api/family-members/{member_id}",
+     lambda c, ctx, i: (f"/api/family-members/{ctx['member_id']}", {"json": {"active": True}})),
+    ("DELETE", "/api/family-members/{member_id}",
+     lambda c, ctx, i: (f"/api/family-members/{_create(c, '/api/family-members', {'name': f'Gone {i}'})}", {})),
+    ("POST", "/api/caregivers", lambda c, ctx, i: ("/api/caregivers", {"json": {"name": f"Caregiver {i}"}})),
+    ("PUT", "/api/caregivers/{caregiver_id}",
+     lambda c, ctx, i: (f"/api/caregivers/{ctx['caregiver_id']}", {"json": {"active": True}})),
+    ("DELETE", "/api/caregivers/{caregiver_id}",
+     lambda c, ctx, i: (f"/api/caregivers/{_create(c, '/api/caregivers', {'name': f'Gone {i}'})}", {})),
+    ("POST", "/api/medications", lambda c, ctx, i: ("/api/medications", {"json": {
+        "name": f"Medication {i}", "default_dose": "1 tablet", "default_frequency_hours": 24}})),
+    ("PUT", "/api/medications/{medication_id}",
+     lambda c, ctx, i: (f"/api/medications/{ctx['medication_id']}", {"json": {"notes": f"Checked {i}"}})),
+    ("DELETE", "/api/medications/{medication_id}",
+     lambda c, ctx, i: (f"/api/medications/{_new_medication(c, f'gone-{i}')}", {})),
+    ("POST", "/api/assignments", lambda c, ctx, i: ("/api/assignments", {"json": {
+        "family_member_id": ctx["member_id"], "medication_id": _new_medication(c, f'assign-{i}')}})),
+    ("PUT", "/api/assignments/{assignment_id}",
+     lambda c, ctx, i: (f"/api/assignments/{ctx['assignment_id']}", {"json": {"current_dose": f"{i % 2 + 1}mL"}})),
+    ("DELETE", "/api/assignments/{assignment_id}",
+     lambda c, ctx, i: (f"/api/assignments/{_new_assignment(c, ctx, f'unassign-{i}')}", {})),
+    ("POST", "/api/administrations", lambda c, ctx, i: ("/api/administrations", {"json": {
+        "medication_assignment_id": ctx["assignment_id"], "caregiver_id": ctx["caregiver_id"], "dose_given": "5mL"}})),
+    ("PUT", "/api/administrations/{administration_id}",
+     lambda c, ctx, i: (f"/api/administrations/{ctx['administration_id']}", {"json": {"notes": f"Edited {i}"}})),
+    ("DELETE", "/api/administrations/{administration_id}",
+     lambda c, ctx, i: (f"/api/administrations/{_new_administration(c, ctx)}", {})),
+    ("POST", "/api/inventory", lambda c, ctx, i: ("/api/inventory", {"json": {
+        "medication_id": _new_medication(c, f'stock-{i}'), "quantity": 100, "unit": "mL"}})),
+    ("PUT", "/api/inventory/{inventory_id}",
+     lambda c, ctx, i: (f"/api/inventory/{ctx['inventory_id']}", {"json": {"quantity": 100 + i}})),
+    ("POST", "/api/inventory/{inventory_id}/adjustments",
+     lambda c, ctx, i: (f"/api/inventory/{ctx['inventory_id']}/adjustments", {"json": {"quantity_change": 1}})),
+    ("DELETE", "/api/inventory/{inventory_id}",
+     lambda c, ctx, i: (f"/api/inventory/{_new_inventory(c, f'unstock-{i}')}", {})),
+    ("POST", "/api/backup/snapshot", lambda c, ctx, i: ("/api/backup/snapshot", {})),
+    ("DELETE", "/api/admin/slow-queries", lambda c, ctx, i: ("/api/admin/slow-queries", {})),
+    # Imports of the dataset's own exports: every row is checked and skipped as a duplicate
+    ("POST", "/api/export/import/json",
+     lambda c, ctx, i: ("/api/export/import/json", _upload("export.json", ctx["export_json"], "application/json"))),
+    ("POST", "/api/export/import/ndjson",
+     lambda c, ctx, i: ("/api/export/import/ndjson", _upload("export.ndjson.gz", ctx["export_ndjson"], "application/gzip"))),
+    ("POST", "/api/export/import/csv",
+     lambda c, ctx, i: ("/api/export/import/csv", _upload("export.csv", ctx["export_csv"], "text/csv"))),
+]
+
+
+def run_case(client, ctx, method, build, iterations, warmup, max_seconds):
+    """Time one case; returns latency statistics in milliseconds."""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(warmup + iterations):
+        path, kwargs = build(client, ctx, i)
+        t0 = time.perf_counter()
+        response = client.request(method, path, **kwargs)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        if i >= warmup:
+            latencies.append(elapsed)
+            # Slow routes on big datasets stop early, after at least three timings
+            if len(latencies) >= 3 and time.perf_counter() - started > max_seconds:
+                break
+    ordered = sorted(latencies)
+    return {
+        "iterations": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "bytes": len(response.content),
+    }
+
+
+def uncovered_routes(app, cases):
+    """Router routes without a benchmark case."""
+    from fastapi.routing import APIRoute
+
+    covered = {(method, template.split("?")[0]) for method, template, _ in cases}
+    return sorted(
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.endpoint.__module__.startswith("app.routers.")
+        for method in route.methods
+        if (method, route.path) not in covered
+    )
+
+
+def compare(results, baseline, threshold):
+    """Annotate results with the change against a baseline run; returns regressions."""
+    previous = {entry["route"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry["route"])
+        if before is None:
+            continue
+        ratio = entry["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        entry["baseline_median_ms"] = before["median_ms"]
+        entry["change"] = round(ratio - 1, 4)
+        if ratio > 1 + threshold:
+            regressions.append(entry["route"])
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=dataset.BACKEND_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Time budget per route")
+    parser.add_argument("--routes", help="Only run routes containing this text")
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results JSON from a previous run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Median slowdown counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        shutil.copyfile(source, os.path.join(WORK_DIR, "medications.db"))
+        os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+        os.environ["PROFILE_TOKEN"] = PROFILE_TOKEN
+        sys.path.insert(0, dataset.BACKEND_DIR)
+
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app import models
+        from app.database import SessionLocal
+
+        with TestClient(app) as client:
+            ctx = build_context(client, models, SessionLocal)
+            cases = READ_CASES + WRITE_CASES
+            selected = [case for case in cases if not args.routes or args.routes in case[1]]
+
+            results = []
+            print(f"{args.size} dataset: " + ", ".join(f"{count} {table}" for table, count in ctx["rows"].items()))
+            print(f"{'route':58}{'n':>4}{'median':>10}{'p95':>10}  ms")
+            for method, template, build in selected:
+                stats = run_case(client, ctx, method, build, args.iterations, args.warmup, args.max_seconds)
+                results.append({"route": f"{method} {template}", **stats})
+                print(f"{method + ' ' + template:58}{stats['iterations']:>4}"
+                      f"{stats['median_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+
+        regressions = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if (baseline["dataset"]["size"], baseline["dataset"]["seed"]) != (args.size, args.seed):
+                print(f"\n✗ Baseline was run on the {baseline['dataset']['size']} dataset "
+                      f"(seed {baseline['dataset']['seed']}); timings are not comparable")
+                return 1
+            regressions = compare(results, baseline, args.threshold)
+            print(f"\n{'route':58}{'baseline':>10}{'now':>10}{'change':>9}")
+            for entry in results:
+                if "change" in entry:
+                    flag = " ✗" if entry["route"] in regressions else ""
+                    print(f"{entry['route']:58}{entry['baseline_median_ms']:>10.2f}"
+                          f"{entry['median_ms']:>10.2f}{entry['change']:>+9.1%}{flag}")
+
+        missing = uncovered_routes(app, cases)
+        if missing:
+            print(f"\n✗ Routes without a benchmark case: {', '.join(missing)}")
+
+        report = {
+            "suite": "routes",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": {"size": args.size, "seed": args.seed, "rows": ctx["rows"]},
+            "settings": {"iterations": args.iterations, "warmup": args.warmup, "max_seconds": args.max_seconds},
+            "results": results,
+            "regressions": regressions,
+            "uncovered_routes": missing,
+        }
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✓ Results written to {args.output}")
+
+        if regressions:
+            print(f"\n✗ {len(regressions)} route(s) more than {args.threshold:.0%} slower than the baseline")
+            return 1 if args.fail_on_regression else 0
+        return 0
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
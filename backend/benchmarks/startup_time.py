@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Time from starting the API process to its first successful requests.
+
+Starts uvicorn repeatedly and polls until ``/api/health`` answers, then
+times the dashboard's first data request (the active assignments). Each
+start is measured from process spawn, so interpreter start-up, imports,
+database initialisation and the lifespan handler all count. Scenarios:
+
+- restart: a generated dataset (see ``dataset.py``) that a previous start
+  has already initialised, the common case of a redeploy or container restart
+- upgrade: a fresh copy of the dataset for every start with its schema
+  version cleared, so every table and migration is checked as after a release
+- empty: no database file, as on a first install
+
+Reports the median and worst time per scenario and fails (exit code 1) when
+the median time to the first data request of any scenario exceeds
+``--target-ms``. Results are written as JSON with ``--output``.
+
+Usage (from the backend directory):
+    python benchmarks/startup_time.py [--size medium] [--runs 5]
+        [--target-ms 1500] [--scenario restart] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+import dataset
+
+SCENARIOS = ("restart", "upgrade", "empty")
+# Seconds between polls while waiting for the server to answer
+POLL_INTERVAL = 0.005
+FIRST_DATA_REQUEST = "/api/assignments?active=true"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_start(database_path, log_path, extra_env, timeout=60):
+    """Start uvicorn once; returns seconds to the first health and data responses."""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_PATH=database_path, **extra_env)
+    with open(log_path, "a") as log, httpx.Client(base_url=base_url, timeout=timeout) as client:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--no-access-log"],
+            cwd=dataset.BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {server.returncode}, see {log_path}")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"uvicorn did not answer within {timeout} seconds")
+                try:
+                    if client.get("/api/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(POLL_INTERVAL)
+            health = time.perf_counter() - started
+            response = client.get(FIRST_DATA_REQUEST)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {FIRST_DATA_REQUEST} returned {response.status_code}")
+            first_request = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return health, first_request
+
+
+def run_scenario(scenario, source, work_dir, runs, extra_env):
+    database_path = os.path.join(work_dir, f"{scenario}.db")
+    log_path = os.path.join(work_dir, "uvicorn.log")
+
+    def reset():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database_path + suffix):
+                os.remove(database_path + suffix)
+        if scenario != "empty":
+            shutil.copyfile(source, database_path)
+        if scenario == "upgrade":
+            with sqlite3.connect(database_path) as conn:
+                conn.execute("PRAGMA user_version = 0")
+
+    reset()
+    if scenario == "restart":
+        # The first start initialises the copy; only the restarts are measured
+        measure_start(database_path, log_path, extra_env)
+
+    timings = []
+    for _ in range(runs):
+        if scenario != "restart":
+            reset()
+        timings.append(measure_start(database_path, log_path, extra_env))
+    return timings
+
+
+def summarize(scenario, timings):
+    health = sorted(t[0] * 1000 for t in timings)
+    first = sorted(t[1] * 1000 for t in timings)
+    return {
+        "scenario": scenario,
+        "runs": len(timings),
+        "health_median_ms": round(statistics.median(health), 1),
+        "health_max_ms": round(health[-1], 1),
+        "first_request_median_ms": round(statistics.median(first), 1),
+        "first_request_max_ms": round(first[-1], 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=dataset.BACKEND_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=5, help="Measured starts per scenario")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append",
+                        help="Scenario to run (repeatable, default all)")
+    parser.add_argument("--target-ms", type=float, default=1500.0,
+                        help="Maximum median time to the first data request")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the server, e.g. DATABASE_MIGRATIONS=skip")
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    scenarios = args.scenario or list(SCENARIOS)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    work_dir = tempfile.mkdtemp(prefix="startup-time-")
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        print(f"Starting the API {args.runs} times per scenario against the {args.size} dataset "
+              f"(target {args.target_ms:.0f} ms to the first data request)...")
+
+        results = [
+            summarize(scenario, run_scenario(scenario, source, work_dir, args.runs, extra_env))
+            for scenario in scenarios
+        ]
+
+        failures = 0
+        print(f"\n{'scenario':10}{'health p50':>12}{'max':>9}{'first request p50':>19}{'max':>9}  ms")
+        for entry in results:
+            within = entry["first_request_median_ms"] <= args.target_ms
+            failures += not within
+            print(f"{entry['scenario']:10}{entry['health_median_ms']:>12.1f}{entry['health_max_ms']:>9.1f}"
+                  f"{entry['first_request_median_ms']:>19.1f}{entry['first_request_max_ms']:>9.1f}"
+                  f"  {'✓' if within else '✗ over target'}")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({
+                    "suite": "startup",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "commit": _git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "dataset": {"size": args.size, "seed": args.seed},
+                    "settings": {"runs": args.runs, "target_ms": args.target_ms, "env": extra_env},
+                    "results": results,
+                }, f, indent=2)
+            print(f"\n✓ Results written to {args.output}")
+
+        if failures:
+            print(f"\n✗ {failures} scenario(s) over the {args.target_ms:.0f} ms target")
+            return 1
+        print(f"\n✓ All scenarios within the {args.target_ms:.0f} ms target")
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
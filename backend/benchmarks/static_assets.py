@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Check that repeat page loads make no requests for frontend assets.
+
+Builds the frontend (see ``app/static_build.py``) into a scratch directory
+and loads the page as a caching browser would: ``/``, the stylesheet and
+icon it links, its module scripts and every module they import (resolved
+through the page's import map). A second load reuses cached responses while
+fresh, revalidates the others and fetches the rest.
+
+Prints the requests and bytes transferred for the first and the repeat load,
+for the built frontend and, for comparison, the unbuilt source, and fails
+(exit code 1) when a repeat load of the built frontend requests any asset or
+a module import does not resolve.
+
+Usage (from the backend directory):
+    python benchmarks/static_assets.py [--frontend ../frontend]
+"""
+import argparse
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+
+WORK_DIR = tempfile.mkdtemp(prefix="static-bench-")
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "medications.db")
+os.environ["STATIC_DIR"] = os.path.join(WORK_DIR, "static")
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.routing import Mount, Route  # noqa: E402
+from app.static_build import build  # noqa: E402
+from app.static_files import FrontendFiles  # noqa: E402
+
+ACCEPT_ENCODING = "br, gzip"
+LINKED = re.compile(r'<(?:link|script)[^>]+(?:href|src)="(/static/[^"]+)"')
+IMPORT_MAP = re.compile(r'<script type="importmap">(.*?)</script>', re.S)
+IMPORTED = re.compile(r'''(?:^|\s)(?:import|export)\b[^'"]*?\bfrom\s+['"]([^'"]+)['"]|import\s+['"]([^'"]+)['"]''', re.M)
+
+
+class Browser:
+    """A client with an HTTP cache honouring max-age, immutable and ETags."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}
+        self.requests = 0
+        self.asset_requests = 0
+        self.bytes = 0
+
+    def get(self, url):
+        cached = self.cache.get(url)
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if cached is not None:
+            cache_control = cached.headers.get("cache-control", "")
+            if "immutable" in cache_control or "max-age=" in cache_control and "no-cache" not in cache_control:
+                return cached
+            if "etag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["etag"]
+
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.asset_requests += url != "/"
+        self.bytes += int(response.headers.get("content-length", 0))
+        if response.status_code == 304:
+            return cached
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        self.cache[url] = response
+        return response
+
+    def load_page(self):
+        """Load the page and everything it needs; returns the module URLs loaded."""
+        self.requests = self.asset_requests = self.bytes = 0
+        html = self.get("/").text
+        import_map = IMPORT_MAP.search(html)
+        imports = json.loads(import_map.group(1))["imports"] if import_map else {}
+
+        pending = LINKED.findall(html)
+        loaded = set()
+        while pending:
+            url = pending.pop()
+            if url in loaded:
+                continue
+            loaded.add(url)
+            response = self.get(url)
+            if url.endswith(".js"):
+                for match in IMPORTED.finditer(response.text):
+                    specifier = match.group(1) or match.group(2)
+                    resolved = posixpath.normpath(posixpath.join(posixpath.dirname(url), specifier))
+                    pending.append(imports.get(resolved, resolved))
+        return loaded
+
+
+def measure(client):
+    browser = Browser(client)
+    first = browser.load_page()
+    first_stats = (browser.requests, browser.bytes)
+    browser.load_page()
+    return len(first), first_stats, (browser.requests, browser.asset_requests, browser.bytes)
+
+
+def unbuilt_app(directory):
+    files = FrontendFiles(directory)
+    return Starlette(routes=[
+        Route("/", lambda request: files.index_response(request.scope)),
+        Mount("/static", files),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frontend", default=os.path.join(BACKEND_DIR, "..", "frontend"))
+    args = parser.parse_args()
+
+    try:
+        manifest = build(args.frontend, os.environ["STATIC_DIR"])
+        from app.main import app
+
+        results = [
+            ("source", measure(TestClient(unbuilt_app(args.frontend)))),
+            ("built", measure(TestClient(app))),
+        ]
+        print(f"Built {len(manifest['assets'])} assets, {len(manifest['encodings'])} with compressed variants\n")
+        print(f"{'frontend':10}{'files':>7}{'first reqs':>12}{'first KB':>10}{'repeat reqs':>13}"
+              f"{'asset reqs':>12}{'repeat KB':>11}")
+        for label, (files, (requests, size), (repeat_requests, asset_requests, repeat_size)) in results:
+            print(f"{label:10}{files:>7}{requests:>12}{size / 1024:>10.1f}{repeat_requests:>13}"
+                  f"{asset_requests:>12}{repeat_size / 1024:>11.1f}")
+
+        asset_requests = results[-1][1][2][1]
+        if asset_requests:
+            print(f"\n✗ A repeat load of the built frontend made {asset_requests} asset request(s)")
+            return 1
+        print("\n✓ Repeat loads of the built frontend make no asset requests")
+        return 0
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        return 1
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
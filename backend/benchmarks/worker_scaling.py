@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Throughput of the API as uvicorn worker processes are added.
+
+Runs the load test's simulated caregivers (see ``load_test.py``) against a
+fresh copy of a generated dataset once per worker count, with the same
+users, think time and seed each time, and reports throughput, its speedup
+over the first worker count, the overall p95 latency and errors.
+
+Workers share one SQLite database, so writes still go one at a time; the
+run fails (exit code 1) when any request fails, including with ``database
+is locked``. Speedups are bounded by the CPU cores available, printed with
+the results.
+
+Usage (from the backend directory):
+    python benchmarks/worker_scaling.py [--size medium] [--workers 1 2 4]
+        [--users 40] [--duration 20] [--output scaling.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import dataset
+from load_test import _free_port, _git_commit, load_context, percentile, run_load, start_server
+
+
+def measure(source, work_dir, workers, args):
+    database_path = os.path.join(work_dir, "medications.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    shutil.copyfile(source, database_path)
+    ctx = load_context(database_path)
+
+    port = _free_port()
+    server = start_server(work_dir, port, workers)
+    try:
+        recorder, elapsed, _ = asyncio.run(run_load(
+            f"http://127.0.0.1:{port}", ctx, args.users, args.duration, args.think_time, args.seed
+        ))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    # The server's own metrics are per worker, so errors are counted client-side
+    results = recorder.summary(elapsed)
+    latencies = sorted(latency for samples in recorder.latencies.values() for latency in samples)
+    requests = sum(entry["requests"] for entry in results)
+    return {
+        "workers": workers,
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "errors": sum(entry["errors"] for entry in results),
+        "locked_responses": sum(entry["locked"] for entry in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to run")
+    parser.add_argument("--users", type=int, default=40, help="Concurrent simulated caregivers")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per worker count")
+    parser.add_argument("--think-time", type=float, default=0.1, help="Mean seconds between user actions")
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="worker-scaling-")
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        print(f"Running {args.users} caregivers for {args.duration:.0f}s per worker count against the "
+              f"{args.size} dataset on {os.cpu_count()} CPU core(s)...")
+        results = [measure(source, work_dir, workers, args) for workers in args.workers]
+
+        base = results[0]["throughput_rps"]
+        print(f"\n{'workers':>7}{'requests':>10}{'req/s':>9}{'speedup':>9}{'p95 ms':>9}{'errors':>8}{'locked':>8}")
+        for entry in results:
+            entry["speedup"] = round(entry["throughput_rps"] / base, 2) if base else 0.0
+            print(f"{entry['workers']:>7}{entry['requests']:>10}{entry['throughput_rps']:>9.1f}"
+                  f"{entry['speedup']:>8.2f}x{entry['p95_ms']:>9.1f}{entry['errors']:>8}"
+                  f"{entry['locked_responses']:>8}")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({
+                    "suite": "worker_scaling",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "commit": _git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "dataset": {"size": args.size, "seed": args.seed},
+                    "settings": {"users": args.users, "duration": args.duration, "think_time": args.think_time},
+                    "results": results,
+                }, f, indent=2)
+            print(f"\n✓ Results written to {args.output}")
+
+        failed = sum(entry["errors"] for entry in results)
+        if failed:
+            print(f"\n✗ {failed} request(s) failed across the runs")
+            return 1
+        print("\n✓ No failed requests at any worker count")
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
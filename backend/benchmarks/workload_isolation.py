@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Dose-logging latency while exports run, with and without bulk limits.
+
+Starts the app under uvicorn against a copy of a generated dataset (see
+``dataset.py``) and times caregivers logging doses, first alone and then
+while clients download JSON and NDJSON exports back to back. This is done
+twice: with the default bulk executor limits (``BULK_CONCURRENCY``,
+``BULK_QUEUE_SIZE``) and with limits high enough that every export runs at
+once, as before exports had their own workload class.
+
+Prints dose-logging p50/p95/p99, completed and rejected (503) exports, and
+the mean queueing delay per workload class from ``/api/metrics``. Fails
+(exit code 1) when a dose fails to log or, with the default limits, dose
+logging waits on average more than ``--max-queue-ms`` for a worker thread
+while exports run. Exports still compete with dose logging for the CPU, so
+its latency grows with them even when no thread is waited for.
+
+Usage (from the backend directory):
+    python benchmarks/workload_isolation.py [--size medium] [--loggers 4]
+        [--exporters 8] [--duration 15]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+import dataset
+from load_test import _free_port, load_context, percentile, start_server
+
+EXPORTS = ("/api/export/json", "/api/export/ndjson")
+# Limits letting every export run at once
+UNBOUNDED = {"BULK_CONCURRENCY": "1000", "BULK_QUEUE_SIZE": "0"}
+
+
+async def log_doses(client, ctx, rng, deadline, latencies, failures):
+    assignments = list(ctx["doses"])
+    while time.monotonic() < deadline:
+        assignment_id = rng.choice(assignments)
+        started = time.perf_counter()
+        response = await client.post("/api/administrations", json={
+            "medication_assignment_id": assignment_id,
+            "caregiver_id": rng.choice(ctx["caregivers"]) if ctx["caregivers"] else None,
+            "dose_given": ctx["doses"][assignment_id],
+        })
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 201:
+            failures.append(response.status_code)
+        await asyncio.sleep(rng.uniform(0.05, 0.15))
+
+
+async def export_repeatedly(client, rng, deadline, outcomes):
+    while time.monotonic() < deadline:
+        response = await client.get(rng.choice(EXPORTS))
+        await response.aread()
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("retry-after", "1")) / 10)
+
+
+def queue_delays(metrics_text):
+    """Mean ``workload_queue_seconds`` per workload class, in milliseconds."""
+    sums, counts = {}, {}
+    for line in metrics_text.splitlines():
+        for suffix, target in (("_sum", sums), ("_count", counts)):
+            if line.startswith("workload_queue_seconds" + suffix):
+                workload = line.split('workload="', 1)[1].split('"', 1)[0]
+                target[workload] = float(line.rsplit(" ", 1)[1])
+    return {workload: sums[workload] / counts[workload] * 1000 for workload in counts if counts[workload]}
+
+
+async def run_phase(base_url, ctx, args, exporters, seed):
+    latencies, failures, outcomes = [], [], {}
+    deadline = time.monotonic() + args.duration
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        rng = random.Random(seed)
+        tasks = [
+            log_doses(client, ctx, random.Random(rng.random()), deadline, latencies, failures)
+            for _ in range(args.loggers)
+        ]
+        tasks += [
+            export_repeatedly(client, random.Random(rng.random()), deadline, outcomes)
+            for _ in range(exporters)
+        ]
+        await asyncio.gather(*tasks)
+        delays = queue_delays((await client.get("/api/metrics")).text)
+    return sorted(latencies), failures, outcomes, delays
+
+
+def run_config(label, source, work_dir, args, env):
+    database_path = os.path.join(work_dir, "medications.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    shutil.copyfile(source, database_path)
+    ctx = load_context(database_path)
+
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    port = _free_port()
+    try:
+        server = start_server(work_dir, port, 1)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        alone = asyncio.run(run_phase(base_url, ctx, args, 0, args.seed))
+        loaded = asyncio.run(run_phase(base_url, ctx, args, args.exporters, args.seed + 1))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return label, alone, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=dataset.SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--loggers", type=int, default=4, help="Concurrent caregivers logging doses")
+    parser.add_argument("--exporters", type=int, default=8, help="Concurrent clients downloading exports")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per phase")
+    parser.add_argument("--max-queue-ms", type=float, default=10.0,
+                        help="Most interactive requests may wait for a thread on average with the default limits")
+    parser.add_argument("--cache-dir", default=dataset.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="workload-isolation-")
+    try:
+        source = dataset.ensure_dataset(args.size, args.seed, args.cache_dir)
+        print(f"{args.loggers} caregivers logging doses for {args.duration:.0f}s, alone and with "
+              f"{args.exporters} export clients, against the {args.size} dataset...")
+        runs = [
+            run_config("bulk limits", source, work_dir, args, {}),
+            run_config("unbounded", source, work_dir, args, UNBOUNDED),
+        ]
+
+        failed = 0
+        print(f"\n{'limits':13}{'exports':9}{'doses':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'exports':>9}{'503s':>6}{'queue ms (interactive/bulk)':>30}")
+        for label, *phases in runs:
+            for phase, (latencies, failures, outcomes, delays) in zip(("none", "running"), phases):
+                failed += len(failures)
+                print(f"{label:13}{phase:9}{len(latencies):>7}{percentile(latencies, 0.50) * 1000:>9.1f}"
+                      f"{percentile(latencies, 0.95) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}"
+                      f"{outcomes.get(200, 0):>9}{outcomes.get(503, 0):>6}"
+                      f"{delays.get('interactive', 0):>18.2f} / {delays.get('bulk', 0):.1f}")
+
+        (_, (alone, *_), (loaded, _, _, delays)), (_, _, (unbounded, *_)) = runs
+        interactive_wait = delays.get("interactive", 0.0)
+        print(f"\nDose-logging p95 with exports running: {percentile(loaded, 0.95) * 1000:.1f} ms with bulk "
+              f"limits, {percentile(unbounded, 0.95) * 1000:.1f} ms unbounded "
+              f"({percentile(alone, 0.95) * 1000:.1f} ms alone)")
+        if failed:
+            print(f"✗ {failed} dose(s) failed to log")
+            return 1
+        if interactive_wait > args.max_queue_ms:
+            print(f"✗ Interactive requests waited {interactive_wait:.1f} ms for a thread on average "
+                  f"(limit {args.max_queue_ms:.0f} ms)")
+            return 1
+        print(f"✓ Interactive requests waited {interactive_wait:.1f} ms for a thread on average while exports ran")
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -37,6 +37,14 @@ const RETRY_CONFIG = {
     retryableErrors: ['NetworkError', 'Failed to fetch', 'TypeError'] // Network-related errors
 };
 
+// Random key identifying one create request across its retries, so the
+// server replays the first response instead of creating the record twice.
+// crypto.randomUUID needs a secure context, which a LAN address over HTTP isn't
+function newIdempotencyKey() {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
 // Exponential backoff delay calculation
 function getRetryDelay(attempt) {
     const delay = Math.min(
@@ -48,7 +56,7 @@ function getRetryDelay(attempt) {
 }
 
 // Check if error is retryable
-function isRetryableError(error, status) {
+function isRetryableError(error, status, inProgress = false) {
     // Network errors are always retryable
     if (error && (
         error.message === 'Failed to fetch' ||
@@ -62,6 +70,12 @@ function isRetryableError(error, status) {
     if (status && RETRY_CONFIG.retryableStatuses.includes(status)) {
         return true;
     }
+
+    // The first request with the same Idempotency-Key is still being handled;
+    // only that 409 carries Retry-After, any other conflict is final
+    if (status === 409 && inProgress) {
+        return true;
+    }
     
     return false;
 }
@@ -136,11 +150,11 @@ function getActionableErrorMessage(error, status) {
 async function apiRequestWithRetry(endpoint, options = {}, retryCount = 0) {
     const url = `${API_BASE}${endpoint}`;
     const config = {
+        ...options,
         headers: {
             'Content-Type': 'application/json',
             ...options.headers
-        },
-        ...options
+        }
     };
 
     if (config.body && typeof config.body === 'object') {
@@ -177,7 +191,7 @@ async function apiRequestWithRetry(endpoint, options = {}, retryCount = 0) {
             }
             
             // Check if we should retry
-            if (retryCount < RETRY_CONFIG.maxRetries && isRetryableError(error, response.status)) {
+            if (retryCount < RETRY_CONFIG.maxRetries && isRetryableError(error, response.status, response.headers.has('Retry-After'))) {
                 const delay = getRetryDelay(retryCount);
                 await new Promise(resolve => setTimeout(resolve, delay));
                 return apiRequestWithRetry(endpoint, options, retryCount + 1);
@@ -224,12 +238,21 @@ async function apiRequest(endpoint, options = {}) {
         throw error;
     }
     
+    // Every retry of a create sends the same key
+    if (options.method === 'POST') {
+        options = {
+            ...options,
+            headers: { 'Idempotency-Key': newIdempotencyKey(), ...options.headers }
+        };
+    }
+
     return apiRequestWithRetry(endpoint, options);
 }
 
 // Family Members API
 export const familyMembersAPI = {
     getAll: () => apiRequest('/family-members'),
+    getOverview: () => apiRequest('/family-members/overview'),
     create: (data) => apiRequest('/family-members', { method: 'POST', body: data }),
     update: (id, data) => apiRequest(`/family-members/${id}`, { method: 'PUT', body: data }),
     delete: (id) => apiRequest(`/family-members/${id}`, { method: 'DELETE' }),
@@ -264,6 +287,9 @@ export const assignmentsAPI = {
     get: (id) => apiRequest(`/assignments/${id}`),
     create: (data) => apiRequest('/assignments', { method: 'POST', body: data }),
     update: (id, data) => apiRequest(`/assignments/${id}`, { method: 'PUT', body: data }),
+    updateBulk: (updates, atomic = true) => apiRequest('/assignments/bulk', {
+        method: 'PATCH', body: { updates, atomic }
+    }),
     delete: (id) => apiRequest(`/assignments/${id}`, { method: 'DELETE' }),
     getEditHistory: (id) => apiRequest(`/assignments/${id}/edit-history`),
     getStatus: (id) => apiRequest(`/assignments/${id}/status`),
@@ -278,6 +304,9 @@ export const administrationsAPI = {
     },
     get: (id) => apiRequest(`/administrations/${id}`),
     create: (data) => apiRequest('/administrations', { method: 'POST', body: data }),
+    createBatch: (administrations, atomic = true) => apiRequest('/administrations/batch', {
+        method: 'POST', body: { administrations, atomic }
+    }),
     update: (id, data) => apiRequest(`/administrations/${id}`, { method: 'PUT', body: data }),
     delete: (id) => apiRequest(`/administrations/${id}`, { method: 'DELETE' })
 };
@@ -292,10 +321,26 @@ export const inventoryAPI = {
     delete: (id) => apiRequest(`/inventory/${id}`, { method: 'DELETE' })
 };
 
+// Reports API
+export const reportsAPI = {
+    getDaily: (params = {}) => {
+        const query = new URLSearchParams(params).toString();
+        return apiRequest(`/reports/daily${query ? '?' + query : ''}`);
+    },
+    getCaregivers: (params = {}) => {
+        const query = new URLSearchParams(params).toString();
+        return apiRequest(`/reports/caregivers${query ? '?' + query : ''}`);
+    }
+};
+
 // Export API
 export const exportAPI = {
     exportJSON: async () => {
         const response = await fetch(`${API_BASE}/export/json`);
+        if (!response.ok) {
+            // e.g. a 503 while other exports and imports are running
+            throw new Error(`Export failed: status ${response.status}`);
+        }
         const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -308,6 +353,10 @@ export const exportAPI = {
     },
     exportCSV: async () => {
         const response = await fetch(`${API_BASE}/export/csv`);
+        if (!response.ok) {
+            // e.g. a 503 while other exports and imports are running
+            throw new Error(`Export failed: status ${response.status}`);
+        }
         const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -321,7 +370,15 @@ export const exportAPI = {
     importJSON: async (file) => {
         const formData = new FormData();
         formData.append('file', file);
-        const response = await fetch(`${API_BASE}/export/import/json`, {
+        // NDJSON backups (optionally gzip/zstd compressed) use the streaming importer,
+        // CSV files are administration histories keyed by name
+        let format = 'json';
+        if (/\.(ndjson|gz|zst)$/i.test(file.name)) {
+            format = 'ndjson';
+        } else if (/\.csv$/i.test(file.name)) {
+            format = 'csv';
+        }
+        const response = await fetch(`${API_BASE}/export/import/${format}`, {
             method: 'POST',
             body: formData
         });
@@ -398,11 +398,11 @@ export async function showEditAssignmentForm(assignment) {
                     </h4>
                     <div id="edit-history-content" style="display: none;">
                         <div style="max-height: 300px; overflow-y: auto;">
-                            ${editHistory.map(log => {
+                            ${editHistory.flatMap(revision => revision.changes.map(change => ({ ...change, changed_at: revision.changed_at }))).map(log => {
                                 const changeDate = new Date(log.changed_at);
                                 const fieldDisplayName = formatFieldName(log.field_name);
-                                const oldVal = log.old_value || '(empty)';
-                                const newVal = log.new_value || '(empty)';
+                                const oldVal = log.old_value === null || log.old_value === '' ? '(empty)' : String(log.old_value);
+                                const newVal = log.new_value === null || log.new_value === '' ? '(empty)' : String(log.new_value);
                                 return `
                                     <div style="padding: 0.75rem; margin-bottom: 0.5rem; background: #f5f5f5; border-radius: 4px; border-left: 3px solid #007bff;">
                                         <div style="font-weight: bold; margin-bottom: 0.25rem;">${escapeHtml(fieldDisplayName)}</div>
@@ -3,6 +3,7 @@ import { familyMembersAPI } from './api.js';
 import { showToast, showModal, closeModal, setButtonLoading, showDeleteConfirmation, validateField, showValidationMessage } from './app.js';
 
 let familyMembers = [];
+let overviews = {}; // Medication summary per family member id
 
 export async function loadFamilyMembers() {
     const container = document.getElementById('family-list');
@@ -11,7 +12,12 @@ export async function loadFamilyMembers() {
     }
     
     try {
-        familyMembers = await familyMembersAPI.getAll();
+        const [members, overview] = await Promise.all([
+            familyMembersAPI.getAll(),
+            familyMembersAPI.getOverview()
+        ]);
+        familyMembers = members;
+        overviews = Object.fromEntries(overview.map(entry => [entry.id, entry]));
         renderFamilyMembers();
         return familyMembers;
     } catch (error) {
@@ -54,6 +60,7 @@ function renderFamilyMembers() {
             <div class="card-header">
                 <div class="card-title">${escapeHtml(member.name)}</div>
             </div>
+            ${renderOverview(overviews[member.id])}
             <div class="card-footer">
                 <button class="btn btn-danger btn-small" onclick="deleteFamilyMember(${member.id})">Remove</button>
             </div>
@@ -61,6 +68,18 @@ function renderFamilyMembers() {
     `).join('');
 }
 
+function renderOverview(overview) {
+    if (!overview) return '';
+    const formatTime = (value) => value ? new Date(value).toLocaleString() : 'Never';
+    return `
+            <div class="card-body">
+                <p><strong>Medications:</strong> ${overview.active_assignments} active${overview.inactive_assignments ? `, ${overview.inactive_assignments} stopped` : ''}</p>
+                <p><strong>Last Dose:</strong> ${formatTime(overview.last_administration)}</p>
+                ${overview.next_due ? `<p><strong>Next Due:</strong> ${formatTime(overview.next_due)}</p>` : ''}
+                ${overview.overdue_count ? `<p><strong>Overdue:</strong> ${overview.overdue_count}</p>` : ''}
+            </div>`;
+}
+
 export function showAddFamilyMemberForm() {
     const content = `
         <h3>Add Family Member</h3>